@@ -4,7 +4,9 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib import colors
 import re
+from telemetry import tracked_export
 
+@tracked_export("json")
 def export_to_json(analysis_result: str, metrics: dict, filename: str):
     """
     Export analysis result and metrics to a JSON file.
@@ -16,6 +18,7 @@ def export_to_json(analysis_result: str, metrics: dict, filename: str):
     with open(filename, 'w') as f:
         json.dump(data, f, indent=4)
 
+@tracked_export("pdf")
 def export_to_pdf(analysis_result: str, metrics: dict, filename: str):
     """
     Export analysis result and metrics to a PDF file using ReportLab.
@@ -1,26 +1,25 @@
 import streamlit as st
 import os
+import logging
 from dotenv import load_dotenv
 import tempfile
-import difflib
-from black import FileMode
-import black
-from groq import APIStatusError
-from main import create_analysis_chain, create_multi_file_analysis_chain
-from utils import (
-    flesch_kincaid_grade_level, cyclomatic_complexity, calculate_maintainability_index,
-    lines_of_code, comment_lines, detect_code_smells, halstead_metrics,
-    nesting_depth, function_count, variable_count, code_duplication_percentage,
-    code_characters, code_comment_density, code_avg_function_length
-)
-from chat import create_chat_chain, send_message
-from analysis_export import export_to_pdf, export_to_json
-from code_comparison import compare_codes
-from github import Github
+from report import AnalysisReport
+from retrieval import CodeIndex, format_context
+from jobs import JobManager
+from telemetry import PAGE_VIEWS, start_metrics_server
+from deadlines import is_timeout, use_deadlines
+from policies import with_overrides
+
+# Heavy dependencies (langchain/Groq via main, chat and code_comparison, black, reportlab via
+# analysis_export, PyGithub and pandas) are imported inside the page or action that needs them.
+# Python caches modules in sys.modules, so each one is paid for once per process, on first use.
 
 # Load environment variables
 load_dotenv()
 
+# Routing decisions and other pipeline events are logged through the standard logging module
+logging.basicConfig(level=os.getenv("CODE_JUDGE_LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
 
 
 # Page configuration for professional look
@@ -81,14 +80,274 @@ st.markdown("""
 
 # Session state for history, chat, and settings
 if 'analysis_history' not in st.session_state:
-    st.session_state.analysis_history = []
+    st.session_state.analysis_history = []  # AnalysisReport ids, oldest first
+if 'reports' not in st.session_state:
+    st.session_state.reports = {}
+if 'current_report_id' not in st.session_state:
+    st.session_state.current_report_id = None
 if 'chat_chain' not in st.session_state:
     st.session_state.chat_chain = None
 if 'temperature' not in st.session_state:
     st.session_state.temperature = 0.1
+if 'code_index' not in st.session_state:
+    st.session_state.code_index = CodeIndex()
+if 'retrieval_top_k' not in st.session_state:
+    st.session_state.retrieval_top_k = 5
+if 'retrieval_token_budget' not in st.session_state:
+    st.session_state.retrieval_token_budget = 1500
+
+if 'routing_policy' not in st.session_state:
+    st.session_state.routing_policy = {}  # overrides for main.DEFAULT_ROUTING_POLICY
+if 'prefilter_rules' not in st.session_state:
+    st.session_state.prefilter_rules = {}  # overrides for prefilter.DEFAULT_PREFILTER_RULES
+if 'packing_policy' not in st.session_state:
+    st.session_state.packing_policy = {}  # overrides for packing.DEFAULT_PACKING_POLICY
+if 'live_metrics' not in st.session_state:
+    from incremental_metrics import IncrementalMetrics
+    st.session_state.live_metrics = IncrementalMetrics()  # metrics of the Analyze page code, updated per edit
+if 'deadlines' not in st.session_state:
+    st.session_state.deadlines = {}  # overrides for deadlines.DEFAULT_DEADLINES
+if 'speculative' not in st.session_state:
+    st.session_state.speculative = False  # opt-in: start analyzing uploads/pastes before the button is clicked
+if 'comparison' not in st.session_state:
+    st.session_state.comparison = None  # last Code Comparison result, kept across reruns
+if 'reuse_policy' not in st.session_state:
+    st.session_state.reuse_policy = {}  # overrides for similarity.DEFAULT_REUSE_POLICY
+if 'speculation_owner' not in st.session_state:
+    import uuid
+    st.session_state.speculation_owner = uuid.uuid4().hex
+if 'owner_id' not in st.session_state:
+    # Jobs are stored under this id and only listed for it. It is kept in the page URL so a
+    # refreshed tab still finds its jobs; anyone without the URL cannot see them.
+    import uuid
+    st.session_state.owner_id = st.query_params.get("session") or uuid.uuid4().hex
+st.query_params["session"] = st.session_state.owner_id
+
+
+# LLM clients created during this run (and jobs submitted from it) use this session's time limits
+use_deadlines(st.session_state.deadlines)
+
+
+def session_liveness():
+    """
+    Callable telling whether this browser session is still connected, so work started for it
+    can stop once nobody is left to read it; None when the Streamlit runtime cannot tell.
+    Jobs go by their owner instead (see deadlines.OwnerPresence), which survives a refresh.
+    """
+    try:
+        from streamlit.runtime import get_instance
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        runtime, session_id = get_instance(), get_script_run_ctx().session_id
+    except Exception:
+        return None
+    return lambda: runtime.is_active_session(session_id)
+
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Serve Prometheus metrics next to the Streamlit server, once per process (see telemetry.start_metrics_server)."""
+    return start_metrics_server()
+
+
+start_metrics_endpoint()
+
+
+@st.cache_resource
+def get_speculative_analyzer():
+    """Process-wide speculative pre-analysis runner; it also owns the shared daily budget."""
+    from speculative import SpeculativeAnalyzer
+    return SpeculativeAnalyzer()
+
+
+@st.cache_resource
+def get_job_manager():
+    """Process-wide job manager shared by every session and kept across reruns."""
+    return JobManager()
+
+
+# Every run marks this owner as present, so its jobs outlive a refresh but not the owner
+get_job_manager().presence.touch(st.session_state.owner_id, st.session_state.speculation_owner, session_liveness())
+
+
+def get_section(content, header):
+    start = content.find(header)
+    if start == -1:
+        return ""
+    next_header = content.find("###", start + 1)
+    if next_header == -1:
+        next_header = len(content)
+    return content[start:next_header].strip()
+
+
+def metric_card(metric: dict, display: str):
+    status_class = "good-metric" if metric['status'] == "good" else "poor-metric"
+    st.markdown(f'<div class="metric-card {status_class}"><strong>{metric["label"]}</strong><br>{display}</div>', unsafe_allow_html=True)
+
+
+def render_project_summary(summary: dict):
+    """Display the hierarchical project-level report of a Multi-File or GitHub job."""
+    if not summary:
+        return
+    st.subheader("🗺️ Project Summary")
+    if 'error' in summary:
+        st.warning(summary['error'])
+        return
+    if summary.get('stopped'):
+        st.warning(f"{summary['stopped']} The summary was not finished; below are the file summaries completed before that.")
+    else:
+        st.caption(f"{summary['levels']} summary levels, {summary['llm_calls']} LLM calls, {summary['cache_hits']} cached.")
+    st.markdown(summary['report'])
+    with st.expander("Worst files by static metrics"):
+        st.table([
+            {"File": f['path'], "Score": f['score'], **{name.upper(): value for name, value in f['metrics'].items()}, "Smells": len(f['smells'])}
+            for f in summary['worst_files']
+        ])
+
+
+def render_route(route: dict):
+    if route:
+        st.caption(f"Routed to **{route['tier']}**{' on ' + route['model'] if route['model'] else ''}: {'; '.join(route['reasons'])}")
+
+
+def smell_text(hit: dict) -> str:
+    """One code smell with the first lines it was found on."""
+    lines = hit['lines']
+    if not lines:
+        return hit['message']
+    shown = ", ".join(str(line) for line in lines[:10]) + (", ..." if len(lines) > 10 else "")
+    return f"{hit['message']} (line{'s' if len(lines) > 1 else ''} {shown})"
+
+
+def render_packing_stats(stats: dict):
+    """Summarize how a batch job grouped its files into LLM requests."""
+    if stats:
+        st.caption(
+            f"{stats['files']} files analyzed in {stats['requests']} LLM requests: {stats['packed_files']} small files packed together, "
+            f"{stats['chunked_files']} large files analyzed in parts, ~{stats['tokens_saved']} prompt tokens saved."
+            + (f" {stats['fallbacks']} files were re-analyzed alone." if stats['fallbacks'] else "")
+            + (f" {stats['timeouts']} timed out." if stats.get('timeouts') else "")
+            + (f" {stats['not_analyzed']} were not analyzed before the job stopped." if stats.get('not_analyzed') else "")
+        )
+
+
+def render_packing(packing: dict):
+    if packing and packing['mode'] == "packed":
+        st.caption(f"Analyzed in one request with {packing['files'] - 1} other small files.")
+    elif packing and packing['mode'] == "chunked":
+        st.caption(f"Large file analyzed in {packing['parts']} parts.")
+
+
+def render_stopped(job_result: dict):
+    """Explain a partial result: why the run stopped and which files were left out or timed out."""
+    if job_result.get('stopped'):
+        st.warning(f"{job_result['stopped']} Showing what finished before that; files not sent to the model have static metrics only.")
+    timeouts = [res['file'] for res in job_result['results'] if res.get('timed_out')]
+    if timeouts:
+        st.warning(f"{len(timeouts)} files timed out: {', '.join(timeouts)}. Raise the call timeout in Settings to give the model more time.")
+
+
+def render_multi_file_results(job_result: dict):
+    """Display the summary of a finished Multi-File Analysis job."""
+    render_stopped(job_result)
+    render_project_summary(job_result['project_summary'])
+    st.subheader("Summary")
+    render_packing_stats(job_result.get('packing'))
+    for res in job_result['results']:
+        if res.get('skipped'):
+            st.info(f"Skipped **{res['file']}**: {'; '.join(res['reasons'])}")
+            if res.get('streamed_metrics'):
+                values = res['streamed_metrics']
+                approximate = f" (estimated: {', '.join(res['approximate'])})" if res['approximate'] else ""
+                st.caption(
+                    f"LOC {values['loc']} · CC {values['cc']} · MI {values['mi']:.1f} · nesting {values['nd']} · "
+                    f"functions {values['fc']} · duplication {values['dup']:.1f}%{approximate}"
+                )
+            continue
+        for warning in res['warnings']:
+            st.warning(warning)
+        if res['error']:
+            st.error(res['error'])
+            continue
+        st.write(f"**{res['file']}**: LOC {res['loc']}, CC {res['cc']}, MI {res['mi']}")
+        st.write(f"Halstead Metrics: {res['halstead']}")
+        st.write(f"Nesting Depth: {res['nesting_depth']}")
+        st.write(f"Code Smells Detected: {len(res['code_smells'])}")
+        render_route(res.get('route'))
+        render_packing(res.get('packing'))
+        if res['result']:
+            st.text_area(f"Detailed Analysis for {res['file']}", res['result'], height=200)
+
+        # Optionally, visualize the metrics
+        st.bar_chart({
+            'LOC': res['loc'],
+            'CC': res['cc'],
+            'MI': res['mi'],
+            'Nesting Depth': res['nesting_depth']
+        })
+
+        # Show a list of detected code smells
+        if res['code_smells']:
+            st.write("Potential Code Smells:")
+            # Results of jobs from before smell locations were recorded only have the messages
+            for hit in res.get('smell_hits') or [{"message": smell, "lines": []} for smell in res['code_smells']]:
+                st.write(f"- {smell_text(hit)}")
+
+
+def render_github_results(repo_result: dict):
+    """Display the per-file analyses of a finished GitHub Repo job."""
+    st.success(f"Analyzed repo: {repo_result['repo']}")
+    if repo_result.get('commit'):
+        st.caption(f"Commit {repo_result['commit'][:12]} · {repo_result['cached']} analyses reused from earlier runs (by blob SHA).")
+    if not repo_result['files_found']:
+        st.warning("No code files found in the root directory." if 'commit' not in repo_result else "No files matched in the repository tree.")
+        return
+    max_files = repo_result.get('max_files', 5)
+    st.write(f"Found {repo_result['files_found']} code files. Analyzed {f'up to {max_files}' if max_files else 'all'} files.")
+    render_stopped(repo_result)
+    render_project_summary(repo_result['project_summary'])
+    render_packing_stats(repo_result.get('packing'))
+    skipped = [res for res in repo_result['results'] if res.get('skipped')]
+    if skipped:
+        with st.expander(f"Skipped by pre-filter ({len(skipped)} files)"):
+            for res in skipped:
+                st.markdown(f"- **{res['file']}**: {'; '.join(res['reasons'])}")
+    for res in repo_result['results']:
+        if res.get('skipped'):
+            continue
+        with st.expander(f"Analysis of {res['file']}"):
+            for warning in res['warnings']:
+                st.warning(warning)
+            if 'metrics' in res:
+                metrics = res['metrics']
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    metric_card(metrics['loc'], metrics['loc']['value'])
+                with col2:
+                    metric_card(metrics['cc'], metrics['cc']['value'])
+                with col3:
+                    metric_card(metrics['mi'], f"{metrics['mi']['value']:.1f}%")
+                with col4:
+                    metric_card(metrics['fkgl'], f"{metrics['fkgl']['value']:.1f}")
+            render_route(res.get('route'))
+            render_packing(res.get('packing'))
+            if res['error']:
+                st.error(res['error'])
+                continue
+            result_str = res['result']
+            if not result_str:
+                continue
+            st.markdown(get_section(result_str, "### Language Detected"))
+            st.markdown(get_section(result_str, "### Syntax Errors"))
+            st.markdown(get_section(result_str, "### Logical Issues/Bugs"))
+            st.markdown(get_section(result_str, "### Best Practices & Improvements"))
+            st.markdown(get_section(result_str, "### Security & Performance Concerns"))
+            st.markdown(get_section(result_str, "### Code Metrics"))
+            st.markdown(get_section(result_str, "### Refactoring Suggestions"))
+
 
 # Sidebar navigation
-page = st.sidebar.radio("Navigate", ["Analyze & Input", "Format Code", "Chat", "History", "Code Comparison", "Multi-File Analysis", "GitHub Repo", "Settings"])
+page = st.sidebar.radio("Navigate", ["Analyze & Input", "Format Code", "Chat", "History", "Code Comparison", "Multi-File Analysis", "GitHub Repo", "Local Repo", "Jobs", "Trends", "Settings"])
+PAGE_VIEWS.inc(page=page)
 
 # Main content
 if page == "Analyze & Input":
@@ -110,140 +369,173 @@ def hello_world():
             height=200,
         )
 
+    if code_input.strip():
+        # Only the lines changed since the last rerun are re-measured
+        st.session_state.live_metrics.update(code_input)
+        live = st.session_state.live_metrics.metrics()
+        st.caption(
+            f"Live metrics: {live['loc']['value']} LOC · CC {live['cc']['value']} · MI {live['mi']['value']:.1f} · "
+            f"nesting {live['nd']['value']} · duplication {live['dup']['value']:.1f}%"
+        )
+
+    # Uploaded files keep their name as the report source; pasted snippets are numbered once analyzed
+    source = uploaded_file.name if uploaded_file is not None else ""
+
+    if st.session_state.speculative:
+        # The text area only reruns the script once an edit is committed, so every value seen here is stable
+        run = get_speculative_analyzer().speculate(
+            st.session_state.speculation_owner, code_input, st.session_state.temperature, is_alive=session_liveness(),
+            index_owner=st.session_state.owner_id, reuse_policy=st.session_state.reuse_policy,
+            source=source,
+        )
+        if run and not run["claimed"]:
+            st.caption({
+                "queued": "⚡ Pre-analysis starting in the background...",
+                "metrics": "⚡ Pre-analysis running in the background...",
+                "analyzing": "⚡ Pre-analysis running in the background...",
+                "ready": "⚡ Pre-analysis ready. Click Analyze Code to open it.",
+                "over_budget": "Daily pre-analysis budget reached; the analysis starts when you click Analyze Code.",
+                "failed": "Pre-analysis failed; the analysis runs again when you click Analyze Code.",
+            }[run["status"]])
+
     if st.button("🔍 Analyze Code"):
         if code_input.strip():
             with st.spinner("Analyzing your code..."):
                 try:
-                    chain = create_analysis_chain(temperature=st.session_state.temperature)
-                    result = chain.invoke({"code": code_input})
-                    st.success("Analysis Complete!")
-
-                    # Calculate metrics
-                    loc_dict = lines_of_code(code_input)
-                    loc = loc_dict['value']
-                    comments = comment_lines(code_input)
-                    cc_dict = cyclomatic_complexity(code_input)
-                    cc = cc_dict['value']
-                    mi_dict = calculate_maintainability_index(code_input, loc, comments)
-                    mi = mi_dict['value']
-                    fkgl_dict = flesch_kincaid_grade_level(code_input)
-                    fkgl = fkgl_dict['value']
-                    nd_dict = nesting_depth(code_input)
-                    nd = nd_dict['value']
-                    fc_dict = function_count(code_input)
-                    fc = fc_dict['value']
-                    vc_dict = variable_count(code_input)
-                    vc = vc_dict['value']
-                    dup_dict = code_duplication_percentage(code_input)
-                    dup = dup_dict['value']
-                    chars_dict = code_characters(code_input)
-                    cd_dict = code_comment_density(code_input)
-                    afl_dict = code_avg_function_length(code_input)
-                    smells = detect_code_smells(code_input)
-                    halstead = halstead_metrics(code_input)
-
-                    # Metrics dashboard
-                    st.subheader("📊 Code Metrics Dashboard")
-                    col1, col2, col3, col4 = st.columns(4)
-                    with col1:
-                        status_class = "good-metric" if loc_dict['status'] == "good" else "poor-metric"
-                        st.markdown(f'<div class="metric-card {status_class}"><strong>{loc_dict["label"]}</strong><br>{loc}</div>', unsafe_allow_html=True)
-                    with col2:
-                        status_class = "good-metric" if cc_dict['status'] == "good" else "poor-metric"
-                        st.markdown(f'<div class="metric-card {status_class}"><strong>{cc_dict["label"]}</strong><br>{cc}</div>', unsafe_allow_html=True)
-                    with col3:
-                        status_class = "good-metric" if mi_dict['status'] == "good" else "poor-metric"
-                        st.markdown(f'<div class="metric-card {status_class}"><strong>{mi_dict["label"]}</strong><br>{mi:.1f}%</div>', unsafe_allow_html=True)
-                    with col4:
-                        status_class = "good-metric" if fkgl_dict['status'] == "good" else "poor-metric"
-                        st.markdown(f'<div class="metric-card {status_class}"><strong>{fkgl_dict["label"]}</strong><br>{fkgl:.1f}</div>', unsafe_allow_html=True)
-
-                    # Halstead and smells
-                    with st.expander("🔧 Detailed Metrics & Smells"):
-                        st.markdown("**Halstead Metrics:**")
-                        st.markdown(f"- Vocabulary: {halstead['vocabulary']}")
-                        st.markdown(f"- Volume: {halstead['volume']:.2f}")
-                        st.markdown(f"- Difficulty: {halstead['difficulty']:.2f}")
-                        st.markdown(f"- Effort: {halstead['effort']:.2f}")
-                        st.markdown("**Code Dimensions:**")
-                        st.markdown(f"- {chars_dict['label']}: {chars_dict['value']}")
-                        st.markdown(f"- {cd_dict['label']}: {cd_dict['value']:.1f}%")
-                        st.markdown(f"- {afl_dict['label']}: {afl_dict['value']:.1f}")
-                        if smells:
-                            st.markdown("**Code Smells Detected:**")
-                            for smell in smells:
-                                st.markdown(f"- ⚠️ {smell}")
-                        else:
-                            st.markdown("**Code Smells:** None detected ✅")
-
-                    # Analysis results in tabs
-                    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10 = st.tabs(["Language", "Errors", "Best Practices", "Security", "Metrics", "Dependency", "Test Coverage", "Complexity", "Duplication", "Refactoring"])
-                    result_str = result.content
-
-                    def get_section(content, header):
-                        start = content.find(header)
-                        if start == -1:
-                            return ""
-                        next_header = content.find("###", start + 1)
-                        if next_header == -1:
-                            next_header = len(content)
-                        return content[start:next_header].strip()
-
-                    with tab1:
-                        st.markdown(get_section(result_str, "### Language Detected"))
-                    with tab2:
-                        st.markdown(get_section(result_str, "### Syntax Errors"))
-                        st.markdown(get_section(result_str, "### Logical Issues/Bugs"))
-                    with tab3:
-                        st.markdown(get_section(result_str, "### Best Practices & Improvements"))
-                    with tab4:
-                        st.markdown(get_section(result_str, "### Security & Performance Concerns"))
-                    with tab5:
-                        st.markdown(get_section(result_str, "### Code Metrics"))
-                    with tab6:
-                        st.markdown(get_section(result_str, "### Dependency Analysis"))
-                    with tab7:
-                        st.markdown(get_section(result_str, "### Test Coverage Estimation"))
-                    with tab8:
-                        st.markdown(get_section(result_str, "### Time/Space Complexity Estimation"))
-                    with tab9:
-                        st.markdown(get_section(result_str, "### Code Duplication Detection"))
-                    with tab10:
-                        st.markdown(get_section(result_str, "### Refactoring Suggestions"))
-                        st.markdown(get_section(result_str, "### Overall Suggestions"))
-
-                    # Visualization
-                    import re
-                    confidences = re.findall(r'(\w+ \w+ Confidence): (\d+)%', result_str)
-                    if confidences:
-                        st.subheader("📈 Confidence Scores")
-                        categories = [cat for cat, score in confidences]
-                        scores = [int(score) for cat, score in confidences]
-                        st.bar_chart({cat: score for cat, score in zip(categories, scores)})
-
-                    # Export options
-                    st.subheader("📤 Export Analysis")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("Export to PDF"):
-                            export_to_pdf(result_str, {"loc": loc_dict, "cc": cc_dict, "mi": mi_dict, "fkgl": fkgl_dict, "nd": nd_dict, "fc": fc_dict, "vc": vc_dict, "dup": dup_dict, "chars": chars_dict, "cd": cd_dict, "afl": afl_dict}, "analysis_report.pdf")
-                            st.success("PDF exported!")
-                    with col2:
-                        if st.button("Export to JSON"):
-                            export_to_json(result_str, {"loc": loc_dict, "cc": cc_dict, "mi": mi_dict, "fkgl": fkgl_dict, "nd": nd_dict, "fc": fc_dict, "vc": vc_dict, "dup": dup_dict, "chars": chars_dict, "cd": cd_dict, "afl": afl_dict}, "analysis_report.json")
-                            st.success("JSON exported!")
+                    report, match = None, None
+                    if st.session_state.speculative:
+                        future = get_speculative_analyzer().claim(
+                            st.session_state.speculation_owner, code_input, st.session_state.temperature, source,
+                        )
+                        if future is not None:
+                            try:
+                                report, match = future.result()
+                            except Exception:
+                                report = None  # fall back to a regular analysis below
+                    if report is None:
+                        live_metrics = st.session_state.live_metrics
+                        report = AnalysisReport(code_input, "", source=source, metrics=live_metrics.metrics(), halstead=live_metrics.halstead())
+                    if not report.result:
+                        from similarity import analyze_with_reuse
+                        report.result, match = analyze_with_reuse(
+                            st.session_state.owner_id, code_input, st.session_state.temperature, st.session_state.reuse_policy, source,
+                        )
+                    if match is not None and match["changed_lines"] == 0:
+                        st.info(f"♻️ Unchanged since {match['source'] or 'an earlier submission'}; reusing its analysis.")
+                    elif match is not None:
+                        st.info(f"♻️ {match['similarity']:.0%} similar to {match['source'] or 'an earlier submission'} "
+                                f"({match['changed_lines']} changed lines); only the changes were reviewed.")
+                    report.source = source or f"snippet-{len(st.session_state.analysis_history) + 1}"
+                    st.session_state.reports[report.id] = report
+                    st.session_state.current_report_id = report.id
 
                     # Add to history
-                    st.session_state.analysis_history.append({
-                        "code": code_input,
-                        "result": result_str,
-                        "metrics": {"loc": loc_dict, "cc": cc_dict, "mi": mi_dict, "fkgl": fkgl_dict, "nd": nd_dict, "fc": fc_dict, "vc": vc_dict, "dup": dup_dict, "chars": chars_dict, "cd": cd_dict, "afl": afl_dict}
-                    })
+                    st.session_state.analysis_history.append(report.id)
+
+                    # Make the code and analysis available to the Chat page
+                    st.session_state.code_index.add_analysis(report.source, report.code, report.result)
+
+                    # Keep the metrics of uploaded files for the Trends page; pasted snippets have
+                    # no name that stays the same across sessions, so they would mix unrelated code
+                    if uploaded_file is not None:
+                        from trend_store import blob_sha, metric_row, record_rows
+                        values = {key: metric['value'] for key, metric in report.metrics.items()}
+                        values["nesting_depth"] = values["nd"]
+                        record_rows(st.session_state.owner_id, "Analyze & Input", [
+                            metric_row(report.source, values, report.smells, blob=blob_sha(report.code.encode("utf-8")))
+                        ], source="analyze")
+                    st.success("Analysis Complete!")
                 except Exception as e:
-                    st.error(f"An error occurred during analysis: {str(e)}")
+                    if is_timeout(e):
+                        st.error("The model did not answer in time. Try again, or raise the call timeout in Settings.")
+                    else:
+                        st.error(f"An error occurred during analysis: {str(e)}")
         else:
             st.warning("Please enter some code to analyze.")
 
+    # Render the latest report from session state so export buttons and other reruns reuse it
+    report = st.session_state.reports.get(st.session_state.current_report_id)
+    if report is not None:
+        metrics = report.metrics
+        if report.code != code_input:
+            st.caption(f"Showing the last analysis ({report.source}); the code above has changed since.")
+
+        # Metrics dashboard
+        st.subheader("📊 Code Metrics Dashboard")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            metric_card(metrics['loc'], metrics['loc']['value'])
+        with col2:
+            metric_card(metrics['cc'], metrics['cc']['value'])
+        with col3:
+            metric_card(metrics['mi'], f"{metrics['mi']['value']:.1f}%")
+        with col4:
+            metric_card(metrics['fkgl'], f"{metrics['fkgl']['value']:.1f}")
+
+        # Halstead and smells
+        with st.expander("🔧 Detailed Metrics & Smells"):
+            halstead = report.halstead
+            st.markdown("**Halstead Metrics:**")
+            st.markdown(f"- Vocabulary: {halstead['vocabulary']}")
+            st.markdown(f"- Volume: {halstead['volume']:.2f}")
+            st.markdown(f"- Difficulty: {halstead['difficulty']:.2f}")
+            st.markdown(f"- Effort: {halstead['effort']:.2f}")
+            st.markdown("**Code Dimensions:**")
+            st.markdown(f"- {metrics['chars']['label']}: {metrics['chars']['value']}")
+            st.markdown(f"- {metrics['cd']['label']}: {metrics['cd']['value']:.1f}%")
+            st.markdown(f"- {metrics['afl']['label']}: {metrics['afl']['value']:.1f}")
+            if report.smell_hits:
+                st.markdown("**Code Smells Detected:**")
+                for hit in report.smell_hits:
+                    st.markdown(f"- ⚠️ {smell_text(hit)}")
+            else:
+                st.markdown("**Code Smells:** None detected ✅")
+
+        # Analysis results in tabs
+        tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9, tab10 = st.tabs(["Language", "Errors", "Best Practices", "Security", "Metrics", "Dependency", "Test Coverage", "Complexity", "Duplication", "Refactoring"])
+        with tab1:
+            st.markdown(report.section("### Language Detected"))
+        with tab2:
+            st.markdown(report.section("### Syntax Errors"))
+            st.markdown(report.section("### Logical Issues/Bugs"))
+        with tab3:
+            st.markdown(report.section("### Best Practices & Improvements"))
+        with tab4:
+            st.markdown(report.section("### Security & Performance Concerns"))
+        with tab5:
+            st.markdown(report.section("### Code Metrics"))
+        with tab6:
+            st.markdown(report.section("### Dependency Analysis"))
+        with tab7:
+            st.markdown(report.section("### Test Coverage Estimation"))
+        with tab8:
+            st.markdown(report.section("### Time/Space Complexity Estimation"))
+        with tab9:
+            st.markdown(report.section("### Code Duplication Detection"))
+        with tab10:
+            st.markdown(report.section("### Refactoring Suggestions"))
+            st.markdown(report.section("### Overall Suggestions"))
+
+        # Visualization
+        confidences = report.confidences()
+        if confidences:
+            st.subheader("📈 Confidence Scores")
+            st.bar_chart(confidences)
+
+        # Export options
+        st.subheader("📤 Export Analysis")
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Export to PDF"):
+                from analysis_export import export_to_pdf
+                export_to_pdf(report.result, metrics, "analysis_report.pdf")
+                st.success("PDF exported!")
+        with col2:
+            if st.button("Export to JSON"):
+                from analysis_export import export_to_json
+                export_to_json(report.result, metrics, "analysis_report.json")
+                st.success("JSON exported!")
+
 elif page == "Format Code":
     st.markdown('<div class="main-header">🛠️ Code Formatter</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Format your Python code using Black for consistent style. Note: This feature is Python-specific. For other languages, use dedicated tools like Prettier (JS), clang-format (C++), etc.</div>', unsafe_allow_html=True)
@@ -262,6 +554,9 @@ elif page == "Format Code":
         )
 
     if st.button("🎨 Format Code") and code_input.strip():
+        import difflib
+        import black
+        from black import FileMode
         try:
             # Format the code using Black library
             try:
@@ -291,6 +586,7 @@ elif page == "Format Code":
             st.error(f"Formatting failed: {e}")
 
 elif page == "Chat":
+    from chat import create_chat_chain, send_message
     st.markdown('<div class="main-header">💬 Chat about Code</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Discuss your code with the AI assistant.</div>', unsafe_allow_html=True)
 
@@ -300,145 +596,163 @@ elif page == "Chat":
             st.success("Chat initialized!")
             st.rerun()
     if st.session_state.chat_chain:
+        st.caption(f"{len(st.session_state.code_index)} code/analysis chunks indexed from this session.")
         chat_input = st.text_input("Ask about your code:")
         if st.button("📤 Send Message") and chat_input.strip():
-            response = send_message(st.session_state.chat_chain, chat_input)
+            retrieved = st.session_state.code_index.search(
+                chat_input,
+                k=st.session_state.retrieval_top_k,
+                token_budget=st.session_state.retrieval_token_budget,
+            )
+            response = send_message(st.session_state.chat_chain, chat_input, context=format_context(retrieved))
             st.markdown(f"**You:** {chat_input}")
             st.markdown(f"**AI:** {response}")
+            if retrieved:
+                with st.expander(f"📎 Context used ({len(retrieved)} chunks)"):
+                    for chunk in retrieved:
+                        st.markdown(f"**{chunk['source']}** ({chunk['kind']}, score {chunk['score']:.2f})")
+                        st.code(chunk['text'])
 
 elif page == "History":
     st.markdown('<div class="main-header">📚 Analysis History</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Review your previous code analyses.</div>', unsafe_allow_html=True)
 
     if st.session_state.analysis_history:
-        for i, entry in enumerate(st.session_state.analysis_history):
-            loc_val = entry['metrics']['loc']['value']
-            cc_val = entry['metrics']['cc']['value']
-            mi_val = entry['metrics']['mi']['value']
-            fkgl_val = entry['metrics']['fkgl']['value']
+        for i, report_id in enumerate(st.session_state.analysis_history):
+            entry = st.session_state.reports[report_id]
+            loc_val = entry.metrics['loc']['value']
+            cc_val = entry.metrics['cc']['value']
+            mi_val = entry.metrics['mi']['value']
+            fkgl_val = entry.metrics['fkgl']['value']
             with st.expander(f"Analysis {i+1} - LOC: {loc_val}, CC: {cc_val}"):
-                st.code(entry["code"][:500] + "..." if len(entry["code"]) > 500 else entry["code"])
+                st.code(entry.code[:500] + "..." if len(entry.code) > 500 else entry.code)
                 st.markdown(f"**Metrics:** MI: {mi_val:.1f}%, Readability: {fkgl_val:.1f}")
+                if st.button("Open in Analyze & Input", key=f"open-{report_id}"):
+                    st.session_state.current_report_id = report_id
+                    st.info("Report opened. Switch to the Analyze & Input page to view it.")
     else:
         st.info("No history yet. Analyze some code to see it here.")
 
 elif page == "Code Comparison":
     st.markdown('<div class="main-header">🔄 Code Comparison</div>', unsafe_allow_html=True)
-    st.markdown('<div class="sub-header">Compare two code snippets side-by-side.</div>', unsafe_allow_html=True)
-
-    code1 = st.text_area("Code 1", height=200)
-    code2 = st.text_area("Code 2", height=200)
+    st.markdown('<div class="sub-header">Compare two code snippets side-by-side, or rank several revisions at once.</div>', unsafe_allow_html=True)
+
+    history_reports = [st.session_state.reports[report_id] for report_id in reversed(st.session_state.analysis_history)]
+    report_options = [None] + history_reports
+    count = st.number_input("Snippets to compare", 2, 8, 2)
+    columns = st.columns(2)
+    picked, codes = [], []
+    for i in range(count):
+        with columns[i % 2]:
+            report = st.selectbox(f"Load Code {i + 1} from history", report_options, format_func=lambda r: "—" if r is None else r.title())
+            picked.append(report)
+            codes.append(st.text_area(f"Code {i + 1}", value=report.code if report else "", height=200))
 
     if st.button("Compare"):
-        if code1.strip() and code2.strip():
-            comp = compare_codes(code1, code2)
-            st.subheader("Diff")
-            st.code(comp['diff'])
-            st.subheader("Metrics Comparison")
-            import pandas as pd
-            data = []
-            for key in comp['metrics1']:
-                data.append({
-                    "Metric": comp['metrics1'][key]['label'],
-                    "Code 1": comp['metrics1'][key]['value'],
-                    "Code 2": comp['metrics2'][key]['value'],
-                    "Comparison": comp['comparison'][key]
-                })
-            df = pd.DataFrame(data)
-            st.table(df)
+        if all(code.strip() for code in codes):
+            from code_comparison import compare_many, comparison_metrics
+
+            # Reuse the stored analysis and metrics when a history report is compared unchanged
+            reuse = [report if report is not None and report.code == code else None for report, code in zip(picked, codes)]
+            with st.spinner("Analyzing all snippets at once..."):
+                st.session_state.comparison = compare_many(
+                    codes,
+                    analyses=[report.result if report else None for report in reuse],
+                    metrics=[comparison_metrics(report.metrics) if report else None for report in reuse],
+                )
         else:
-            st.warning("Please enter both code snippets.")
+            st.warning("Please enter every code snippet.")
+
+    # Rendered from session state so choosing another delta metric does not discard the results
+    comp = st.session_state.comparison
+    if comp is not None:
+        import pandas as pd
+        labels = comp['labels']
+        if comp['timed_out']:
+            st.warning(f"The analysis of {' and '.join(comp['timed_out'])} timed out; the metrics below are still complete.")
+        for label, error in comp.get('errors', {}).items():
+            st.error(f"The analysis of {label} failed: {error}. Its metrics below are still complete.")
+
+        st.subheader("Ranking")
+        st.caption("Best first, by the same score the project report uses to find the worst files: complexity, low maintainability, deep nesting and smells all add to it.")
+        st.table(pd.DataFrame([
+            {"Rank": rank + 1, "Snippet": labels[i], "Score": round(comp['scores'][i], 2),
+             "Smells": len(comp['smells'][i]), "Changed lines vs Code 1": comp['changed_lines'][i]}
+            for rank, i in enumerate(comp['ranking'])
+        ]))
+
+        st.subheader("Metrics Comparison")
+        first = comp['metrics'][0]
+        st.table(pd.DataFrame([
+            {"Metric": first[key]['label'], **{label: metrics[key]['value'] for label, metrics in zip(labels, comp['metrics'])}}
+            for key in first
+        ]))
+
+        st.subheader("Pairwise Deltas")
+        delta_options = {"score": "Score", **{key: first[key]['label'] for key in first}}
+        delta_key = st.selectbox("Metric", list(delta_options), format_func=delta_options.get)
+        st.caption("Each cell is the column snippet's value minus the row snippet's value.")
+        st.table(pd.DataFrame(comp['deltas'][delta_key], index=labels, columns=labels).round(2))
+
+        for label, diff in zip(labels[1:], comp['diffs'][1:]):
+            with st.expander(f"Diff: {labels[0]} → {label}"):
+                st.code(diff or "No differences.")
+        for label, analysis in zip(labels, comp['analyses']):
+            if analysis:
+                with st.expander(f"Analysis of {label}"):
+                    st.markdown(analysis)
 
 elif page == "Multi-File Analysis":
     st.markdown('<div class="main-header">📁 Multi-File Analysis</div>', unsafe_allow_html=True)
-    st.markdown('<div class="sub-header">Upload multiple files for project-level analysis.</div>', unsafe_allow_html=True)
+    st.markdown('<div class="sub-header">Upload multiple files, or a whole project as a .zip or .tar.gz, for project-level analysis.</div>', unsafe_allow_html=True)
 
-    uploaded_files = st.file_uploader("Upload multiple files", accept_multiple_files=True)
+    from archive_ingest import is_archive
+    uploaded_files = st.file_uploader("Upload multiple files or a project archive", accept_multiple_files=True)
 
     if uploaded_files:
-        st.write(f"Uploaded {len(uploaded_files)} files.")
+        archives = [file for file in uploaded_files if is_archive(file.name)]
+        plain_files = [file for file in uploaded_files if not is_archive(file.name)]
+        st.write(f"Uploaded {len(plain_files)} files and {len(archives)} archives.")
+        if plain_files:
+            project = st.text_input(
+                "Project name", help="The files' metrics are recorded on the Trends page under this name; "
+                                     "use the same name for later uploads of the project. Archives use their file name.",
+            )
+
+        if archives:
+            with st.expander("Archive options"):
+                include = st.text_input("Include globs (comma-separated)", "*")
+                exclude = st.text_input("Exclude globs (comma-separated)", "")
+                max_member_kb = st.number_input("Skip members larger than (KB)", 1, 100000, 1000)
 
         if st.button("Analyze All"):
-            all_results = []
-
-            # Loop through each file and perform detailed analysis
-            for file in uploaded_files:
-                code = file.read().decode("utf-8")
-                original_len = len(code)
-                if len(code) > 8000:
-                    code = code[:8000]
-                    st.warning(f"File {file.name} is too large ({original_len} characters). Analyzing only the first 8000 characters.")
-
-                # Escape curly braces in code to prevent them from being interpreted as template variables
-                escaped_code = code.replace('{', '{{').replace('}', '}}')
-
-                try:
-                    # Construct the prompt for detailed analysis
-                    prompt = f"""
-                    Please analyze the following Python code in detail. Provide the following insights:
-                    1. A general overview of the code structure (modularity, readability, and maintainability).
-                    2. Identify the cyclomatic complexity and potential areas for refactoring.
-                    3. Check for any coding best practices violations (e.g., long functions, deep nesting, code duplication).
-                    4. Highlight any code smells, such as repeated patterns, overly complex logic, or inefficient code.
-                    5. Assess performance implications (e.g., unnecessary computations, inefficient algorithms).
-
-                    If any issues are found, suggest improvements where applicable.
-
-                    Code:
-                    {escaped_code}
-                    """
-
-                    # Invoke multi-chain analysis with the constructed prompt
-                    multi_chain = create_multi_file_analysis_chain(custom_prompt=prompt, temperature=st.session_state.temperature)
-                    result = multi_chain.invoke({"code": code})
-
-                    # Collect detailed metrics
-                    loc = lines_of_code(code)['value']
-                    cc = cyclomatic_complexity(code)['value']
-                    comments = comment_lines(code)
-                    mi = calculate_maintainability_index(code, loc, comments)['value']  # Maintainability Index
-                    halstead = halstead_metrics(code)  # Halstead metrics
-                    nesting_depth_val = nesting_depth(code)['value']  # Nesting depth
-                    code_smells_list = detect_code_smells(code)  # Code smells
-
-                    # Append results for each file
-                    all_results.append({
-                        "file": file.name,
-                        "loc": loc,
-                        "cc": cc,
-                        "mi": mi,
-                        "halstead": halstead,
-                        "nesting_depth": nesting_depth_val,
-                        "code_smells": code_smells_list,
-                        "result": result.content
-                    })
-
-                except APIStatusError as e:
-                    st.error(f"Analysis failed for {file.name}: {str(e)}")
-                    continue
-
-            # Display summary of results
-            st.subheader("Summary")
-            for res in all_results:
-                st.write(f"**{res['file']}**: LOC {res['loc']}, CC {res['cc']}, MI {res['mi']}")
-                st.write(f"Halstead Metrics: {res['halstead']}")
-                st.write(f"Nesting Depth: {res['nesting_depth']}")
-                st.write(f"Code Smells Detected: {len(res['code_smells'])}")
-                st.text_area(f"Detailed Analysis for {res['file']}", res['result'], height=200)
-
-                # Optionally, visualize the metrics
-                st.bar_chart({
-                    'LOC': res['loc'],
-                    'CC': res['cc'],
-                    'MI': res['mi'],
-                    'Nesting Depth': res['nesting_depth']
-                })
-
-                # Show a list of detected code smells
-                if res['code_smells']:
-                    st.write("Potential Code Smells:")
-                    for smell in res['code_smells']:
-                        st.write(f"- {smell}")
+            from batch_analysis import run_multi_file_job, run_archive_job
+            common = {
+                "temperature": st.session_state.temperature,
+                "routing_policy": st.session_state.routing_policy,
+                "prefilter_rules": st.session_state.prefilter_rules,
+                "packing_policy": st.session_state.packing_policy,
+            }
+            if plain_files and not project.strip():
+                st.error("Enter a project name for the uploaded files.")
+            elif plain_files:
+                files = [(file.name, file.read()) for file in plain_files]
+                job_id = get_job_manager().submit(
+                    "multi_file", f"Multi-File Analysis ({len(files)} files)", run_multi_file_job,
+                    owner=st.session_state.owner_id, code_index=st.session_state.code_index, trend_owner=st.session_state.owner_id,
+                    files=files, project=project.strip(), **common,
+                )
+                st.success(f"Analysis queued as job {job_id}. Follow its progress on the Jobs page; results stay available there.")
+            for archive in archives:
+                job_id = get_job_manager().submit(
+                    "multi_file", f"Multi-File Analysis ({archive.name})", run_archive_job,
+                    owner=st.session_state.owner_id, code_index=st.session_state.code_index, trend_owner=st.session_state.owner_id,
+                    archive=archive, archive_name=archive.name,
+                    include=[glob.strip() for glob in include.split(",") if glob.strip()],
+                    exclude=[glob.strip() for glob in exclude.split(",") if glob.strip()],
+                    max_member_bytes=int(max_member_kb * 1024), **common,
+                )
+                st.success(f"Archive {archive.name} queued as job {job_id}. Follow its progress on the Jobs page.")
 
 elif page == "GitHub Repo":
     st.markdown('<div class="main-header">🐙 GitHub Repo Analysis</div>', unsafe_allow_html=True)
@@ -447,107 +761,245 @@ elif page == "GitHub Repo":
     repo_url = st.text_input("GitHub Repo URL")
     if st.button("Analyze Repo"):
         if repo_url:
-            try:
-                from urllib.parse import urlparse
-                parsed = urlparse(repo_url)
-                path = parsed.path.strip('/')
-                if '/' not in path:
-                    st.error("Invalid GitHub URL. Please provide a URL like https://github.com/owner/repo")
-                else:
-                    owner, repo = path.split('/', 1)
-                    if '/' in repo:
-                        repo = repo.split('/')[0]  # in case of subpaths
-                    g = Github()
-                    repo_obj = g.get_repo(f"{owner}/{repo}")
-                    st.success(f"Analyzing repo: {repo_obj.full_name}")
-
-                    # Get contents of root directory
-                    contents = repo_obj.get_contents("")
-                    code_files = []
-                    for content in contents:
-                        if content.type == "file" and any(content.name.endswith(ext) for ext in ['.py', '.js', '.java', '.cpp', '.c', '.rs', '.go', '.php', '.rb', '.swift', '.kt', '.ts', '.html', '.css', '.json', '.xml']):
-                            code_files.append(content)
-
-                    if not code_files:
-                        st.warning("No code files found in the root directory.")
-                    else:
-                        st.write(f"Found {len(code_files)} code files. Analyzing up to 5 files.")
-
-                        # Analyze up to 5 files
-                        for i, file in enumerate(code_files[:5]):
-                            with st.expander(f"Analysis of {file.name}"):
-                                try:
-                                    code = file.decoded_content.decode('utf-8')
-                                    original_len = len(code)
-                                    if len(code) > 8000:
-                                        code = code[:8000]
-                                        st.warning(f"File {file.name} is too large ({original_len} characters). Analyzing only the first 8000 characters.")
-
-                                    # Calculate metrics
-                                    loc_dict = lines_of_code(code)
-                                    loc = loc_dict['value']
-                                    comments = comment_lines(code)
-                                    cc_dict = cyclomatic_complexity(code)
-                                    cc = cc_dict['value']
-                                    mi_dict = calculate_maintainability_index(code, loc, comments)
-                                    mi = mi_dict['value']
-                                    fkgl_dict = flesch_kincaid_grade_level(code)
-                                    fkgl = fkgl_dict['value']
-                                    smells = detect_code_smells(code)
-                                    halstead = halstead_metrics(code)
-
-                                    # Metrics display
-                                    col1, col2, col3, col4 = st.columns(4)
-                                    with col1:
-                                        status_class = "good-metric" if loc_dict['status'] == "good" else "poor-metric"
-                                        st.markdown(f'<div class="metric-card {status_class}"><strong>{loc_dict["label"]}</strong><br>{loc}</div>', unsafe_allow_html=True)
-                                    with col2:
-                                        status_class = "good-metric" if cc_dict['status'] == "good" else "poor-metric"
-                                        st.markdown(f'<div class="metric-card {status_class}"><strong>{cc_dict["label"]}</strong><br>{cc}</div>', unsafe_allow_html=True)
-                                    with col3:
-                                        status_class = "good-metric" if mi_dict['status'] == "good" else "poor-metric"
-                                        st.markdown(f'<div class="metric-card {status_class}"><strong>{mi_dict["label"]}</strong><br>{mi:.1f}%</div>', unsafe_allow_html=True)
-                                    with col4:
-                                        status_class = "good-metric" if fkgl_dict['status'] == "good" else "poor-metric"
-                                        st.markdown(f'<div class="metric-card {status_class}"><strong>{fkgl_dict["label"]}</strong><br>{fkgl:.1f}</div>', unsafe_allow_html=True)
-
-                                    # AI Analysis
-                                    chain = create_analysis_chain(temperature=st.session_state.temperature)
-                                    result = chain.invoke({"code": code})
-                                    result_str = result.content
-
-                                    # Display sections
-                                    def get_section(content, header):
-                                        start = content.find(header)
-                                        if start == -1:
-                                            return ""
-                                        next_header = content.find("###", start + 1)
-                                        if next_header == -1:
-                                            next_header = len(content)
-                                        return content[start:next_header].strip()
-
-                                    st.markdown(get_section(result_str, "### Language Detected"))
-                                    st.markdown(get_section(result_str, "### Syntax Errors"))
-                                    st.markdown(get_section(result_str, "### Logical Issues/Bugs"))
-                                    st.markdown(get_section(result_str, "### Best Practices & Improvements"))
-                                    st.markdown(get_section(result_str, "### Security & Performance Concerns"))
-                                    st.markdown(get_section(result_str, "### Code Metrics"))
-                                    st.markdown(get_section(result_str, "### Refactoring Suggestions"))
-
-                                except Exception as e:
-                                    st.error(f"Failed to analyze {file.name}: {str(e)}")
-
-            except Exception as e:
-                st.error(f"Error accessing repository: {str(e)}")
+            from urllib.parse import urlparse
+            parsed = urlparse(repo_url)
+            path = parsed.path.strip('/')
+            if '/' not in path:
+                st.error("Invalid GitHub URL. Please provide a URL like https://github.com/owner/repo")
+            else:
+                owner, repo = path.split('/', 1)
+                if '/' in repo:
+                    repo = repo.split('/')[0]  # in case of subpaths
+                from batch_analysis import run_github_job
+                job_id = get_job_manager().submit(
+                    "github", f"GitHub Repo {owner}/{repo}", run_github_job,
+                    owner=st.session_state.owner_id, code_index=st.session_state.code_index, trend_owner=st.session_state.owner_id,
+                    full_name=f"{owner}/{repo}", temperature=st.session_state.temperature,
+                    routing_policy=st.session_state.routing_policy,
+                    prefilter_rules=st.session_state.prefilter_rules,
+                    packing_policy=st.session_state.packing_policy,
+                )
+                st.success(f"Analysis queued as job {job_id}. Follow its progress on the Jobs page; results stay available there.")
         else:
             st.warning("Please enter a GitHub URL.")
 
+elif page == "Local Repo":
+    st.markdown('<div class="main-header">🗂️ Local Repo Analysis</div>', unsafe_allow_html=True)
+    st.markdown('<div class="sub-header">Analyze a clone or bare mirror on this machine at any ref: no API calls or rate limits, and files unchanged since an earlier run are not analyzed again.</div>', unsafe_allow_html=True)
+
+    from local_repo import allowed_roots
+    if allowed_roots():
+        st.caption(f"Repositories under {', '.join(allowed_roots())} can be analyzed.")
+    else:
+        st.info("Local repositories are disabled on this server. Set CODE_JUDGE_LOCAL_REPO_ROOTS to the directories that may be read.")
+    repo_path = st.text_input("Repository path", placeholder="/srv/mirrors/project.git")
+    ref = st.text_input("Ref (branch, tag or commit)", "HEAD")
+    with st.expander("Options"):
+        include = st.text_input("Include globs (comma-separated)", "*")
+        exclude = st.text_input("Exclude globs (comma-separated)", "")
+        from batch_analysis import LOCAL_REPO_MAX_FILES
+        max_files = st.number_input("Analyze at most this many files (0 = all)", 0, 100000, LOCAL_REPO_MAX_FILES)
+    if st.button("Analyze Local Repo"):
+        if repo_path.strip():
+            from local_repo import repo_name, resolve_commit
+            try:
+                commit = resolve_commit(repo_path.strip(), ref.strip())
+            except ValueError as e:
+                st.error(f"Cannot read {ref} in {repo_path}: {e}")
+            else:
+                from batch_analysis import run_local_repo_job
+                job_id = get_job_manager().submit(
+                    "local_repo", f"Local Repo {repo_name(repo_path.strip())}@{ref.strip()}", run_local_repo_job,
+                    owner=st.session_state.owner_id, code_index=st.session_state.code_index, trend_owner=st.session_state.owner_id,
+                    repo_path=repo_path.strip(), ref=commit,
+                    include=[glob.strip() for glob in include.split(",") if glob.strip()],
+                    exclude=[glob.strip() for glob in exclude.split(",") if glob.strip()],
+                    max_files=int(max_files), temperature=st.session_state.temperature,
+                    routing_policy=st.session_state.routing_policy,
+                    prefilter_rules=st.session_state.prefilter_rules,
+                    packing_policy=st.session_state.packing_policy,
+                )
+                st.success(f"Analysis of {commit[:12]} queued as job {job_id}. Follow its progress on the Jobs page; results stay available there.")
+        else:
+            st.warning("Please enter the path of a local repository.")
+
+elif page == "Jobs":
+    st.markdown('<div class="main-header">⏳ Analysis Jobs</div>', unsafe_allow_html=True)
+    st.markdown('<div class="sub-header">Track this session\'s background analyses and open finished results.</div>', unsafe_allow_html=True)
+
+    manager = get_job_manager()
+    jobs = manager.list(st.session_state.owner_id)
+    if not jobs:
+        st.info("No jobs in this session yet. Start a Multi-File, GitHub Repo or Local Repo analysis to see it here.")
+    else:
+        active_ids = {job['id'] for job in jobs if job['status'] in ("queued", "running")}
+        auto_refresh = bool(active_ids) and st.checkbox("Auto-refresh while jobs are running", value=True)
+
+        # Only the job list re-runs on the timer, so polling never blocks or re-renders the rest of the page
+        @st.fragment(run_every=2 if auto_refresh else None)
+        def render_job_list():
+            current = manager.list(st.session_state.owner_id)
+            if {job['id'] for job in current if job['status'] in ("queued", "running")} != active_ids:
+                st.rerun()  # a job started or finished: refresh the results below as well
+            status_icons = {"queued": "🕒", "running": "🔄", "done": "✅", "failed": "🔴", "cancelled": "⏹️"}
+            for job in current:
+                st.markdown(f"{status_icons.get(job['status'], '')} **{job['title']}** — `{job['id']}` — {job['status']}")
+                if job['status'] in ("queued", "running"):
+                    fraction = job['done'] / job['total'] if job['total'] else 0.0
+                    st.progress(fraction, text=job['message'] or "Waiting for a worker...")
+                    if st.button("Cancel", key=f"cancel-{job['id']}") and manager.cancel(job['id'], st.session_state.owner_id):
+                        st.info("Cancelling: the job stops before its next LLM request and keeps what it finished.")
+                elif job['status'] == "failed":
+                    st.error(job['error'])
+                elif job['status'] == "cancelled":
+                    st.warning(job['error'])
+            if active_ids and not auto_refresh:
+                st.button("Refresh")
+
+        render_job_list()
+
+        # Cancelled jobs keep the results they finished before stopping
+        finished = [job for job in jobs if job['status'] in ("done", "cancelled")]
+        if finished:
+            selected = st.selectbox(
+                "Open results", finished,
+                format_func=lambda job: f"{job['title']} ({job['id']})",
+            )
+            job = manager.get(selected['id'], st.session_state.owner_id)
+            if job['result'] is None:
+                st.info("This job was cancelled before it produced any results.")
+            elif job['kind'] == "multi_file":
+                render_multi_file_results(job['result'])
+            elif job['kind'] in ("github", "local_repo"):
+                render_github_results(job['result'])
+
+elif page == "Trends":
+    st.markdown('<div class="main-header">📈 Metric Trends</div>', unsafe_allow_html=True)
+    st.markdown('<div class="sub-header">Follow how code metrics evolve across runs and commits.</div>', unsafe_allow_html=True)
+
+    from datetime import datetime
+    from trend_store import get_trend_store, METRIC_COLUMNS, METRIC_LABELS, AGGREGATES, BUCKETS
+    store = get_trend_store()
+    repos = store.repos(st.session_state.owner_id)
+    if not repos:
+        st.info("No metrics recorded yet. Every Analyze, Multi-File and GitHub run adds rows here.")
+    else:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            repo = st.selectbox("Repository / source", repos)
+        with col2:
+            metric = st.selectbox("Metric", METRIC_COLUMNS, format_func=lambda m: METRIC_LABELS[m])
+        with col3:
+            aggregate = st.selectbox("Aggregate", list(AGGREGATES))
+        with col4:
+            bucket = st.selectbox("Bucket", list(BUCKETS), index=1)
+
+        st.caption(f"{store.count(st.session_state.owner_id, repo)} rows for {repo}, {store.count(st.session_state.owner_id)} in total.")
+        series = store.trend(st.session_state.owner_id, repo, metric, aggregate, bucket)
+        if series:
+            st.line_chart(
+                {
+                    "time": [datetime.fromtimestamp(point['bucket']) for point in series],
+                    METRIC_LABELS[metric]: [point['value'] for point in series],
+                },
+                x="time",
+            )
+            first, last = series[0]['value'], series[-1]['value']
+            if len(series) > 1 and first:
+                st.markdown(f"**{aggregate} {METRIC_LABELS[metric]}** went from {first:.1f} to {last:.1f} ({(last - first) / abs(first):+.0%}).")
+
+        st.subheader(f"Files by latest {METRIC_LABELS[metric]}")
+        st.table([
+            {"File": row['path'], METRIC_LABELS[metric]: row['value'], "Commit": (row['commit_sha'] or "")[:10],
+             "Recorded": datetime.fromtimestamp(row['ts']).strftime("%Y-%m-%d %H:%M")}
+            for row in store.latest_by_path(st.session_state.owner_id, repo, metric)
+        ])
+
 elif page == "Settings":
     st.markdown('<div class="main-header">⚙️ Settings</div>', unsafe_allow_html=True)
     st.markdown('<div class="sub-header">Adjust AI parameters.</div>', unsafe_allow_html=True)
 
     st.session_state.temperature = st.slider("Temperature", 0.0, 1.0, st.session_state.temperature)
     st.write(f"Current temperature: {st.session_state.temperature}")
+    with st.expander("🧭 Adaptive model routing (Multi-File & GitHub)"):
+        from main import DEFAULT_ROUTING_POLICY
+        policy = with_overrides(DEFAULT_ROUTING_POLICY, st.session_state.routing_policy)
+        st.caption("Static metrics pick a tier per file: trivial files get metrics only, flagged files the full prompt on the larger model, everything else a fast triage pass.")
+        overrides = {
+            "enabled": st.checkbox("Enable routing", value=policy["enabled"]),
+            "trivial_max_loc": st.number_input("Trivial: max LOC", 0, 1000, policy["trivial_max_loc"]),
+            "trivial_max_cc": st.number_input("Trivial: max CC", 0, 100, policy["trivial_max_cc"]),
+            "escalate_loc": st.number_input("Escalate: LOC at least", 1, 100000, policy["escalate_loc"]),
+            "escalate_cc": st.number_input("Escalate: CC at least", 1, 1000, policy["escalate_cc"]),
+            "escalate_mi_below": st.number_input("Escalate: MI below", 0.0, 100.0, float(policy["escalate_mi_below"])),
+            "escalate_nesting": st.number_input("Escalate: nesting at least", 1, 100, policy["escalate_nesting"]),
+            "escalate_smells": st.number_input("Escalate: smells at least", 1, 20, policy["escalate_smells"]),
+            "triage_model": st.text_input("Triage model", policy["triage_model"]),
+            "full_model": st.text_input("Escalation model", policy["full_model"]),
+        }
+        st.session_state.routing_policy = {key: value for key, value in overrides.items() if value != DEFAULT_ROUTING_POLICY[key]}
+    with st.expander("🧹 Pre-filter rules (Multi-File & GitHub)"):
+        st.caption("Lockfiles, vendored, minified, generated, binary and data files are skipped or get metrics only before any LLM call. Add your own globs, one per line.")
+        rules = st.session_state.prefilter_rules
+        extra_skip = st.text_area("Also skip paths", "\n".join(rules.get("skip_paths", [])))
+        extra_metrics_only = st.text_area("Metrics only for paths", "\n".join(rules.get("metrics_only_paths", [])))
+        force_analyze = st.text_area("Always analyze paths", "\n".join(rules.get("force_analyze_paths", [])))
+        max_line = st.number_input("Skip when average line length exceeds", 50, 10000, rules.get("max_avg_line_length", 200))
+        st.session_state.prefilter_rules = {
+            key: value for key, value in {
+                "skip_paths": [line.strip() for line in extra_skip.splitlines() if line.strip()],
+                "metrics_only_paths": [line.strip() for line in extra_metrics_only.splitlines() if line.strip()],
+                "force_analyze_paths": [line.strip() for line in force_analyze.splitlines() if line.strip()],
+            }.items() if value
+        }
+        if max_line != 200:
+            st.session_state.prefilter_rules["max_avg_line_length"] = max_line
+    with st.expander("📦 Request packing (Multi-File & GitHub)"):
+        from packing import DEFAULT_PACKING_POLICY
+        packing = with_overrides(DEFAULT_PACKING_POLICY, st.session_state.packing_policy)
+        st.caption("Token counts are estimated before any call: small files share one request, large files are analyzed in parts instead of being truncated.")
+        overrides = {
+            "enabled": st.checkbox("Enable packing", value=packing["enabled"]),
+            "pack_token_budget": st.number_input("Tokens per packed request", 500, 32000, packing["pack_token_budget"], step=500),
+            "max_pack_file_tokens": st.number_input("Pack files up to (tokens)", 50, 8000, packing["max_pack_file_tokens"], step=50),
+            "max_files_per_pack": st.number_input("Files per packed request", 2, 50, packing["max_files_per_pack"]),
+            "max_single_tokens": st.number_input("Split files larger than (tokens)", 500, 32000, packing["max_single_tokens"], step=500),
+            "chunk_tokens": st.number_input("Tokens per part", 200, 16000, packing["chunk_tokens"], step=100),
+        }
+        st.session_state.packing_policy = {key: value for key, value in overrides.items() if value != DEFAULT_PACKING_POLICY[key]}
+    with st.expander("⏱️ Deadlines (all LLM calls)"):
+        from deadlines import DEFAULT_DEADLINES
+        limits = with_overrides(DEFAULT_DEADLINES, st.session_state.deadlines)
+        st.caption("Bound how long any LLM request and any Multi-File or GitHub job may take. Stopped jobs keep the files they finished; timeouts are reported separately from API errors.")
+        overrides = {
+            "call_timeout": st.number_input("Per-call timeout (seconds per attempt)", 5, 600, limits["call_timeout"]),
+            "max_retries": st.number_input("Retries per call", 0, 5, limits["max_retries"]),
+            "batch_timeout": st.number_input("Per-job deadline (seconds)", 30, 24 * 3600, limits["batch_timeout"], step=30),
+            "cancel_with_session": st.checkbox("Stop my jobs once no tab of this session is open (a refresh does not count)", value=limits["cancel_with_session"]),
+        }
+        st.session_state.deadlines = {key: value for key, value in overrides.items() if value != DEFAULT_DEADLINES[key]}
+        use_deadlines(st.session_state.deadlines)
+    with st.expander("⚡ Speculative pre-analysis (Analyze & Input)"):
+        st.caption("Start the analysis as soon as code is uploaded or pasted, so it is underway or finished when you click Analyze Code. Runs for code that changes before the click are cancelled, and a daily budget caps the extra LLM calls.")
+        st.session_state.speculative = st.checkbox("Enable speculative pre-analysis", value=st.session_state.speculative)
+        analyzer = get_speculative_analyzer()
+        st.caption(f"Daily budget, shared by all sessions: {analyzer.used_today()} of {analyzer.daily_budget} LLM calls used today (set with CODE_JUDGE_SPECULATIVE_BUDGET).")
+        if not st.session_state.speculative:
+            analyzer.cancel(st.session_state.speculation_owner)
+    with st.expander("♻️ Similar-code reuse (Analyze & Input)"):
+        from similarity import DEFAULT_REUSE_POLICY, get_similarity_index
+        reuse = with_overrides(DEFAULT_REUSE_POLICY, st.session_state.reuse_policy)
+        st.caption("Code that closely matches an earlier analysis of this session (renamed variables, a few changed lines) shows that analysis at once and gets a short review of the diff instead of a full one. Unchanged code reuses it as is.")
+        overrides = {
+            "enabled": st.checkbox("Enable similar-code reuse", value=reuse["enabled"]),
+            "threshold": st.slider("Similarity threshold", 0.5, 1.0, float(reuse["threshold"]), step=0.01),
+            "min_shared_names": st.slider("Reuse when at least this share of names is shared", 0.0, 1.0, float(reuse["min_shared_names"]), step=0.05),
+            "max_diff_lines": st.number_input("Reuse when at most this many lines changed", 1, 5000, reuse["max_diff_lines"]),
+        }
+        st.session_state.reuse_policy = {key: value for key, value in overrides.items() if value != DEFAULT_REUSE_POLICY[key]}
+        st.caption(f"{get_similarity_index().count(st.session_state.owner_id)} analyses of this session indexed.")
+    st.session_state.retrieval_top_k = st.slider("Chat context chunks (top-k)", 1, 20, st.session_state.retrieval_top_k)
+    st.session_state.retrieval_token_budget = st.slider("Chat context token budget", 200, 6000, st.session_state.retrieval_token_budget, step=100)
     st.info("Changes will apply on next analysis.")
 
 # Footer
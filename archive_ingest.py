@@ -0,0 +1,179 @@
+import codecs
+import tarfile
+import zipfile
+from fnmatch import fnmatch
+
+from prefilter import is_binary
+
+ARCHIVE_SUFFIXES = (".zip", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".tar")
+DEFAULT_EXCLUDE = ["*/.git/*", ".git/*", "__MACOSX/*", "*/__pycache__/*", "*.pyc", "*/node_modules/*", "node_modules/*"]
+PREFIX_BYTES = 8192
+READ_CHUNK_BYTES = 64 * 1024
+
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """
+    Guess the encoding of a file from its first bytes only: a BOM if present, then UTF-8
+    (tolerating a multi-byte character cut off at the end of the prefix), then cp1252,
+    then latin-1, which accepts any byte sequence.
+    """
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        prefix.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def decode_bytes(data: bytes) -> str:
+    """
+    Decode a whole in-memory file using detect_encoding on its prefix.
+    Bytes that do not fit the detected encoding are replaced instead of failing the file.
+    """
+    return data.decode(detect_encoding(data[:PREFIX_BYTES]), errors="replace")
+
+
+class ArchiveReader:
+    """
+    Streams the text members of a .zip or .tar(.gz/.bz2/.xz) archive without extracting to disk.
+
+    Iterating yields (path, text) pairs one member at a time, so peak memory is bounded by the
+    largest accepted member rather than the archive. Members rejected by the include/exclude
+    globs, the size limits or binary sniffing are collected in .skipped as
+    {"file": ..., "reasons": [...]} dicts. Text members over max_member_bytes (up to
+    max_stream_bytes) are not analyzed, but their skipped entry carries static metrics
+    streamed from the archive (see streaming_metrics.stream_metrics).
+    """
+
+    def __init__(self, fileobj, name: str, include: list = None, exclude: list = None,
+                 max_member_bytes: int = 1_000_000, max_total_bytes: int = 100_000_000,
+                 max_stream_bytes: int = 200_000_000):
+        self.fileobj = fileobj
+        self.name = name
+        self.include = include or ["*"]
+        self.exclude = DEFAULT_EXCLUDE + list(exclude or [])
+        self.max_member_bytes = max_member_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_stream_bytes = max_stream_bytes
+        self.total_bytes = 0
+        self.skipped = []
+
+    def _skip(self, path: str, reason: str):
+        self.skipped.append({"file": path, "reasons": [reason]})
+
+    def _accepts_path(self, path: str) -> bool:
+        if not any(fnmatch(path, pattern) for pattern in self.include):
+            return False
+        pattern = next((pattern for pattern in self.exclude if fnmatch(path, pattern)), None)
+        if pattern:
+            self._skip(path, f"excluded by {pattern}")
+            return False
+        return True
+
+    def _accepts_size(self, path: str, size: int) -> bool:
+        if size > self.max_member_bytes:
+            self._skip(path, f"size {size} bytes > {self.max_member_bytes}")
+            return False
+        if self.total_bytes + size > self.max_total_bytes:
+            self._skip(path, f"archive limit of {self.max_total_bytes} uncompressed bytes reached")
+            return False
+        return True
+
+    def _measure_oversized(self, path: str, size: int, stream):
+        """
+        Skip a member too large to analyze, attaching static metrics streamed with bounded memory.
+        """
+        from streaming_metrics import stream_metrics
+        reason = f"size {size} bytes > {self.max_member_bytes}"
+        if size > self.max_stream_bytes or is_binary(stream.peek(PREFIX_BYTES)[:PREFIX_BYTES]):
+            self._skip(path, reason)
+            return
+        result = stream_metrics(stream, max_bytes=self.max_stream_bytes)
+        self.skipped.append({
+            "file": path,
+            "reasons": [reason, "static metrics only, streamed"],
+            "streamed_metrics": {key: metric["value"] for key, metric in result["metrics"].items()},
+            "approximate": result["approximate"],
+        })
+
+    def _read_text(self, path: str, stream):
+        """
+        Read one member: sniff binary content and detect the encoding on a prefix, then decode
+        the rest incrementally. Never reads more than max_member_bytes + 1 bytes, so members
+        whose declared size is wrong cannot exceed the limit.
+        """
+        prefix = stream.read(PREFIX_BYTES)
+        if is_binary(prefix):
+            self._skip(path, "binary content")
+            return None
+        decoder = codecs.getincrementaldecoder(detect_encoding(prefix))(errors="replace")
+        parts = [decoder.decode(prefix)]
+        read = len(prefix)
+        while True:
+            chunk = stream.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            read += len(chunk)
+            if read > self.max_member_bytes:
+                self._skip(path, f"size exceeds {self.max_member_bytes} bytes")
+                return None
+            parts.append(decoder.decode(chunk))
+        parts.append(decoder.decode(b"", final=True))
+        self.total_bytes += read
+        return "".join(parts)
+
+    def _iter_zip(self):
+        with zipfile.ZipFile(self.fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not self._accepts_path(info.filename):
+                    continue
+                if info.file_size > self.max_member_bytes:
+                    with archive.open(info) as stream:
+                        self._measure_oversized(info.filename, info.file_size, stream)
+                    continue
+                if not self._accepts_size(info.filename, info.file_size):
+                    continue
+                with archive.open(info) as stream:
+                    text = self._read_text(info.filename, stream)
+                if text is not None:
+                    yield info.filename, text
+
+    def _iter_tar(self):
+        # "r|*" reads the archive strictly sequentially (any compression), never seeking back
+        with tarfile.open(fileobj=self.fileobj, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not self._accepts_path(member.name):
+                    continue
+                if member.size > self.max_member_bytes:
+                    self._measure_oversized(member.name, member.size, archive.extractfile(member))
+                    continue
+                if not self._accepts_size(member.name, member.size):
+                    continue
+                stream = archive.extractfile(member)
+                text = self._read_text(member.name, stream)
+                if text is not None:
+                    yield member.name, text
+
+    def __iter__(self):
+        if self.name.lower().endswith(".zip"):
+            return self._iter_zip()
+        return self._iter_tar()
@@ -0,0 +1,692 @@
+import tempfile
+from fnmatch import fnmatch
+
+from archive_ingest import DEFAULT_EXCLUDE, ArchiveReader, decode_bytes
+from blob_cache import get_blob_cache
+from deadlines import STOP_MESSAGES, is_timeout
+from local_repo import GitObjectReader, check_repo_path, list_tree, repo_name, resolve_commit
+from main import (
+    DEFAULT_MODEL, create_analysis_chain, create_multi_file_analysis_chain, route_file, create_routed_chain,
+    create_multi_file_prompt_template, create_packed_analysis_chain, create_chunk_analysis_chain
+)
+from packing import DEFAULT_PACKING_POLICY, merge_part_results, plan_requests, render_pack, split_for_analysis, split_packed_response
+from policies import with_overrides
+from prefilter import classify_file, classify_path
+from project_summary import build_project_summary
+from retrieval import estimate_tokens
+from smell_rules import find_smells, language_of, rules_version
+from telemetry import GITHUB_FETCH_ERRORS, GITHUB_FETCH_SECONDS, STATIC_METRICS_SECONDS, invoke_chain, record_cache
+from trend_store import blob_sha, metric_row, record_rows
+from utils import (
+    cyclomatic_complexity, calculate_maintainability_index, lines_of_code, comment_lines,
+    halstead_metrics, nesting_depth, flesch_kincaid_grade_level
+)
+
+MAX_ANALYZED_CHARS = 8000
+GITHUB_EXTENSIONS = ['.py', '.js', '.java', '.cpp', '.c', '.rs', '.go', '.php', '.rb', '.swift', '.kt', '.ts', '.html', '.css', '.json', '.xml']
+GITHUB_MAX_FILES = 5
+LOCAL_REPO_MAX_FILES = 50
+
+
+def _truncate(name: str, code: str, warnings: list) -> str:
+    original_len = len(code)
+    if original_len > MAX_ANALYZED_CHARS:
+        warnings.append(f"File {name} is too large ({original_len} characters). Analyzing only the first {MAX_ANALYZED_CHARS} characters.")
+        return code[:MAX_ANALYZED_CHARS]
+    return code
+
+
+class CodeSpill:
+    """
+    The texts of a batch's measured files, moved out of their entries into an anonymous
+    temporary file until the LLM pass needs them, so a job holds the code of one request at a
+    time instead of the whole batch. Entries keep a code_ref and their token estimate.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._file.close()
+
+    def put(self, entry: dict):
+        code = entry.pop("code")
+        data = code.encode("utf-8")
+        self._file.seek(0, 2)
+        entry["code_ref"] = (self._file.tell(), len(data))
+        entry["tokens"] = estimate_tokens(code)
+        self._file.write(data)
+
+    def read(self, entry: dict) -> str:
+        if "code" in entry:
+            return entry["code"]
+        offset, length = entry["code_ref"]
+        self._file.seek(offset)
+        return self._file.read(length).decode("utf-8")
+
+
+def _drop_code(results: list):
+    """
+    Remove the file texts from finished results; job results are persisted and only need the analyses.
+    """
+    for entry in results:
+        for key in ("code", "code_ref", "tokens"):
+            entry.pop(key, None)
+
+
+def _skipped_entry(name: str, decision: dict) -> dict:
+    return {"file": name, "skipped": True, "reasons": decision["reasons"], "warnings": [], "error": None}
+
+
+def _record_failure(entry: dict, error: Exception, prefix: str = "Analysis failed for"):
+    """
+    Store a failed LLM call on its entry; timeouts are flagged separately from API errors.
+    """
+    if is_timeout(error):
+        entry["error"] = f"Analysis of {entry['file']} timed out."
+        entry["timed_out"] = True
+    else:
+        entry["error"] = f"{prefix} {entry['file']}: {str(error)}"
+
+
+def _plain_metrics(entry: dict) -> dict:
+    """
+    loc, cc, mi and nesting_depth as plain values, from either result shape
+    (flat Multi-File keys or the GitHub "metrics" dicts).
+    """
+    if "metrics" in entry:
+        return {name: entry["metrics"][key]["value"] for key, name in (("loc", "loc"), ("cc", "cc"), ("mi", "mi"), ("nd", "nesting_depth"))}
+    return {name: entry[name] for name in ("loc", "cc", "mi", "nesting_depth")}
+
+
+def _route(name: str, metrics: dict, routing_policy: dict, metrics_only_reasons: list = None):
+    """
+    Routing decision for one file, or None when adaptive routing is turned off.
+    Files the pre-filter marked metrics-only are routed there regardless of the policy.
+    """
+    if metrics_only_reasons:
+        return {"tier": "metrics_only", "model": None, "reasons": metrics_only_reasons}
+    if routing_policy is None or not routing_policy.get("enabled", True):
+        return None
+    return route_file(name, metrics, routing_policy)
+
+
+def measure_multi_file_entry(name: str, code: str, routing_policy: dict = None, metrics_only_reasons: list = None,
+                             truncate: bool = False) -> dict:
+    """
+    Static metrics and routing decision for one Multi-File entry, without any LLM call.
+    With a routing_policy, trivial files get metrics only and flagged files the full prompt
+    on the larger model (see main.route_file). Files are only truncated when packing is off;
+    otherwise oversized files are analyzed in parts by run_llm_pass.
+    Returns a dict with file, metrics, code smells (messages, plus smell_hits with line
+    locations), an empty result, route, warnings and error (None).
+    """
+    warnings = []
+    if truncate:
+        code = _truncate(name, code, warnings)
+
+    # Collect detailed metrics
+    with STATIC_METRICS_SECONDS.time(scope="multi_file"):
+        loc = lines_of_code(code)['value']
+        cc = cyclomatic_complexity(code)['value']
+        depth = nesting_depth(code)['value']
+        smells = find_smells(code, name, {"chars": len(code), "loc": loc, "cc": cc, "nesting": depth})
+        entry = {
+            "file": name,
+            "code": code,
+            "warnings": warnings,
+            "error": None,
+            "loc": loc,
+            "cc": cc,
+            "mi": calculate_maintainability_index(code, loc, comment_lines(code))['value'],  # Maintainability Index
+            "halstead": halstead_metrics(code),
+            "nesting_depth": depth,
+            "code_smells": [hit["message"] for hit in smells],
+            "smell_hits": smells,
+            "result": "",
+        }
+    entry["route"] = _route(name, {**_plain_metrics(entry), "smells": entry["code_smells"]}, routing_policy, metrics_only_reasons)
+    return entry
+
+
+def analyze_multi_file_single(entry: dict, temperature: float = 0.1):
+    """
+    Run the detailed multi-file prompt (or the routed full prompt) for one measured entry,
+    filling in its result or error.
+    """
+    route = entry["route"]
+    # Escape curly braces in code to prevent them from being interpreted as template variables
+    escaped_code = entry["code"].replace('{', '{{').replace('}', '}}')
+
+    # Construct the prompt for detailed analysis
+    prompt = f"""
+    Please analyze the following Python code in detail. Provide the following insights:
+    1. A general overview of the code structure (modularity, readability, and maintainability).
+    2. Identify the cyclomatic complexity and potential areas for refactoring.
+    3. Check for any coding best practices violations (e.g., long functions, deep nesting, code duplication).
+    4. Highlight any code smells, such as repeated patterns, overly complex logic, or inefficient code.
+    5. Assess performance implications (e.g., unnecessary computations, inefficient algorithms).
+
+    If any issues are found, suggest improvements where applicable.
+
+    Code:
+    {escaped_code}
+    """
+
+    try:
+        if route and route["tier"] == "full":
+            chain = create_routed_chain(route, temperature)
+        else:
+            # Invoke multi-chain analysis with the constructed prompt
+            chain = create_multi_file_analysis_chain(
+                custom_prompt=prompt, temperature=temperature,
+                **({"model_name": route["model"]} if route else {}),
+            )
+        result = invoke_chain(chain, {"code": entry["code"]}, flow="multi_file", model=route["model"] if route else DEFAULT_MODEL)
+    except Exception as e:
+        # One failed file (API, connection or parsing error) must not discard the results of the others
+        _record_failure(entry, e)
+        return
+
+    entry["result"] = result.content
+
+
+def _analyze_pack(batch: list, model: str, temperature: float, analyze_single) -> int:
+    """
+    Review several small entries in one packed request and split the answer per file.
+    Entries the answer does not cover, or a failed request, fall back to analyze_single;
+    a timed-out pack fails its entries instead, since retrying each alone would multiply the wait.
+    Returns the number of entries that needed the fallback.
+    """
+    try:
+        chain = create_packed_analysis_chain(temperature, model)
+        text = invoke_chain(
+            chain, {"files": render_pack([(entry["file"], entry["code"]) for entry in batch])}, flow="batch_packed", model=model,
+        ).content
+        analyses = split_packed_response(text, [entry["file"] for entry in batch])
+    except Exception as e:
+        if is_timeout(e):
+            for entry in batch:
+                _record_failure(entry, e)
+            return 0
+        analyses = {}
+    fallbacks = 0
+    for entry in batch:
+        if entry["file"] in analyses:
+            entry["result"] = analyses[entry["file"]]
+            entry["packing"] = {"mode": "packed", "files": len(batch)}
+        else:
+            fallbacks += 1
+            analyze_single(entry, temperature)
+    return fallbacks
+
+
+def _analyze_in_parts(entry: dict, model: str, temperature: float, chunk_tokens: int, deadline=None):
+    """
+    Review an oversized entry part by part and merge the answers into one analysis.
+    Entries routed to the full tier keep the full prompt for every part.
+    When the deadline stops the run between parts, the parts finished so far are kept.
+    """
+    parts = split_for_analysis(entry["code"], chunk_tokens)
+    chain = create_chunk_analysis_chain(temperature, model, full=bool(entry["route"] and entry["route"]["tier"] == "full"))
+    analyses = []
+    try:
+        for i, part in enumerate(parts):
+            if deadline and deadline.stop_reason():
+                entry["partial"] = True
+                entry["warnings"].append(
+                    f"Only lines 1-{parts[i - 1]['end_line'] if i else 0} of {entry['file']} were analyzed: {STOP_MESSAGES[deadline.stop_reason()]}."
+                )
+                break
+            text = invoke_chain(chain, {
+                "path": entry["file"], "part": i + 1, "parts": len(parts),
+                "lines": f"{part['start_line']}-{part['end_line']}", "code": part["text"],
+            }, flow="batch_chunked", model=model).content
+            analyses.append((part["start_line"], part["end_line"], text))
+    except Exception as e:
+        _record_failure(entry, e)
+        return
+    if not analyses:
+        entry["error"] = f"Not analyzed: {STOP_MESSAGES[deadline.stop_reason()]}."
+        entry["not_analyzed"] = True
+        return
+    entry["result"] = merge_part_results(analyses)
+    entry["packing"] = {"mode": "chunked", "parts": len(parts)}
+
+
+def run_llm_pass(entries: list, temperature: float, analyze_single, packing_policy: dict = None, progress=None,
+                 deadline=None, spill: CodeSpill = None) -> dict:
+    """
+    Run the LLM analyses for measured entries, grouped into as few requests as the packing
+    policy allows (see packing.plan_requests). Skipped, failed, metrics-only and already
+    analyzed (e.g. cached) entries are left alone.
+    analyze_single(entry, temperature) handles files that get a request of their own.
+    The deadline (a deadlines.Deadline) is checked before every request; once it stops the run,
+    the remaining entries are marked not_analyzed and keep only their static metrics.
+    With a spill, the code of each request's entries is read back for that request only.
+    Returns the packing stats of the run plus timeouts and not_analyzed counts.
+    """
+    policy = with_overrides(DEFAULT_PACKING_POLICY, packing_policy)
+    pending = [
+        entry for entry in entries
+        if not entry.get("skipped") and not entry.get("error") and not entry["result"]
+        and not (entry["route"] and entry["route"]["tier"] == "metrics_only")
+    ]
+    plan = plan_requests(
+        [
+            {
+                "key": i,
+                "tokens": entry["tokens"] if "tokens" in entry else estimate_tokens(entry["code"]),
+                "model": entry["route"]["model"] if entry["route"] else DEFAULT_MODEL,
+                # Escalated files keep a dedicated request with the full prompt
+                "packable": not (entry["route"] and entry["route"]["tier"] == "full"),
+            }
+            for i, entry in enumerate(pending)
+        ],
+        policy,
+        prompt_overhead=estimate_tokens(create_multi_file_prompt_template().template),
+    )
+    fallbacks = 0
+    for n, request in enumerate(plan["requests"]):
+        batch = [pending[key] for key in request["keys"]]
+        reason = deadline.stop_reason() if deadline else ""
+        if reason:
+            for entry in (pending[key] for later in plan["requests"][n:] for key in later["keys"]):
+                entry["error"] = f"Not analyzed: {STOP_MESSAGES[reason]}."
+                entry["not_analyzed"] = True
+            break
+        if progress:
+            progress(n, len(plan["requests"]), f"Analyzing {', '.join(entry['file'] for entry in batch)}")
+        if spill:
+            for entry in batch:
+                entry["code"] = spill.read(entry)
+        if request["mode"] == "packed":
+            fallbacks += _analyze_pack(batch, request["model"], temperature, analyze_single)
+        elif request["mode"] == "chunked":
+            _analyze_in_parts(batch[0], request["model"], temperature, policy["chunk_tokens"], deadline)
+        else:
+            analyze_single(batch[0], temperature)
+        if spill:
+            for entry in batch:
+                del entry["code"]
+    return {
+        **plan["stats"], "fallbacks": fallbacks,
+        "timeouts": sum(1 for entry in pending if entry.get("timed_out")),
+        "not_analyzed": sum(1 for entry in pending if entry.get("not_analyzed")),
+    }
+
+
+def _summary_inputs(results: list) -> list:
+    """
+    Shape successful per-file results for project_summary: path, analysis, metrics, smells and blob.
+    Entries left unanalyzed by a stopped run keep their static metrics and an empty analysis.
+    """
+    files = []
+    for entry in results:
+        if entry.get("skipped") or (entry.get("error") and not entry.get("not_analyzed")):
+            continue
+        if entry.get("not_analyzed") or (entry.get("route") and entry["route"]["tier"] == "metrics_only"):
+            analysis = ""
+        else:
+            analysis = entry["result"]
+        files.append({
+            "path": entry["file"], "analysis": analysis, "metrics": _plain_metrics(entry),
+            "smells": entry["code_smells"], "blob": entry.get("blob"),
+        })
+    return files
+
+
+def measure_batch_file(name: str, data, routing_policy: dict = None, prefilter_rules: dict = None, truncate: bool = False) -> dict:
+    """
+    Pre-filter one file of a batch (see prefilter.classify_file), then measure and route it unless it is skipped.
+    data may be bytes or already decoded text.
+    """
+    decision = classify_file(name, data, prefilter_rules)
+    if decision["action"] == "skip":
+        return _skipped_entry(name, decision)
+    code = decode_bytes(data) if isinstance(data, bytes) else data
+    metrics_only_reasons = decision["reasons"] if decision["action"] == "metrics_only" else None
+    entry = measure_multi_file_entry(name, code, routing_policy, metrics_only_reasons, truncate)
+    entry["blob"] = blob_sha(data if isinstance(data, bytes) else data.encode("utf-8"))
+    return entry
+
+
+def _record_trends(owner: str, repo: str, results: list, commit_sha: str = None, source: str = ""):
+    """
+    Append the metrics of every analyzed (or metrics-only) file to owner's series for repo in the trend store.
+    """
+    by_path = {entry["file"]: entry for entry in results}
+    rows = [
+        metric_row(f["path"], f["metrics"], f["smells"], blob=by_path[f["path"]].get("blob"))
+        for f in _summary_inputs(results)
+    ]
+    record_rows(owner, repo, rows, commit_sha=commit_sha, source=source)
+
+
+def _index_results(code_index, results: list, prefix: str = "", spill: CodeSpill = None):
+    """
+    Add the analyzed files of a finished LLM pass to the submitting session's chat index
+    (a retrieval.CodeIndex), once per job rather than every time its results are displayed.
+    """
+    if code_index is None:
+        return
+    for entry in results:
+        if entry.get("result") and not entry.get("error"):
+            code = spill.read(entry) if spill else entry["code"]
+            code_index.add_analysis(f"{prefix}{entry['file']}", code, entry["result"])
+
+
+def _finish_summary(project: str, results: list, temperature: float, progress, deadline) -> dict:
+    """
+    The project summary, unless the run was stopped: its extra LLM calls would be spent on
+    an incomplete picture nobody is waiting for. A stop during the summary ends it with a
+    partial one (see project_summary.ProjectSummarizer).
+    """
+    if deadline and deadline.stop_reason():
+        return None
+    return build_project_summary(project, _summary_inputs(results), temperature, progress, deadline)
+
+
+def run_multi_file_job(files, temperature: float = 0.1, routing_policy: dict = None, prefilter_rules: dict = None,
+                       progress=None, project: str = None, packing_policy: dict = None, deadline=None,
+                       code_index=None, trend_owner: str = "") -> dict:
+    """
+    Job function for Multi-File Analysis.
+    files is a list or any iterable (e.g. a generator over archive members) of
+    (name, bytes or text) pairs. Every file is measured first, then small files are packed
+    into shared LLM requests (see run_llm_pass). Measured code waits in a CodeSpill, and
+    results are returned without it. A stopped deadline ends the run early with the results
+    finished so far. Analyzed files are added to code_index, when given.
+    project (required) names the upload in the summary and keys trend_owner's trend series,
+    so later uploads of the same project extend it.
+    Returns a dict with one result dict per file, the packing stats, the hierarchical project
+    summary and stopped (why the run ended early, or "").
+    """
+    if not project:
+        raise ValueError("A project name is needed to record the upload's trends")
+    total = len(files) if hasattr(files, "__len__") else 0
+    truncate = not with_overrides(DEFAULT_PACKING_POLICY, packing_policy)["enabled"]
+    results = []
+    with CodeSpill() as spill:
+        for i, (name, data) in enumerate(files):
+            if deadline and deadline.stop_reason():
+                break
+            if progress:
+                progress(i, total, f"Measuring {name}")
+            entry = measure_batch_file(name, data, routing_policy, prefilter_rules, truncate)
+            if "code" in entry:
+                spill.put(entry)
+            results.append(entry)
+        packing = run_llm_pass(results, temperature, analyze_multi_file_single, packing_policy, progress, deadline, spill)
+        _index_results(code_index, results, spill=spill)
+    _drop_code(results)
+    _record_trends(trend_owner, project, results, source="multi_file")
+    summary = _finish_summary(project, results, temperature, progress, deadline)
+    if progress:
+        progress(len(results), len(results), "Finished")
+    return {
+        "results": results, "packing": packing, "project_summary": summary,
+        "stopped": deadline.message() if deadline else "",
+    }
+
+
+def run_archive_job(archive, archive_name: str, include: list = None, exclude: list = None,
+                    max_member_bytes: int = 1_000_000, temperature: float = 0.1, routing_policy: dict = None,
+                    prefilter_rules: dict = None, progress=None, packing_policy: dict = None, deadline=None,
+                    code_index=None, trend_owner: str = "") -> dict:
+    """
+    Job function for Multi-File Analysis of a .zip/.tar.gz upload, recorded in the trends under its archive name.
+    Members are streamed one at a time from the archive into the same pipeline as
+    individual uploads; members rejected during ingestion are reported as skipped.
+    """
+    reader = ArchiveReader(archive, archive_name, include=include, exclude=exclude, max_member_bytes=max_member_bytes)
+    job_result = run_multi_file_job(
+        iter(reader), temperature, routing_policy, prefilter_rules, progress=progress, project=archive_name,
+        packing_policy=packing_policy, deadline=deadline, code_index=code_index, trend_owner=trend_owner,
+    )
+    job_result["results"].extend({**skipped, "skipped": True, "warnings": [], "error": None} for skipped in reader.skipped)
+    return job_result
+
+
+def measure_repo_file(name: str, code: str, routing_policy: dict = None, metrics_only_reasons: list = None,
+                      truncate: bool = False) -> dict:
+    """
+    Dashboard metrics and routing decision for one repository file, without any LLM call.
+    """
+    warnings = []
+    if truncate:
+        code = _truncate(name, code, warnings)
+    with STATIC_METRICS_SECONDS.time(scope="github"):
+        loc_dict = lines_of_code(code)
+        cc_dict = cyclomatic_complexity(code)
+        nd_dict = nesting_depth(code)
+        smells = find_smells(code, name, {"chars": len(code), "loc": loc_dict['value'], "cc": cc_dict['value'], "nesting": nd_dict['value']})
+        entry = {
+            "file": name,
+            "code": code,
+            "warnings": warnings,
+            "error": None,
+            "metrics": {
+                "loc": loc_dict,
+                "cc": cc_dict,
+                "mi": calculate_maintainability_index(code, loc_dict['value'], comment_lines(code)),
+                "fkgl": flesch_kincaid_grade_level(code),
+                "nd": nd_dict,
+            },
+            "code_smells": [hit["message"] for hit in smells],
+            "smell_hits": smells,
+            "halstead": halstead_metrics(code),
+            "result": "",
+        }
+    entry["route"] = _route(name, {**_plain_metrics(entry), "smells": entry["code_smells"]}, routing_policy, metrics_only_reasons)
+    return entry
+
+
+def analyze_repo_single(entry: dict, temperature: float = 0.1):
+    """
+    Run the full analysis prompt for one repository file; with a routing decision the
+    prompt and model follow main.route_file instead.
+    """
+    route = entry["route"]
+    try:
+        chain = create_routed_chain(route, temperature) if route else create_analysis_chain(temperature=temperature)
+        entry["result"] = invoke_chain(
+            chain, {"code": entry["code"]}, flow="github", model=route["model"] if route else DEFAULT_MODEL,
+        ).content
+    except Exception as e:
+        _record_failure(entry, e, prefix="Failed to analyze")
+
+
+def _github_fetch(operation: str, fn):
+    """
+    Call fn() for one GitHub API request, recording its latency and any failure.
+    """
+    try:
+        with GITHUB_FETCH_SECONDS.time(operation=operation):
+            return fn()
+    except Exception as e:
+        GITHUB_FETCH_ERRORS.inc(operation=operation, error=type(e).__name__)
+        raise
+
+
+def run_github_job(full_name: str, temperature: float = 0.1, routing_policy: dict = None, prefilter_rules: dict = None,
+                   progress=None, packing_policy: dict = None, deadline=None, code_index=None, trend_owner: str = "") -> dict:
+    """
+    Job function for GitHub Repo analysis: fetch root-level code files and analyze up to GITHUB_MAX_FILES.
+    Files the pre-filter skips by path or size are recorded without being fetched and do not
+    count against the limit; small files are packed into shared LLM requests.
+    Returns a dict with repo, files_found, per-file results, packing stats and stopped.
+    """
+    from github import Github
+
+    if progress:
+        progress(0, 0, f"Fetching {full_name}")
+    repo_obj = _github_fetch("repo", lambda: Github().get_repo(full_name))
+    commit_sha = _github_fetch("branch", lambda: repo_obj.get_branch(repo_obj.default_branch).commit.sha)
+
+    # Get contents of root directory
+    contents = _github_fetch("contents", lambda: repo_obj.get_contents(""))
+    code_files = [
+        content for content in contents
+        if content.type == "file" and any(content.name.endswith(ext) for ext in GITHUB_EXTENSIONS)
+    ]
+
+    results = []
+    candidates = []
+    for content in code_files:
+        decision = classify_path(content.path, content.size, prefilter_rules)
+        if decision["action"] == "skip":
+            results.append(_skipped_entry(content.path, decision))
+        else:
+            candidates.append(content)
+
+    truncate = not with_overrides(DEFAULT_PACKING_POLICY, packing_policy)["enabled"]
+    selected = candidates[:GITHUB_MAX_FILES]
+    for i, file in enumerate(selected):
+        if deadline and deadline.stop_reason():
+            break
+        if progress:
+            progress(i, len(selected), f"Fetching {file.path}")
+        try:
+            data = _github_fetch("file", lambda: file.decoded_content)
+            decision = classify_file(file.path, data, prefilter_rules)
+            if decision["action"] == "skip":
+                results.append(_skipped_entry(file.path, decision))
+                continue
+            code = data.decode('utf-8')
+        except Exception as e:
+            results.append({"file": file.path, "error": f"Failed to analyze {file.name}: {str(e)}", "warnings": []})
+            continue
+        metrics_only_reasons = decision["reasons"] if decision["action"] == "metrics_only" else None
+        entry = measure_repo_file(file.path, code, routing_policy, metrics_only_reasons, truncate)
+        entry["blob"] = file.sha
+        results.append(entry)
+    packing = run_llm_pass(results, temperature, analyze_repo_single, packing_policy, progress, deadline)
+    _index_results(code_index, results, prefix=f"{repo_obj.full_name}/")
+    _drop_code(results)
+    _record_trends(trend_owner, repo_obj.full_name, results, commit_sha=commit_sha, source="github")
+    summary = _finish_summary(repo_obj.full_name, results, temperature, progress, deadline)
+    if progress:
+        progress(len(selected), len(selected), "Finished")
+    return {
+        "repo": repo_obj.full_name, "files_found": len(code_files), "results": results,
+        "packing": packing, "project_summary": summary, "stopped": deadline.message() if deadline else "",
+    }
+
+
+def _blob_analysis_kind(route: dict, temperature: float, truncate: bool) -> str:
+    # Analyses are only reused for the same prompt tier, model, temperature and input: a
+    # truncated file's analysis covers its first MAX_ANALYZED_CHARS only
+    return (f"repo_analysis:{route['tier'] if route else 'default'}:{route['model'] if route else DEFAULT_MODEL}:{temperature}"
+            f":{'truncated' if truncate else 'whole'}")
+
+
+def _blob_metrics_kind(path: str, rules: str, truncate: bool) -> str:
+    # Smells depend on the language-scoped rules in effect, so the same blob under another
+    # extension or after a rule change is measured again
+    return f"repo_metrics:{language_of(path) or 'other'}:{rules}:{'truncated' if truncate else 'whole'}"
+
+
+def _measure_local_file(path: str, code: str, blob: str, routing_policy: dict, metrics_only_reasons: list, truncate: bool,
+                        rules: str) -> dict:
+    """
+    measure_repo_file for a file of a local repository, with the static metrics cached by blob
+    SHA; rules is the smell_rules.rules_version in effect for the run.
+    """
+    cache = get_blob_cache()
+    kind = _blob_metrics_kind(path, rules, truncate)
+    cached = cache.get(blob, kind)
+    record_cache("blob_metrics", cached is not None)
+    if cached is None:
+        entry = measure_repo_file(path, code, routing_policy, metrics_only_reasons, truncate)
+        cache.put(blob, kind, {key: entry[key] for key in ("metrics", "code_smells", "smell_hits", "halstead")})
+    else:
+        warnings = []
+        if truncate:
+            code = _truncate(path, code, warnings)
+        entry = {"file": path, "code": code, "warnings": warnings, "error": None, **cached, "result": ""}
+        entry["route"] = _route(path, {**_plain_metrics(entry), "smells": entry["code_smells"]}, routing_policy, metrics_only_reasons)
+    entry["blob"] = blob
+    return entry
+
+
+def run_local_repo_job(repo_path: str, ref: str = "HEAD", include: list = None, exclude: list = None,
+                       max_files: int = LOCAL_REPO_MAX_FILES, temperature: float = 0.1, routing_policy: dict = None,
+                       prefilter_rules: dict = None, progress=None, packing_policy: dict = None, deadline=None,
+                       code_index=None, trend_owner: str = "") -> dict:
+    """
+    Job function for Local Repo analysis of a clone or bare mirror on this machine.
+    The tree of ref is listed with one `git ls-tree` and contents are read through one
+    `git cat-file --batch` process (see local_repo.py), so there are no API calls or rate limits.
+    Files filtered by the include/exclude globs or skipped by the pre-filter are not read;
+    up to max_files (0: all) of the rest are measured and analyzed. Metrics and analyses are
+    cached by blob SHA, so files unchanged since any earlier run cost no LLM call.
+    Returns the GitHub job result shape plus ref, commit, max_files and cached (reused analyses).
+    """
+    name = repo_name(repo_path)
+    # Checked again here rather than trusted from the page, and every git call uses the resolved path
+    repo_path = check_repo_path(repo_path)
+    if progress:
+        progress(0, 0, f"Listing {name} at {ref}")
+    commit_sha = resolve_commit(repo_path, ref)
+    include = include or ["*"]
+    exclude = DEFAULT_EXCLUDE + list(exclude or [])
+    files = [
+        f for f in list_tree(repo_path, commit_sha)
+        if any(fnmatch(f["path"], pattern) for pattern in include) and not any(fnmatch(f["path"], pattern) for pattern in exclude)
+    ]
+
+    results = []
+    candidates = []
+    for f in files:
+        decision = classify_path(f["path"], f["size"], prefilter_rules)
+        if decision["action"] == "skip":
+            results.append(_skipped_entry(f["path"], decision))
+        else:
+            candidates.append(f)
+
+    truncate = not with_overrides(DEFAULT_PACKING_POLICY, packing_policy)["enabled"]
+    selected = candidates[:max_files] if max_files else candidates
+    cache = get_blob_cache()
+    rules = rules_version()
+    cached = 0
+    with CodeSpill() as spill, GitObjectReader(repo_path) as reader:
+        for i, f in enumerate(selected):
+            if deadline and deadline.stop_reason():
+                break
+            if progress:
+                progress(i, len(selected), f"Reading {f['path']}")
+            data = reader.read(f["blob"])
+            decision = classify_file(f["path"], data, prefilter_rules)
+            if decision["action"] == "skip":
+                results.append(_skipped_entry(f["path"], decision))
+                continue
+            metrics_only_reasons = decision["reasons"] if decision["action"] == "metrics_only" else None
+            entry = _measure_local_file(f["path"], decode_bytes(data), f["blob"], routing_policy, metrics_only_reasons, truncate, rules)
+            if not (entry["route"] and entry["route"]["tier"] == "metrics_only"):
+                analysis = cache.get(f["blob"], _blob_analysis_kind(entry["route"], temperature, truncate))
+                record_cache("blob_analysis", analysis is not None)
+                if analysis is not None:
+                    entry["result"] = analysis
+                    entry["cached"] = True
+                    cached += 1
+            spill.put(entry)
+            results.append(entry)
+        packing = run_llm_pass(results, temperature, analyze_repo_single, packing_policy, progress, deadline, spill)
+        for entry in results:
+            if entry.get("result") and not entry.get("cached") and not entry["error"] and not entry.get("partial"):
+                cache.put(entry["blob"], _blob_analysis_kind(entry["route"], temperature, truncate), entry["result"])
+        _index_results(code_index, results, prefix=f"{name}/", spill=spill)
+    _drop_code(results)
+    _record_trends(trend_owner, name, results, commit_sha=commit_sha, source="local_repo")
+    summary = _finish_summary(name, results, temperature, progress, deadline)
+    if progress:
+        progress(len(selected), len(selected), "Finished")
+    return {
+        "repo": name, "ref": ref, "commit": commit_sha, "files_found": len(files), "max_files": max_files,
+        "results": results, "packing": packing, "project_summary": summary, "cached": cached,
+        "stopped": deadline.message() if deadline else "",
+    }
@@ -0,0 +1,143 @@
+"""
+Import-time benchmark for the app's modules.
+
+Runs each module import in a fresh interpreter with `python -X importtime` and reports
+the cumulative import cost, so changes to startup cost show up in review.
+
+Usage:
+    python bench_imports.py                 # table of all tracked modules
+    python bench_imports.py --top 15        # also list the heaviest transitive imports per module
+    python bench_imports.py --json out.json # save results to compare against a later run
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Modules loaded on demand by individual pages and actions
+PAGE_IMPORTS = {
+    "Analyze & Input": ["main"],
+    "Export": ["analysis_export"],
+    "Format Code": ["black"],
+    "Chat": ["chat"],
+    "Code Comparison": ["code_comparison", "pandas"],
+    "Multi-File / GitHub jobs": ["batch_analysis", "github"],
+}
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+_interpreter_baseline = None
+
+
+def _parse(stderr: str):
+    entries = []
+    other = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, package = match.groups()
+            entries.append({
+                "package": package,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": (len(indent) - 1) // 2,
+            })
+        elif not line.startswith("import time:"):
+            other.append(line)
+    return entries, other
+
+
+def interpreter_baseline() -> set:
+    """
+    Packages every interpreter imports before running any code (site, encodings, ...).
+    They are excluded so totals only reflect the app's own imports.
+    """
+    global _interpreter_baseline
+    if _interpreter_baseline is None:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+        _interpreter_baseline = {entry["package"] for entry in _parse(proc.stderr)[0]}
+    return _interpreter_baseline
+
+
+def measure(modules: list) -> dict:
+    """
+    Import modules in a fresh interpreter and parse the -X importtime report.
+    Returns a dict with total_us (cumulative time of the requested modules), entries
+    (package, self_us, cumulative_us, depth) and error (stderr tail if the import failed).
+    """
+    statement = "; ".join(f"import {module}" for module in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True,
+    )
+    baseline = interpreter_baseline()
+    entries, other = _parse(proc.stderr)
+    entries = [entry for entry in entries if entry["package"] not in baseline]
+    total_us = sum(entry["cumulative_us"] for entry in entries if entry["depth"] == 0)
+    error = "\n".join(other[-3:]) if proc.returncode != 0 else None
+    return {"modules": modules, "total_us": total_us, "entries": entries, "error": error}
+
+
+def startup_imports(path: str = APP_SCRIPT) -> list:
+    """
+    What a cold start of the Streamlit script pays before any page is used: the modules
+    app.py imports at module level, read from the script itself so the list cannot drift.
+    Imports inside page branches and functions are lazy and left out.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(name for name in names if name not in modules)
+    return modules
+
+
+def run_benchmark(top: int = 0) -> dict:
+    results = {"startup": measure(startup_imports()), "pages": {}}
+    for page, modules in PAGE_IMPORTS.items():
+        results["pages"][page] = measure(modules)
+
+    def report(name, result):
+        if result["error"]:
+            print(f"{name:<28} {'failed':>10}   {result['error'].splitlines()[-1]}")
+            return
+        print(f"{name:<28} {result['total_us'] / 1000:>8.1f}ms   {', '.join(result['modules'])}")
+        if top:
+            heaviest = sorted(result["entries"], key=lambda entry: entry["self_us"], reverse=True)[:top]
+            for entry in heaviest:
+                print(f"{'':<30}{entry['self_us'] / 1000:>8.1f}ms self  {entry['package']}")
+
+    print(f"{'Scope':<28} {'Import':>10}   Modules")
+    report("Cold start (eager imports)", results["startup"])
+    for page, result in results["pages"].items():
+        report(page, result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import cost of the app's modules.")
+    parser.add_argument("--top", type=int, default=0, help="show the N heaviest transitive imports per scope")
+    parser.add_argument("--json", help="write the raw measurements to this file")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.top)
+    if args.json:
+        for result in [results["startup"], *results["pages"].values()]:
+            result.pop("entries")
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import json
+import sqlite3
+import threading
+import time
+
+from storage import data_path, shared
+
+
+class BlobCache:
+    """
+    Persistent cache of per-file results keyed by git blob SHA and a kind (e.g. static metrics,
+    or an analysis by a given model and prompt). A blob SHA names the exact content, so
+    unchanged files are free across commits, branches and clones. The content is all the SHA
+    covers: everything else the result depends on (language, smell rules, model, truncation)
+    has to be part of the kind, or a stale entry is returned.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or data_path("blob_cache.db")
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    blob TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (blob, kind)
+                ) WITHOUT ROWID
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, blob: str, kind: str):
+        """
+        The cached value (any JSON-serializable value) or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE blob = ? AND kind = ?", (blob, kind)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, blob: str, kind: str, value):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (blob, kind, value, created) VALUES (?, ?, ?, ?)",
+                (blob, kind, json.dumps(value), time.time()),
+            )
+
+
+@shared
+def get_blob_cache() -> BlobCache:
+    """
+    Process-wide BlobCache shared by the Streamlit sessions and the job workers.
+    """
+    return BlobCache()
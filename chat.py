@@ -3,6 +3,8 @@ from langchain.prompts import PromptTemplate
 from langchain.chains import ConversationChain
 from langchain.memory import ConversationBufferMemory
 import os
+from deadlines import is_timeout, llm_limits
+from telemetry import llm_call
 
 def create_chat_chain(temperature: float = 0.7):
     """Create a conversation chain for chatting about code."""
@@ -14,6 +16,7 @@ def create_chat_chain(temperature: float = 0.7):
         groq_api_key=api_key,
         model_name="llama-3.1-8b-instant",
         temperature=temperature,  # Configurable temperature for conversational responses
+        **llm_limits(),
     )
 
     # Create a prompt template for code-related conversations
@@ -41,10 +44,28 @@ Assistant: """
 
     return chain
 
-def send_message(chain, message):
-    """Send a message to the chat chain and get response."""
+def send_message(chain, message, context=""):
+    """
+    Send a message to the chat chain and get response.
+    If context (retrieved code/analysis chunks) is given it is injected into this turn's
+    prompt only; the conversation memory keeps the plain message so context is not
+    re-sent on every following turn.
+    """
+    prompt_input = message
+    if context:
+        prompt_input = f"""Relevant code and analysis excerpts from this session:
+{context}
+
+Question: {message}"""
     try:
-        response = chain.predict(input=message)
+        with llm_call("chat", getattr(chain.llm, "model_name", "")):
+            response = chain.predict(input=prompt_input)
+        if context:
+            messages = chain.memory.chat_memory.messages
+            if len(messages) >= 2 and messages[-2].content == prompt_input:
+                messages[-2].content = message
         return response
     except Exception as e:
+        if is_timeout(e):
+            return "Sorry, the model did not answer in time. Please try again or raise the call timeout in Settings."
         return f"Sorry, I encountered an error: {str(e)}"
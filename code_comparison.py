@@ -1,59 +1,142 @@
 import difflib
+from concurrent.futures import ThreadPoolExecutor
+from groq import APIStatusError
 from main import create_analysis_chain
-from utils import (
-    flesch_kincaid_grade_level, cyclomatic_complexity, calculate_maintainability_index,
-    lines_of_code, comment_lines, detect_code_smells, halstead_metrics,
-    nesting_depth, function_count, variable_count, code_duplication_percentage
-)
+from deadlines import is_timeout
+from incremental_metrics import IncrementalMetrics
+from project_summary import badness_score
+from telemetry import STATIC_METRICS_SECONDS, invoke_chain
+from utils import detect_code_smells
 
-def compare_codes(code1: str, code2: str):
+MAX_PARALLEL_ANALYSES = 8
+
+def comparison_metrics(report_metrics: dict) -> dict:
     """
-    Compare two code snippets: generate diff, analyze both, and compare metrics.
-    Returns a dict with diff, analysis1, analysis2, metrics1, metrics2, comparison.
+    Pick the metrics compared side by side out of an AnalysisReport metric dict.
     """
-    chain = create_analysis_chain()
+    return {
+        "loc": report_metrics["loc"], "cc": report_metrics["cc"], "mi": report_metrics["mi"], "fk": report_metrics["fkgl"],
+        "nd": report_metrics["nd"], "fc": report_metrics["fc"], "vc": report_metrics["vc"], "dup": report_metrics["dup"]
+    }
 
-    # Generate unified diff
-    diff = difflib.unified_diff(
-        code1.splitlines(keepends=True),
-        code2.splitlines(keepends=True),
-        fromfile='Code 1',
-        tofile='Code 2',
-        lineterm=''
-    )
-    diff_text = ''.join(diff)
+def measure_revisions(codes: list, known: list = None) -> list:
+    """
+    Comparison metrics (see comparison_metrics) for each code in codes, in one pass.
+    Revisions of the same code mostly share lines, so one IncrementalMetrics walks from each
+    code to the next and only re-measures the lines that changed; every value still equals
+    the utils.py function on that code. known[i], when given, is reused for codes[i].
+    """
+    known = known or [None] * len(codes)
+    tracker = IncrementalMetrics()
+    results = []
+    with STATIC_METRICS_SECONDS.time(scope="comparison"):
+        for code, metrics in zip(codes, known):
+            if metrics is None:
+                tracker.update(code)
+                metrics = comparison_metrics(tracker.metrics())
+            results.append(metrics)
+    return results
 
-    # Analyze both codes
-    analysis1 = chain.invoke({"code": code1}).content
-    analysis2 = chain.invoke({"code": code2}).content
+def _analyze(chain, code: str):
+    """
+    LLM analysis of one snippet as (analysis, error): (None, None) if the call timed out and
+    (None, message) if the API refused it (e.g. a rate limit), so one failed snippet does not
+    fail the whole comparison.
+    """
+    try:
+        return invoke_chain(chain, {"code": code}, flow="compare").content, None
+    except APIStatusError as e:
+        return None, str(e)
+    except Exception as e:
+        if is_timeout(e):
+            return None, None
+        raise
 
-    # Calculate metrics for both
-    loc1 = lines_of_code(code1)
-    loc2 = lines_of_code(code2)
-    cc1 = cyclomatic_complexity(code1)
-    cc2 = cyclomatic_complexity(code2)
-    mi1 = calculate_maintainability_index(code1, loc1['value'], comment_lines(code1))
-    mi2 = calculate_maintainability_index(code2, loc2['value'], comment_lines(code2))
-    fk1 = flesch_kincaid_grade_level(code1)
-    fk2 = flesch_kincaid_grade_level(code2)
-    nd1 = nesting_depth(code1)
-    nd2 = nesting_depth(code2)
-    fc1 = function_count(code1)
-    fc2 = function_count(code2)
-    vc1 = variable_count(code1)
-    vc2 = variable_count(code2)
-    dup1 = code_duplication_percentage(code1)
-    dup2 = code_duplication_percentage(code2)
+def analyze_concurrently(codes: list, known: list = None) -> tuple:
+    """
+    LLM analyses of codes, run at the same time (up to MAX_PARALLEL_ANALYSES requests), so
+    comparing several snippets takes about as long as analyzing one. known[i], when given,
+    is reused instead of analyzing codes[i].
+    Returns (analyses, errors): failed and timed-out analyses are None, and errors[i] holds
+    the API error message of a failed one (None otherwise).
+    """
+    analyses = list(known or [None] * len(codes))
+    errors = [None] * len(codes)
+    missing = [i for i, analysis in enumerate(analyses) if analysis is None]
+    if missing:
+        chain = create_analysis_chain()
+        with ThreadPoolExecutor(max_workers=min(len(missing), MAX_PARALLEL_ANALYSES)) as pool:
+            for i, (analysis, error) in zip(missing, pool.map(lambda i: _analyze(chain, codes[i]), missing)):
+                analyses[i], errors[i] = analysis, error
+    return analyses, errors
 
-    metrics1 = {
-        "loc": loc1, "cc": cc1, "mi": mi1, "fk": fk1,
-        "nd": nd1, "fc": fc1, "vc": vc1, "dup": dup1
-    }
-    metrics2 = {
-        "loc": loc2, "cc": cc2, "mi": mi2, "fk": fk2,
-        "nd": nd2, "fc": fc2, "vc": vc2, "dup": dup2
+def _unified_diff(old: str, new: str, old_label: str, new_label: str) -> str:
+    return '\n'.join(difflib.unified_diff(
+        old.splitlines(),
+        new.splitlines(),
+        fromfile=old_label,
+        tofile=new_label,
+        lineterm=''
+    ))
+
+def changed_lines(old: str, new: str) -> int:
+    """
+    Number of lines changed from old to new: inserted and deleted lines, and for a replaced
+    block the longer of its two sides, so editing one line counts once.
+    """
+    matcher = difflib.SequenceMatcher(None, old.splitlines(), new.splitlines(), autojunk=False)
+    return sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+
+def compare_many(codes: list, labels: list = None, analyses: list = None, metrics: list = None) -> dict:
+    """
+    Compare several snippets (e.g. candidate refactorings or revisions of one file) at once:
+    all analyses run concurrently and all metrics come from one shared pass.
+    Analyses and metrics already computed for a snippet can be passed in (None elsewhere).
+    Returns a dict with labels, analyses, metrics, diffs (each snippet against the first),
+    changed_lines (see changed_lines, each snippet against the first), ranking (indexes from best to worst by project_summary.badness_score, with scores and
+    smells per snippet), deltas ({metric: matrix} where deltas[key][i][j] is the value of j
+    minus the value of i, "score" included), timed_out (labels whose analysis timed out) and
+    errors ({label: API error message} for analyses that failed).
+    """
+    labels = labels or [f"Code {i + 1}" for i in range(len(codes))]
+    analyses, errors = analyze_concurrently(codes, analyses)
+    metrics = measure_revisions(codes, metrics)
+    smells = [detect_code_smells(code, metrics={"cc": m['cc']['value'], "loc": m['loc']['value'], "nesting": m['nd']['value']})
+              for code, m in zip(codes, metrics)]
+    scores = [
+        badness_score({"cc": m['cc']['value'], "mi": m['mi']['value'], "nesting_depth": m['nd']['value']}, smell_list)
+        for m, smell_list in zip(metrics, smells)
+    ]
+    values = {key: [m[key]['value'] for m in metrics] for key in metrics[0]} if metrics else {}
+    values["score"] = scores
+    return {
+        "labels": labels,
+        "analyses": analyses,
+        "metrics": metrics,
+        "diffs": [_unified_diff(codes[0], code, labels[0], label) for code, label in zip(codes, labels)],
+        "changed_lines": [changed_lines(codes[0], code) for code in codes],
+        "smells": smells,
+        "scores": scores,
+        "ranking": sorted(range(len(codes)), key=lambda i: scores[i]),
+        "deltas": {key: [[b - a for b in row] for a in row] for key, row in values.items()},
+        "timed_out": [label for label, analysis, error in zip(labels, analyses, errors) if analysis is None and error is None],
+        "errors": {label: error for label, error in zip(labels, errors) if error is not None},
     }
 
+def compare_codes(code1: str, code2: str, analysis1: str = None, analysis2: str = None,
+                  metrics1: dict = None, metrics2: dict = None):
+    """
+    Compare two code snippets: generate diff, analyze both, and compare metrics.
+    Analyses and metrics already computed for a snippet (e.g. from a stored report) can be
+    passed in and are reused instead of calling the LLM or recomputing them.
+    Both analyses run concurrently (see compare_many).
+    Returns a dict with diff, analysis1, analysis2, metrics1, metrics2, comparison,
+    timed_out (the snippets whose analysis timed out; their analysis is None) and errors
+    (see compare_many).
+    """
+    many = compare_many([code1, code2], analyses=[analysis1, analysis2], metrics=[metrics1, metrics2])
+    metrics1, metrics2 = many["metrics"]
+
     # Simple comparison
     comparison = {}
     for key in metrics1:
@@ -67,10 +150,12 @@ def compare_codes(code1: str, code2: str):
             comparison[key] = "Equal"
 
     return {
-        "diff": diff_text,
-        "analysis1": analysis1,
-        "analysis2": analysis2,
+        "diff": many["diffs"][1],
+        "analysis1": many["analyses"][0],
+        "analysis2": many["analyses"][1],
         "metrics1": metrics1,
         "metrics2": metrics2,
-        "comparison": comparison
+        "comparison": comparison,
+        "timed_out": many["timed_out"],
+        "errors": many["errors"],
     }
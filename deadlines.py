@@ -0,0 +1,147 @@
+"""
+Time limits for LLM work: per-call timeouts and retries for the clients, and Deadline, which
+batch jobs check between requests to stop once cancelled, out of time, or abandoned by their
+owner (see OwnerPresence).
+"""
+import contextvars
+import threading
+import time
+
+from policies import with_overrides
+
+# Time limits for LLM work; use_deadlines takes a session's overrides of these keys
+DEFAULT_DEADLINES = {
+    "call_timeout": 60,          # seconds per LLM request attempt
+    "max_retries": 2,            # retries after a failed or timed-out attempt
+    "batch_timeout": 900,        # seconds for a whole Multi-File / GitHub job
+    "cancel_with_session": True, # stop an owner's jobs once none of its browser sessions is left (see OwnerPresence)
+}
+
+OWNER_GRACE_SECONDS = 300  # how long an owner without a connected session still counts as present
+
+STOP_MESSAGES = {
+    "cancelled": "cancelled by the user",
+    "deadline": "batch deadline reached",
+    "session_ended": "the browser session ended",
+}
+
+_current = contextvars.ContextVar("code_judge_deadlines", default=None)
+
+
+def use_deadlines(overrides: dict = None):
+    """
+    Make these limits current for LLM clients created in this context (see llm_limits).
+    Threads started with contextvars.copy_context() inherit them.
+    """
+    _current.set(with_overrides(DEFAULT_DEADLINES, overrides))
+
+
+def current_deadlines() -> dict:
+    return _current.get() or dict(DEFAULT_DEADLINES)
+
+
+def llm_limits() -> dict:
+    """
+    Keyword arguments bounding one ChatGroq request: timeout per attempt and max_retries.
+    """
+    limits = current_deadlines()
+    return {"timeout": limits["call_timeout"], "max_retries": limits["max_retries"]}
+
+
+def is_timeout(exc: BaseException) -> bool:
+    """
+    Whether an exception from an LLM or HTTP client is a timeout rather than an API error.
+    Checked by name too, since groq, httpx and the standard library each have their own class.
+    """
+    return isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+
+
+class Deadline:
+    """
+    Cooperative stop signal for one unit of work such as a batch job: a wall-clock budget,
+    an explicit cancel flag and an optional is_alive() check (e.g. whether the browser
+    session that started the work is still connected). Work checks stop_reason() between
+    LLM requests and returns what it has finished so far.
+    """
+
+    def __init__(self, seconds: float = None, is_alive=None):
+        self.expires = time.monotonic() + seconds if seconds else None
+        self.is_alive = is_alive
+        self._reason = ""
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            self._reason = self._reason or reason
+
+    def remaining(self):
+        return None if self.expires is None else max(0.0, self.expires - time.monotonic())
+
+    def stop_reason(self) -> str:
+        """
+        "" while work may continue, otherwise "cancelled", "deadline" or "session_ended".
+        """
+        with self._lock:
+            if self._reason:
+                return self._reason
+        if self.expires is not None and time.monotonic() >= self.expires:
+            self.cancel("deadline")
+        elif self.is_alive is not None:
+            try:
+                alive = self.is_alive()
+            except Exception:
+                alive = True
+            if not alive:
+                self.cancel("session_ended")
+        with self._lock:
+            return self._reason
+
+    def message(self) -> str:
+        reason = self.stop_reason()
+        return f"Stopped early: {STOP_MESSAGES[reason]}." if reason else ""
+
+
+class OwnerPresence:
+    """
+    Whether anyone is still around for an owner id (the id in the app's URL, which outlives
+    any one browser session: a refresh or a second tab opens a new Streamlit session under
+    the same owner). An owner is present while any of its sessions is connected, and for
+    grace seconds after it was last seen, so a refresh never stops the owner's jobs.
+    """
+
+    def __init__(self, grace: float = OWNER_GRACE_SECONDS):
+        self.grace = grace
+        self._last_seen = {}  # owner -> monotonic time
+        self._sessions = {}   # owner -> {session key: is_connected callable}
+        self._lock = threading.Lock()
+
+    def touch(self, owner: str, session: str = None, is_connected=None):
+        """
+        Record that owner was seen now, optionally from a session with a check that tells
+        whether that session is still connected.
+        """
+        with self._lock:
+            self._last_seen[owner] = time.monotonic()
+            if session is not None and is_connected is not None:
+                self._sessions.setdefault(owner, {})[session] = is_connected
+
+    def is_alive(self, owner: str) -> bool:
+        with self._lock:
+            if time.monotonic() - self._last_seen.get(owner, float("-inf")) < self.grace:
+                return True
+            sessions = dict(self._sessions.get(owner, {}))
+        for session, is_connected in sessions.items():
+            try:
+                if is_connected():
+                    return True
+            except Exception:
+                return True
+            with self._lock:
+                self._sessions.get(owner, {}).pop(session, None)
+        return False
+
+    def check(self, owner: str):
+        """
+        A callable for Deadline(is_alive=...) that stops work once owner is gone.
+        """
+        return lambda: self.is_alive(owner)
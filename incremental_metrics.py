@@ -0,0 +1,223 @@
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+
+from utils import (
+    COMMENT_PREFIXES, COMPLEXITY_KEYWORDS, FUNCTION_PATTERNS, OPERATOR_PATTERN, SYLLABLE_PATTERN,
+    VARIABLE_KEYWORDS, WORD_PATTERN,
+    avg_function_length_from_counts, code_characters_from_counts, comment_density_from_counts,
+    cyclomatic_complexity_from_counts, duplication_from_counts, flesch_kincaid_from_counts,
+    function_count_from_counts, halstead_from_counts, lines_of_code_from_counts,
+    maintainability_from_counts, nesting_depth_from_counts, variable_count_from_counts
+)
+
+FUNCTION_REGEXES = [re.compile(pattern, re.IGNORECASE) for pattern in FUNCTION_PATTERNS]
+# A function-definition match can only span the newline after a line that is blank or ends
+# in a word character, into a line that is blank or starts with a word character or "("
+GLUE_BEFORE = re.compile(r'(?:^|\w)\s*$')
+GLUE_AFTER = re.compile(r'\s*(?:[\w(]|$)')
+MAX_DIFF_CELLS = 1_000_000  # larger changed regions are replaced wholesale instead of diffed
+
+
+def _brackets(line: str):
+    """
+    Summary of a line's brackets for composing nesting depth across lines: the net change,
+    the lowest running depth (relative to the start, at most 0), the highest depth after an
+    opening bracket and the highest depth above the running minimum. None without brackets.
+    """
+    depth = low = 0
+    high = above_low = None
+    for char in line:
+        if char in '{[(':
+            depth += 1
+            high = depth if high is None else max(high, depth)
+            above_low = depth - low if above_low is None else max(above_low, depth - low)
+        elif char in ')]}':
+            depth -= 1
+            low = min(low, depth)
+    return None if high is None and depth == 0 else (depth, low, high, above_low)
+
+
+def _measure_line(line: str) -> tuple:
+    stripped = line.strip()
+    lowered = line.lower()
+    words = line.split()
+    return (
+        stripped or None,
+        bool(stripped.startswith(COMMENT_PREFIXES)),
+        sum(lowered.count(keyword) for keyword in COMPLEXITY_KEYWORDS),
+        len(words),
+        line.count('.') + line.count('!') + line.count('?'),
+        sum(len(SYLLABLE_PATTERN.findall(word.lower())) for word in words),
+        WORD_PATTERN.findall(lowered),
+        [word for word in WORD_PATTERN.findall(line) if word not in VARIABLE_KEYWORDS and not word.isdigit()],
+        OPERATOR_PATTERN.findall(line),
+        len(line),
+        _brackets(line),
+    )
+
+
+def _changed_regions(old: list, new: list) -> list:
+    """
+    Line diff as (i1, i2, j1, j2) replacements of old[i1:i2] by new[j1:j2], in order.
+    """
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and old[start] == new[start]:
+        start += 1
+    old_end, new_end = len(old), len(new)
+    while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    if old_end == start or new_end == start or (old_end - start) * (new_end - start) > MAX_DIFF_CELLS:
+        return [(start, old_end, start, new_end)] if (old_end, new_end) != (start, start) else []
+    matcher = SequenceMatcher(None, old[start:old_end], new[start:new_end], autojunk=False)
+    return [
+        (start + i1, start + i2, start + j1, start + j2)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"
+    ]
+
+
+class IncrementalMetrics:
+    """
+    The static metrics of AnalysisReport.metrics (plus Halstead) for a piece of code that is
+    edited over time. Each line's contribution (non-blank, comment, complexity keywords,
+    words, sentences, syllables, tokens, operators, length, bracket summary) is kept with
+    running totals and multisets, and update() re-measures only the lines a line diff marks
+    as changed. Function definitions can span lines, so they are counted per block of lines
+    that a definition could span and only blocks touching a change are recounted.
+    Every value equals what the utils.py functions return for the full text.
+    """
+
+    def __init__(self, code: str = None):
+        self.lines = []
+        self.parts = []
+        self.glue = []      # glue[i]: a function definition may span lines i and i+1
+        self.block_fc = []  # function definitions per block, stored on the block's first line
+        self.totals = Counter()
+        self.tokens = Counter()
+        self.variables = Counter()
+        self.operators = Counter()
+        self.stripped = Counter()
+        if code is not None:
+            self.update(code)
+
+    def _apply(self, part: tuple, sign: int):
+        stripped, comment, keywords, words, punctuation, syllables, tokens, variables, operators, length, _ = part
+        totals = self.totals
+        totals["loc"] += sign * (stripped is not None)
+        totals["comments"] += sign * comment
+        totals["keywords"] += sign * keywords
+        totals["words"] += sign * words
+        totals["punctuation"] += sign * punctuation
+        totals["syllables"] += sign * syllables
+        totals["token_count"] += sign * len(tokens)
+        totals["operator_count"] += sign * len(operators)
+        totals["length"] += sign * length
+        for counter, items in ((self.tokens, tokens), (self.variables, variables), (self.operators, operators),
+                               (self.stripped, [stripped] if stripped is not None else [])):
+            for item in items:
+                counter[item] += sign
+                if not counter[item]:
+                    del counter[item]
+
+    def _glue(self, i: int) -> bool:
+        return (i + 1 < len(self.lines) and GLUE_BEFORE.search(self.lines[i]) is not None
+                and GLUE_AFTER.match(self.lines[i + 1]) is not None)
+
+    def update(self, code: str) -> int:
+        """
+        Bring the metrics up to date with code. Returns the number of lines re-measured.
+        """
+        new_lines = code.split('\n')
+        regions = _changed_regions(self.lines, new_lines)
+        if not regions:
+            return 0
+        parts, glue, block_fc = [], [], []
+        previous = 0
+        for i1, i2, j1, j2 in regions:
+            parts += self.parts[previous:i1]
+            glue += self.glue[previous:i1]
+            block_fc += self.block_fc[previous:i1]
+            for part in self.parts[i1:i2]:
+                self._apply(part, -1)
+            self.totals["functions"] -= sum(self.block_fc[i1:i2])
+            for line in new_lines[j1:j2]:
+                part = _measure_line(line)
+                self._apply(part, 1)
+                parts.append(part)
+            glue += [False] * (j2 - j1)
+            block_fc += [0] * (j2 - j1)
+            previous = i2
+        self.lines = new_lines
+        self.parts = parts + self.parts[previous:]
+        self.glue = glue + self.glue[previous:]
+        self.block_fc = block_fc + self.block_fc[previous:]
+
+        # Re-glue around every change first, then recount each block that touches one
+        last = len(new_lines) - 1
+        for _, _, j1, j2 in regions:
+            for i in range(max(0, j1 - 1), min(last, j2) + 1):
+                self.glue[i] = self._glue(i)
+        spans = []
+        for _, _, j1, j2 in regions:
+            start, end = max(0, j1 - 1), min(last, j2)
+            while start > 0 and self.glue[start - 1]:
+                start -= 1
+            while end < last and self.glue[end]:
+                end += 1
+            if spans and start <= spans[-1][1] + 1:
+                spans[-1][1] = max(spans[-1][1], end)
+            else:
+                spans.append([start, end])
+        for start, end in spans:
+            self.totals["functions"] -= sum(self.block_fc[start:end + 1])
+            i = start
+            while i <= end:
+                j = i
+                while j < end and self.glue[j]:
+                    j += 1
+                text = '\n'.join(self.lines[i:j + 1])
+                self.block_fc[i:j + 1] = [sum(len(regex.findall(text)) for regex in FUNCTION_REGEXES)] + [0] * (j - i)
+                self.totals["functions"] += self.block_fc[i]
+                i = j + 1
+        return sum(j2 - j1 for _, _, j1, j2 in regions)
+
+    def _max_depth(self) -> int:
+        depth = deepest = 0
+        for summary in self.parts:
+            summary = summary[-1]
+            if summary is not None:
+                change, low, high, above_low = summary
+                if high is not None:
+                    deepest = max(deepest, depth + high, above_low)
+                depth = change + max(depth, -low)
+        return deepest
+
+    def metrics(self) -> dict:
+        """
+        The same dict as AnalysisReport.metrics for the current code.
+        """
+        totals = self.totals
+        loc = totals["loc"]
+        characters = totals["length"] + max(0, len(self.lines) - 1)
+        cc = cyclomatic_complexity_from_counts(totals["keywords"])
+        return {
+            "loc": lines_of_code_from_counts(loc),
+            "cc": cc,
+            "mi": maintainability_from_counts(characters, loc, totals["comments"], cc["value"]),
+            "fkgl": flesch_kincaid_from_counts(totals["words"], totals["punctuation"] + 1, totals["syllables"]),
+            "nd": nesting_depth_from_counts(self._max_depth()),
+            "fc": function_count_from_counts(totals["functions"]),
+            "vc": variable_count_from_counts(len(self.variables)),
+            "dup": duplication_from_counts(loc, len(self.stripped)),
+            "chars": code_characters_from_counts(characters),
+            "cd": comment_density_from_counts(loc, totals["comments"]),
+            "afl": avg_function_length_from_counts(loc, totals["functions"]),
+        }
+
+    def halstead(self) -> dict:
+        """
+        The same dict as utils.halstead_metrics for the current code.
+        """
+        return halstead_from_counts(len(self.operators), len(self.tokens), self.totals["operator_count"], self.totals["token_count"])
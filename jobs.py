@@ -0,0 +1,198 @@
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from deadlines import Deadline, OwnerPresence, current_deadlines
+from storage import data_path
+from telemetry import JOBS_FINISHED, JOBS_IN_QUEUE, JOB_SECONDS
+
+
+class JobStore:
+    """
+    SQLite-backed store for job state and results, so finished work survives
+    Streamlit reruns, browser refreshes and app restarts.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or data_path("jobs.db")
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    error TEXT,
+                    result TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    owner TEXT
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                # Jobs stored before owners were recorded belong to nobody and are not listed
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def create(self, kind: str, title: str, owner: str = None) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, title, status, created, updated, owner) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, title, now, now, owner),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str, owner: str) -> dict:
+        """
+        The job with its result, or None unless it belongs to owner.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE id = ? AND owner = ?", (job_id, owner)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, owner: str, limit: int = 50) -> list:
+        """
+        Return owner's most recent jobs without their (potentially large) results.
+        """
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT id, kind, title, status, done, total, message, error, created, updated "
+                "FROM jobs WHERE owner = ? ORDER BY created DESC LIMIT ?", (owner, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, status: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def mark_interrupted(self):
+        """
+        Fail jobs left queued/running by a previous process; their worker threads are gone.
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'Interrupted by app restart', updated = ? "
+                "WHERE status IN ('queued', 'running')", (time.time(),)
+            )
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class JobManager:
+    """
+    Runs analysis jobs on a background thread pool, independent of the Streamlit script thread.
+    A job function receives its payload plus a progress(done, total, message) callback and a
+    deadlines.Deadline to check between LLM requests, and returns a JSON-serialisable result.
+    A job that stops early (cancelled, out of time, or its session ended) still returns the
+    results it finished; it is stored with status "cancelled" and the reason as its error.
+    """
+
+    def __init__(self, store: JobStore = None, max_workers: int = None):
+        self.store = store or JobStore()
+        self.store.mark_interrupted()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("CODE_JUDGE_JOB_WORKERS", "2")),
+            thread_name_prefix="code-judge-job",
+        )
+        self._deadlines = {}  # job id -> (owner, Deadline) of active jobs
+        self.presence = OwnerPresence()  # which owners still have someone around (see app.py)
+        self._deadlines_lock = threading.Lock()
+
+    def submit(self, kind: str, title: str, fn, owner: str, **payload) -> str:
+        """
+        Queue fn(progress=..., deadline=..., **payload) for owner (the id of the submitter;
+        only the owner can see, open or cancel the job) and return the new job id immediately.
+        The job gets the submitting context's deadlines (see deadlines.use_deadlines); with
+        cancel_with_session it stops at its next check once self.presence no longer sees
+        the owner, which a page refresh does not cause.
+        """
+        job_id = self.store.create(kind, title, owner)
+        limits = current_deadlines()
+        self.presence.touch(owner)
+        deadline = Deadline(limits["batch_timeout"], is_alive=self.presence.check(owner) if limits["cancel_with_session"] else None)
+        with self._deadlines_lock:
+            self._deadlines[job_id] = (owner, deadline)
+        JOBS_IN_QUEUE.inc(status="queued")
+        self.executor.submit(contextvars.copy_context().run, self._run, job_id, kind, fn, deadline, payload)
+        return job_id
+
+    def cancel(self, job_id: str, owner: str) -> bool:
+        """
+        Ask owner's queued or running job of this process to stop; returns False if it is not
+        active here or belongs to someone else.
+        """
+        with self._deadlines_lock:
+            job_owner, deadline = self._deadlines.get(job_id, (None, None))
+        if deadline is None or job_owner != owner:
+            return False
+        deadline.cancel()
+        return True
+
+    def _run(self, job_id: str, kind: str, fn, deadline: Deadline, payload: dict):
+        JOBS_IN_QUEUE.dec(status="queued")
+        JOBS_IN_QUEUE.inc(status="running")
+        start = time.time()
+        if deadline.stop_reason():
+            # Stopped while still waiting for a worker: nothing was spent, nothing to return
+            self.store.update(job_id, status="cancelled", error=deadline.message())
+            self._finish(job_id, kind, "cancelled", start)
+            return
+        self.store.update(job_id, status="running")
+
+        def progress(done: int, total: int, message: str = ""):
+            self.store.update(job_id, done=done, total=total, message=message)
+
+        status = "done"
+        try:
+            result = fn(progress=progress, deadline=deadline, **payload)
+            if deadline.stop_reason():
+                status = "cancelled"
+                self.store.update(job_id, status="cancelled", result=result, error=deadline.message())
+            else:
+                self.store.update(job_id, status="done", result=result)
+        except Exception as e:
+            status = "failed"
+            self.store.update(job_id, status="failed", error=str(e))
+        finally:
+            self._finish(job_id, kind, status, start)
+
+    def _finish(self, job_id: str, kind: str, status: str, start: float):
+        with self._deadlines_lock:
+            self._deadlines.pop(job_id, None)
+        JOBS_IN_QUEUE.dec(status="running")
+        JOBS_FINISHED.inc(kind=kind, status=status)
+        JOB_SECONDS.observe(time.time() - start, kind=kind)
+
+    def get(self, job_id: str, owner: str) -> dict:
+        return self.store.get(job_id, owner)
+
+    def list(self, owner: str, limit: int = 50) -> list:
+        return self.store.list(owner, limit)
@@ -0,0 +1,129 @@
+import os
+import subprocess
+import threading
+
+# Reading a local clone or bare mirror through git plumbing instead of the GitHub API:
+# one `git ls-tree` for the listing and one long-lived `git cat-file --batch` for all contents.
+# Only repositories under the directories listed in CODE_JUDGE_LOCAL_REPO_ROOTS (separated by
+# os.pathsep) can be read; with none configured, local repositories cannot be analyzed at all.
+
+TREE_FILE_MODES = {"100644", "100755"}  # regular files; symlinks (120000) and submodules are left out
+
+
+def allowed_roots() -> list:
+    """
+    The configured root directories, resolved like the paths checked against them.
+    """
+    return [os.path.realpath(root) for root in os.getenv("CODE_JUDGE_LOCAL_REPO_ROOTS", "").split(os.pathsep) if root.strip()]
+
+
+def check_repo_path(repo_path: str) -> str:
+    """
+    The real path of repo_path (symlinks and .. resolved) if it lies inside an allowed root;
+    raises ValueError otherwise. Callers read the repository through the returned path.
+    """
+    roots = allowed_roots()
+    if not roots:
+        raise ValueError("Local repositories are disabled; set CODE_JUDGE_LOCAL_REPO_ROOTS to the directories that may be read")
+    real = os.path.realpath(repo_path)
+    if not any(os.path.commonpath([real, root]) == root for root in roots):
+        raise ValueError(f"{repo_path} is outside the allowed directories ({os.pathsep.join(roots)})")
+    return real
+
+
+def _git(repo_path: str, *args: str) -> bytes:
+    """
+    Run one git command in repo_path and return its stdout; failures raise ValueError with git's message.
+    """
+    try:
+        done = subprocess.run(["git", "-C", repo_path, *args], capture_output=True, check=False)
+    except FileNotFoundError:
+        raise ValueError("git is not installed on this machine")
+    if done.returncode != 0:
+        raise ValueError(done.stderr.decode("utf-8", "replace").strip() or f"git {args[0]} failed")
+    return done.stdout
+
+
+def repo_name(repo_path: str) -> str:
+    """
+    Display and trend-store name of a local repository: its directory name, without a bare mirror's .git.
+    """
+    name = os.path.basename(os.path.abspath(repo_path).rstrip(os.sep))
+    return name[:-4] if name.endswith(".git") and len(name) > 4 else name
+
+
+def resolve_commit(repo_path: str, ref: str = "HEAD") -> str:
+    """
+    Commit SHA that ref (a branch, tag, SHA or expression like HEAD~3) names in the repository.
+    repo_path must lie inside an allowed root (see check_repo_path).
+    """
+    repo_path = check_repo_path(repo_path)
+    if not os.path.isdir(repo_path):
+        raise ValueError(f"{repo_path} is not a directory")
+    if not ref or ref.startswith("-"):
+        raise ValueError(f"Invalid ref: {ref!r}")
+    return _git(repo_path, "rev-parse", "--verify", f"{ref}^{{commit}}").decode("ascii").strip()
+
+
+def list_tree(repo_path: str, commit: str) -> list:
+    """
+    Every regular file in the commit's tree, as dicts with path, blob (the git blob SHA) and
+    size in bytes, from a single `git ls-tree` call; no file content is read.
+    """
+    files = []
+    for record in _git(repo_path, "ls-tree", "-r", "-l", "-z", "--full-tree", commit).split(b"\0"):
+        if not record:
+            continue
+        info, path = record.split(b"\t", 1)
+        mode, kind, blob, size = info.split()
+        if kind == b"blob" and mode.decode() in TREE_FILE_MODES:
+            files.append({"path": path.decode("utf-8", "replace"), "blob": blob.decode("ascii"), "size": int(size)})
+    return files
+
+
+class GitObjectReader:
+    """
+    Reads blob contents by SHA through one long-lived `git cat-file --batch` process, so a
+    repository of any size costs a single subprocess instead of one per file.
+    Use as a context manager; read() is thread-safe.
+    """
+
+    def __init__(self, repo_path: str):
+        self.repo_path = repo_path
+        self._lock = threading.Lock()
+        self._process = None
+
+    def __enter__(self):
+        self._process = subprocess.Popen(
+            ["git", "-C", self.repo_path, "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, sha: str) -> bytes:
+        """
+        The content of the object sha; raises KeyError when the repository does not have it.
+        """
+        with self._lock:
+            process = self._process
+            process.stdin.write(sha.encode("ascii") + b"\n")
+            process.stdin.flush()
+            header = process.stdout.readline()
+            if not header:
+                raise ValueError(f"git cat-file stopped while reading {sha}")
+            fields = header.split()
+            if fields[-1] == b"missing":
+                raise KeyError(sha)
+            data = process.stdout.read(int(fields[2]))
+            process.stdout.read(1)  # the newline after every object
+            return data
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
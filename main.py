@@ -1,17 +1,43 @@
 import os
+import logging
 from dotenv import load_dotenv
 from langchain.prompts import PromptTemplate
 from langchain_groq import ChatGroq
+from deadlines import llm_limits
+from policies import with_overrides
 
 # Load environment variables
 load_dotenv()
 
-def initialize_llm(temperature: float = 0.1) -> ChatGroq:
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+# Default policy for adaptive model routing (see route_file). Any key can be overridden
+# per run, e.g. from the Settings page: {"full_model": "...", "escalate_cc": 20}.
+DEFAULT_ROUTING_POLICY = {
+    "enabled": True,
+    # Files at or below all of these are "trivial" and get static metrics only
+    "trivial_max_loc": 15,
+    "trivial_max_cc": 3,
+    # Any one of these flags a file for escalation to the full prompt on the larger model
+    "escalate_loc": 400,
+    "escalate_cc": 15,
+    "escalate_mi_below": 40.0,
+    "escalate_nesting": 6,
+    "escalate_smells": 2,
+    "triage_model": os.getenv("CODE_JUDGE_TRIAGE_MODEL", DEFAULT_MODEL),
+    "full_model": os.getenv("CODE_JUDGE_FULL_MODEL", "llama-3.3-70b-versatile"),
+}
+
+def initialize_llm(temperature: float = 0.1, model_name: str = DEFAULT_MODEL) -> ChatGroq:
     """
     Initializes the Groq Language Model with the provided API key and model configuration.
+    Request timeout and retries follow the current deadlines (see deadlines.use_deadlines).
 
     Args:
         temperature (float): Temperature for the LLM (0.0 to 1.0).
+        model_name (str): Groq model to use.
 
     Returns:
         ChatGroq: Initialized Groq LLM instance.
@@ -25,8 +51,9 @@ def initialize_llm(temperature: float = 0.1) -> ChatGroq:
 
     return ChatGroq(
         groq_api_key=api_key,
-        model_name="llama-3.1-8b-instant",  # Updated to supported model
+        model_name=model_name,
         temperature=temperature,  # Configurable temperature
+        **llm_limits(),
     )
 
 
@@ -123,23 +150,24 @@ def create_multi_file_prompt_template() -> PromptTemplate:
     )
 
 
-def create_analysis_chain(temperature: float = 0.1):
+def create_analysis_chain(temperature: float = 0.1, model_name: str = DEFAULT_MODEL):
     """
     Creates and returns the complete LLM analysis chain using the prompt template and initialized LLM.
 
     Args:
         temperature (float): Temperature for the LLM (0.0 to 1.0).
+        model_name (str): Groq model to use.
 
     Returns:
         RunnableSequence: A complete analysis chain ready for invocation.
     """
-    llm = initialize_llm(temperature)
+    llm = initialize_llm(temperature, model_name)
     prompt = create_prompt_template()
 
     return prompt | llm
 
 
-def create_multi_file_analysis_chain(custom_prompt=None, temperature: float = 0.1):
+def create_multi_file_analysis_chain(custom_prompt=None, temperature: float = 0.1, model_name: str = DEFAULT_MODEL):
     """
     Creates and returns the multi-file analysis chain with optional custom prompt.
     If custom_prompt is provided, uses it; otherwise, uses the default shorter prompt.
@@ -147,11 +175,12 @@ def create_multi_file_analysis_chain(custom_prompt=None, temperature: float = 0.
     Args:
         custom_prompt (str, optional): Custom prompt template string with {code} placeholder.
         temperature (float): Temperature for the LLM (0.0 to 1.0).
+        model_name (str): Groq model to use.
 
     Returns:
         RunnableSequence: A complete analysis chain ready for invocation.
     """
-    llm = initialize_llm(temperature)
+    llm = initialize_llm(temperature, model_name)
     if custom_prompt:
         prompt = PromptTemplate(
             input_variables=[],
@@ -161,3 +190,318 @@ def create_multi_file_analysis_chain(custom_prompt=None, temperature: float = 0.
         prompt = create_multi_file_prompt_template()
 
     return prompt | llm
+
+
+def route_file(name: str, metrics: dict, policy: dict = None) -> dict:
+    """
+    Chooses the analysis tier and model for one file from its static metrics.
+
+    Tiers:
+        - "metrics_only": trivial files; no LLM call.
+        - "triage": the short multi-file prompt on the fast model.
+        - "full": the full create_prompt_template on the larger model, for flagged files.
+
+    Args:
+        name (str): File name, used for logging.
+        metrics (dict): Plain values for loc, cc, mi, nesting_depth and smells (a list).
+        policy (dict, optional): Overrides for DEFAULT_ROUTING_POLICY.
+
+    Returns:
+        dict: tier, model (None for metrics_only) and the reasons behind the decision.
+    """
+    policy = with_overrides(DEFAULT_ROUTING_POLICY, policy)
+    flags = []
+    if metrics["loc"] >= policy["escalate_loc"]:
+        flags.append(f"LOC {metrics['loc']} >= {policy['escalate_loc']}")
+    if metrics["cc"] >= policy["escalate_cc"]:
+        flags.append(f"CC {metrics['cc']} >= {policy['escalate_cc']}")
+    if metrics["mi"] < policy["escalate_mi_below"]:
+        flags.append(f"MI {metrics['mi']:.1f} < {policy['escalate_mi_below']}")
+    if metrics["nesting_depth"] >= policy["escalate_nesting"]:
+        flags.append(f"nesting {metrics['nesting_depth']} >= {policy['escalate_nesting']}")
+    if len(metrics["smells"]) >= policy["escalate_smells"]:
+        flags.append(f"{len(metrics['smells'])} smells >= {policy['escalate_smells']}")
+
+    if flags:
+        decision = {"tier": "full", "model": policy["full_model"], "reasons": flags}
+    elif metrics["loc"] <= policy["trivial_max_loc"] and metrics["cc"] <= policy["trivial_max_cc"] and not metrics["smells"]:
+        decision = {
+            "tier": "metrics_only", "model": None,
+            "reasons": [f"LOC {metrics['loc']} <= {policy['trivial_max_loc']}", f"CC {metrics['cc']} <= {policy['trivial_max_cc']}", "no smells"],
+        }
+    else:
+        decision = {"tier": "triage", "model": policy["triage_model"], "reasons": ["no escalation flags"]}
+
+    logger.info("Routing %s -> %s (%s): %s", name, decision["tier"], decision["model"] or "no LLM", "; ".join(decision["reasons"]))
+    return decision
+
+
+def create_routed_chain(decision: dict, temperature: float = 0.1):
+    """
+    Creates the chain for a route_file decision: the full prompt for "full", the short
+    multi-file prompt for "triage". "metrics_only" decisions have no chain.
+
+    Args:
+        decision (dict): Result of route_file.
+        temperature (float): Temperature for the LLM (0.0 to 1.0).
+
+    Returns:
+        RunnableSequence: A complete analysis chain ready for invocation.
+    """
+    if decision["tier"] == "full":
+        return create_analysis_chain(temperature, decision["model"])
+    if decision["tier"] == "triage":
+        return create_multi_file_analysis_chain(temperature=temperature, model_name=decision["model"])
+    raise ValueError(f"No LLM chain for routing tier '{decision['tier']}'")
+
+
+def create_packed_prompt_template() -> PromptTemplate:
+    """
+    Creates a PromptTemplate that reviews several small files in one request.
+    Files are delimited with packing.FILE_MARKER lines and the answer repeats each path in a
+    "## FILE: <path>" line so it can be split back into one multi-file style analysis per file.
+
+    Returns:
+        PromptTemplate: A LangChain PromptTemplate object for packed code analysis.
+    """
+    prompt_template = """
+    You are an expert AI code judge. Analyze each of the following files briefly for project-level insights.
+    Every file starts with a line `===== FILE: <path> =====` and ends with a line `===== END FILE: <path> =====`.
+
+    Instructions:
+    1. Review every file on its own; never mix findings of different files.
+    2. For each file, in the order given, start with a line `## FILE: <path>` using the exact path from its marker, followed by these headings:
+       - ### Language Detected
+       - ### Syntax Errors
+       - ### Logical Issues/Bugs
+       - ### Best Practices & Improvements
+       - ### Security & Performance Concerns
+       - ### Code Metrics
+       - ### Refactoring Suggestions
+    3. Cover syntax errors, bugs, best practices, security and performance, code smells, key metrics and refactoring, using Markdown and emojis.
+    4. Be concise, focus on actionable insights. Write "None found." under a heading with nothing to report.
+
+    Files to analyze:
+    {files}
+
+    """
+    return PromptTemplate(
+        input_variables=["files"],
+        template=prompt_template,
+    )
+
+
+def create_chunk_prompt_template() -> PromptTemplate:
+    """
+    Creates a PromptTemplate for one part of a file too large for a single request.
+
+    Returns:
+        PromptTemplate: A LangChain PromptTemplate object for chunked code analysis.
+    """
+    prompt_template = """
+    You are an expert AI code judge. The file `{path}` is too large for one review, so it is analyzed in {parts} parts.
+    Analyze part {part} of {parts} (lines {lines}) briefly for project-level insights. Code outside this part is not shown; do not report missing definitions as errors.
+
+    Instructions:
+    1. Detect the programming language.
+    2. Review syntax errors, logical issues/bugs, best practices, security & performance concerns, code smells and refactoring opportunities in this part.
+    3. Structure response with clear sections using Markdown, emojis. Use headings:
+       - ### Language Detected
+       - ### Syntax Errors
+       - ### Logical Issues/Bugs
+       - ### Best Practices & Improvements
+       - ### Security & Performance Concerns
+       - ### Code Metrics
+       - ### Refactoring Suggestions
+    4. Be concise, focus on actionable insights and cite line numbers where possible.
+
+    Code to analyze:
+    {code}
+
+    """
+    return PromptTemplate(
+        input_variables=["path", "part", "parts", "lines", "code"],
+        template=prompt_template,
+    )
+
+
+def create_full_chunk_prompt_template() -> PromptTemplate:
+    """
+    Creates the full analysis PromptTemplate (see create_prompt_template) for one part of a
+    file too large for a single request, so files routed to the "full" tier keep their
+    detailed review when they are analyzed in parts.
+
+    Returns:
+        PromptTemplate: A LangChain PromptTemplate object for chunked full code analysis.
+    """
+    chunk_header = """
+    The file `{path}` is too large for one review, so it is analyzed in {parts} parts. You are given part {part} of {parts} (lines {lines}).
+    Code outside this part is not shown; do not report missing definitions as errors, and cite line numbers where possible.
+    """
+    return PromptTemplate(
+        input_variables=["path", "part", "parts", "lines", "code"],
+        template=chunk_header + create_prompt_template().template,
+    )
+
+
+def create_packed_analysis_chain(temperature: float = 0.1, model_name: str = DEFAULT_MODEL):
+    """
+    Creates the chain that reviews a pack of small files in one request.
+
+    Args:
+        temperature (float): Temperature for the LLM (0.0 to 1.0).
+        model_name (str): Groq model to use.
+
+    Returns:
+        RunnableSequence: A complete analysis chain ready for invocation.
+    """
+    return create_packed_prompt_template() | initialize_llm(temperature, model_name)
+
+
+def create_chunk_analysis_chain(temperature: float = 0.1, model_name: str = DEFAULT_MODEL, full: bool = False):
+    """
+    Creates the chain that reviews one part of an oversized file.
+
+    Args:
+        temperature (float): Temperature for the LLM (0.0 to 1.0).
+        model_name (str): Groq model to use.
+        full (bool): Use the full analysis prompt (for files routed to the "full" tier).
+
+    Returns:
+        RunnableSequence: A complete analysis chain ready for invocation.
+    """
+    prompt = create_full_chunk_prompt_template() if full else create_chunk_prompt_template()
+    return prompt | initialize_llm(temperature, model_name)
+
+
+def create_file_summary_prompt_template() -> PromptTemplate:
+    """
+    Creates a PromptTemplate that condenses one file's analysis for the project-level summary.
+
+    Returns:
+        PromptTemplate: A LangChain PromptTemplate object for file summaries.
+    """
+    prompt_template = """
+    You are an expert AI code judge. Condense the following analysis of one file into a short summary for a project-level review.
+
+    File: {path}
+    Static metrics: {metrics}
+
+    Analysis:
+    {analysis}
+
+    In at most 6 bullet points, state the file's responsibility, its most important issues (bugs, security, performance) and notable design choices. Do not repeat the metrics verbatim.
+    """
+    return PromptTemplate(
+        input_variables=["path", "metrics", "analysis"],
+        template=prompt_template,
+    )
+
+
+def create_group_summary_prompt_template() -> PromptTemplate:
+    """
+    Creates a PromptTemplate that merges summaries of files and sub-directories into one summary of a directory or module.
+
+    Returns:
+        PromptTemplate: A LangChain PromptTemplate object for directory summaries.
+    """
+    prompt_template = """
+    You are an expert AI code judge. Merge the following summaries of the files and sub-directories in `{scope}` into one summary.
+
+    {summaries}
+
+    In at most 8 bullet points, describe what this part of the project does, how its pieces relate, and the risks that recur across them. Keep file names when you mention specific issues.
+    """
+    return PromptTemplate(
+        input_variables=["scope", "summaries"],
+        template=prompt_template,
+    )
+
+
+def create_project_report_prompt_template() -> PromptTemplate:
+    """
+    Creates a PromptTemplate for the final project-level report built from the top-level summary.
+
+    Returns:
+        PromptTemplate: A LangChain PromptTemplate object for project reports.
+    """
+    prompt_template = """
+    You are an expert AI code judge. Write a project-level review of `{project}` from the summary of its modules and the files ranked worst by static metrics.
+
+    Project summary:
+    {summary}
+
+    Worst files by static metrics (cyclomatic complexity, maintainability index, nesting depth, code smells):
+    {worst_files}
+
+    Use the following exact headings:
+       - ### Architecture Overview
+       - ### Cross-Cutting Risks
+       - ### Worst Files
+       - ### Recommended Next Steps
+    Be concise and actionable; use bullet points and tables where appropriate.
+    """
+    return PromptTemplate(
+        input_variables=["project", "summary", "worst_files"],
+        template=prompt_template,
+    )
+
+
+def create_summary_chain(prompt: PromptTemplate, temperature: float = 0.1, model_name: str = DEFAULT_MODEL):
+    """
+    Creates a chain for one of the project summary prompts.
+
+    Args:
+        prompt (PromptTemplate): One of the summary prompt templates above.
+        temperature (float): Temperature for the LLM (0.0 to 1.0).
+        model_name (str): Groq model to use.
+
+    Returns:
+        RunnableSequence: A complete summary chain ready for invocation.
+    """
+    return prompt | initialize_llm(temperature, model_name)
+
+
+def create_delta_prompt_template() -> PromptTemplate:
+    """
+    Creates a PromptTemplate that reviews only the changes between a previously analyzed
+    version of the code and a new, highly similar submission.
+
+    Returns:
+        PromptTemplate: A LangChain PromptTemplate object for delta reviews.
+    """
+    prompt_template = """
+    You are an expert AI code judge. The code below is a slightly changed version of code you already reviewed.
+    Do not repeat the previous review; review only what the diff changes.
+
+    Instructions:
+    1. List findings of the previous review that the changes resolve or make obsolete.
+    2. List new syntax errors, bugs, security or performance issues introduced by the changes, citing the changed lines.
+    3. Give short refactoring suggestions for the changed code only.
+    4. Be brief, use Markdown bullets and emojis, and write "No new issues." if the changes introduce none.
+
+    Previous review:
+    {previous_analysis}
+
+    Unified diff from the reviewed version to the new one:
+    {diff}
+
+    """
+    return PromptTemplate(
+        input_variables=["previous_analysis", "diff"],
+        template=prompt_template,
+    )
+
+
+def create_delta_analysis_chain(temperature: float = 0.1, model_name: str = DEFAULT_MODEL):
+    """
+    Creates the chain that reviews the diff against a similar, previously analyzed snippet.
+
+    Args:
+        temperature (float): Temperature for the LLM (0.0 to 1.0).
+        model_name (str): Groq model to use.
+
+    Returns:
+        RunnableSequence: A complete delta review chain ready for invocation.
+    """
+    return create_delta_prompt_template() | initialize_llm(temperature, model_name)
@@ -0,0 +1,162 @@
+"""
+Request packing for batch runs: small files share one LLM request under file markers and
+the answer is split back per file, while files too large for one request are analyzed in
+line-range parts whose answers are merged section by section.
+"""
+import re
+
+from policies import with_overrides
+from retrieval import SECTION_PATTERN, chunk_code, estimate_tokens
+
+# How batch runs group files into LLM requests; plan_requests takes overrides of these keys
+DEFAULT_PACKING_POLICY = {
+    "enabled": True,
+    "pack_token_budget": 3000,    # estimated code tokens per packed request
+    "max_pack_file_tokens": 800,  # files up to this size are packed with others
+    "max_files_per_pack": 8,
+    "max_single_tokens": 2500,    # larger files are analyzed in parts instead of truncated
+    "chunk_tokens": 1500,         # target size of each part
+}
+
+FILE_MARKER = "===== FILE: {path} ====="
+END_MARKER = "===== END FILE: {path} ====="
+MARKER_TOKENS = 20  # both marker lines and the "## FILE:" header of the answer
+RESPONSE_HEADER = re.compile(r'^[ \t]*#{1,2}[ \t]*\**[ \t]*FILE:[ \t]*(.+?)[ \t]*$', re.MULTILINE)
+
+
+def plan_requests(items: list, policy: dict = None, prompt_overhead: int = 0) -> dict:
+    """
+    Group files into LLM requests before any call is made.
+
+    items is a list of dicts with key, tokens (see retrieval.estimate_tokens), model and
+    packable (False for files that must get a request of their own, e.g. escalated ones).
+    Files up to max_pack_file_tokens are bin-packed first-fit-decreasing into requests of at
+    most pack_token_budget tokens per model; files over max_single_tokens are analyzed in parts.
+    Returns a dict with requests (each with mode "single", "packed" or "chunked", keys, model
+    and tokens) and stats (files, requests, packed_files, chunked_files, tokens_saved).
+    """
+    policy = with_overrides(DEFAULT_PACKING_POLICY, policy)
+    requests = []
+    bins_by_model = {}
+    small = []
+    for item in items:
+        if policy["enabled"] and item["tokens"] > policy["max_single_tokens"]:
+            requests.append({"mode": "chunked", "keys": [item["key"]], "model": item["model"], "tokens": item["tokens"]})
+        elif policy["enabled"] and item["packable"] and item["tokens"] <= policy["max_pack_file_tokens"]:
+            small.append(item)
+        else:
+            requests.append({"mode": "single", "keys": [item["key"]], "model": item["model"], "tokens": item["tokens"]})
+
+    for item in sorted(small, key=lambda item: item["tokens"], reverse=True):
+        cost = item["tokens"] + MARKER_TOKENS
+        bins = bins_by_model.setdefault(item["model"], [])
+        target = next(
+            (b for b in bins if b["tokens"] + cost <= policy["pack_token_budget"] and len(b["keys"]) < policy["max_files_per_pack"]),
+            None,
+        )
+        if target is None:
+            target = {"mode": "packed", "keys": [], "model": item["model"], "tokens": 0}
+            bins.append(target)
+        target["keys"].append(item["key"])
+        target["tokens"] += cost
+
+    packed_files = 0
+    for bins in bins_by_model.values():
+        for b in bins:
+            if len(b["keys"]) == 1:
+                b["mode"] = "single"
+            else:
+                packed_files += len(b["keys"])
+            requests.append(b)
+
+    packed_requests = sum(1 for request in requests if request["mode"] == "packed")
+    return {
+        "requests": requests,
+        "stats": {
+            "files": len(items),
+            "requests": len(requests),
+            "packed_files": packed_files,
+            "chunked_files": sum(1 for request in requests if request["mode"] == "chunked"),
+            "tokens_saved": (packed_files - packed_requests) * prompt_overhead,
+        },
+    }
+
+
+def render_pack(files: list) -> str:
+    """
+    Join (path, code) pairs into the delimited block expected by main.create_packed_prompt_template.
+    """
+    return "\n\n".join(f"{FILE_MARKER.format(path=path)}\n{code}\n{END_MARKER.format(path=path)}" for path, code in files)
+
+
+def split_packed_response(text: str, paths: list) -> dict:
+    """
+    Split a packed answer on its "## FILE: <path>" lines.
+    Headers are matched to paths exactly, then by unique base name, since models sometimes
+    shorten paths. Returns {path: analysis}; files the answer does not cover are missing.
+    """
+    matches = list(RESPONSE_HEADER.finditer(text))
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(path.rsplit('/', 1)[-1], []).append(path)
+    results = {}
+    for n, match in enumerate(matches):
+        label = match.group(1).strip('*` ')
+        path = label if label in paths else None
+        if path is None and len(by_name.get(label.rsplit('/', 1)[-1], [])) == 1:
+            path = by_name[label.rsplit('/', 1)[-1]][0]
+        if path is None or path in results:
+            continue
+        end = matches[n + 1].start() if n + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if body:
+            results[path] = body
+    return results
+
+
+def split_for_analysis(code: str, max_tokens: int) -> list:
+    """
+    Split an oversized file into parts of about max_tokens along function boundaries
+    (see retrieval.chunk_code). Consecutive chunks are merged while they fit; a chunk that
+    alone exceeds the budget is halved by lines.
+    Returns a list of dicts with text, start_line and end_line (1-based).
+    """
+    lines = code.split('\n')
+
+    def text_of(start, end):
+        return '\n'.join(lines[start - 1:end])
+
+    ranges = []
+    pending = [(chunk["start_line"], chunk["end_line"]) for chunk in chunk_code(code)]
+    while pending:
+        start, end = pending.pop(0)
+        if end > start and estimate_tokens(text_of(start, end)) > max_tokens:
+            middle = (start + end) // 2
+            pending[:0] = [(start, middle), (middle + 1, end)]
+        else:
+            ranges.append((start, end))
+
+    parts = []
+    for start, end in ranges:
+        if parts and estimate_tokens(text_of(parts[-1][0], end)) <= max_tokens:
+            parts[-1] = (parts[-1][0], end)
+        else:
+            parts.append((start, end))
+    return [{"text": text_of(start, end), "start_line": start, "end_line": end} for start, end in parts]
+
+
+def merge_part_results(parts: list) -> str:
+    """
+    Merge the analyses of a file's parts into one analysis with the usual "### " sections.
+    parts is a list of (start_line, end_line, analysis); each section lists its findings per line range.
+    """
+    sections = {}
+    for start, end, analysis in parts:
+        blocks = SECTION_PATTERN.split(analysis)
+        # Anything before the first heading is preamble, not a section
+        for block in blocks[1:]:
+            heading, _, body = block.partition('\n')
+            body = body.strip()
+            if body:
+                sections.setdefault(heading.strip(), []).append(f"**Lines {start}-{end}:**\n{body}")
+    return "\n\n".join(f"### {heading}\n" + "\n\n".join(bodies) for heading, bodies in sections.items())
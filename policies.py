@@ -0,0 +1,17 @@
+# Settings dicts (routing, pre-filter, packing, reuse, deadlines) all work the same way: each
+# module has a DEFAULT_* dict, sessions keep only the keys they change, and the two are
+# combined with with_overrides where the settings are used.
+
+
+def with_overrides(defaults: dict, overrides: dict = None, extend_lists: bool = False) -> dict:
+    """
+    A copy of defaults with the overrides applied. With extend_lists, list-valued overrides
+    are appended to the default list instead of replacing it.
+    """
+    merged = {key: (list(value) if isinstance(value, list) else value) for key, value in defaults.items()}
+    for key, value in (overrides or {}).items():
+        if extend_lists and isinstance(merged.get(key), list):
+            merged[key].extend(value)
+        else:
+            merged[key] = value
+    return merged
@@ -0,0 +1,139 @@
+"""
+Pre-filtering of batch files before any LLM call: lockfiles, vendored, generated, minified,
+binary and data files are skipped or get static metrics only, decided from the path, the
+size and a sample of the content.
+"""
+import math
+import re
+from collections import Counter
+from fnmatch import fnmatch
+
+from policies import with_overrides
+
+# The pre-filter rules; classify_file takes overrides, and list-valued ones extend the defaults
+DEFAULT_PREFILTER_RULES = {
+    # Path globs (matched against the full path and the base name) that are never worth analyzing
+    "skip_paths": [
+        "*.lock", "package-lock.json", "npm-shrinkwrap.json", "pnpm-lock.yaml", "go.sum",
+        "node_modules/*", "*/node_modules/*", "vendor/*", "*/vendor/*", "third_party/*", "*/third_party/*",
+        "dist/*", "*/dist/*", "build/*", "*/build/*", "*.min.js", "*.min.css", "*.map",
+        "*_pb2.py", "*.pb.go", "*.g.dart", "*.designer.cs", "*.snap",
+    ],
+    # Path globs for data/config files: static metrics are cheap, an LLM review rarely helps
+    "metrics_only_paths": [
+        "*.json", "*.xml", "*.csv", "*.svg", "*.yaml", "*.yml",
+        "*fixtures/*", "*testdata/*", "*test_data/*", "*__snapshots__/*",
+    ],
+    # Globs that always go to analysis, even if another rule matches
+    "force_analyze_paths": [],
+    # Markers of generated code, searched in the first header_bytes of the file
+    "generated_markers": ["@generated", "DO NOT EDIT", "Code generated by", "auto-generated", "autogenerated by"],
+    "header_bytes": 2048,
+    "max_size_bytes": 1_000_000,
+    "metrics_only_size_bytes": 200_000,
+    "max_avg_line_length": 200,      # minified bundles and single-line data
+    "max_char_entropy": 5.5,         # bits per character; base64/encoded blobs sit near 6
+    "max_numeric_token_ratio": 0.6,  # tables of numbers rather than code
+    "binary_sample_bytes": 8192,
+}
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def _matches(path: str, patterns: list) -> str:
+    name = path.rsplit('/', 1)[-1]
+    for pattern in patterns:
+        if fnmatch(path, pattern) or fnmatch(name, pattern):
+            return pattern
+    return ""
+
+
+def is_binary(sample: bytes) -> bool:
+    """
+    Binary sniffing: NUL bytes or a high share of control bytes in the sample.
+    """
+    if not sample:
+        return False
+    if b'\x00' in sample:
+        return True
+    control = sum(1 for byte in sample if byte < 9 or 13 < byte < 32)
+    return control / len(sample) > 0.3
+
+
+def char_entropy(text: str) -> float:
+    """
+    Shannon entropy in bits per character.
+    """
+    if not text:
+        return 0.0
+    total = len(text)
+    return -sum(count / total * math.log2(count / total) for count in Counter(text).values())
+
+
+def classify_path(path: str, size: int = None, rules: dict = None) -> dict:
+    """
+    Classify a file from its path (and size, if known) alone, before fetching its content.
+    rules are overrides for DEFAULT_PREFILTER_RULES.
+    Returns a dict with action ("analyze", "metrics_only" or "skip") and reasons.
+    """
+    return _classify_path(path, size, with_overrides(DEFAULT_PREFILTER_RULES, rules, extend_lists=True))
+
+
+def _classify_path(path: str, size, rules: dict) -> dict:
+    if _matches(path, rules["force_analyze_paths"]):
+        return {"action": "analyze", "reasons": ["forced by force_analyze_paths"]}
+    pattern = _matches(path, rules["skip_paths"])
+    if pattern:
+        return {"action": "skip", "reasons": [f"path matches {pattern} (lockfile, vendored, built or generated)"]}
+    if size is not None and size > rules["max_size_bytes"]:
+        return {"action": "skip", "reasons": [f"size {size} bytes > {rules['max_size_bytes']}"]}
+    pattern = _matches(path, rules["metrics_only_paths"])
+    if pattern:
+        return {"action": "metrics_only", "reasons": [f"path matches {pattern} (data or config file)"]}
+    if size is not None and size > rules["metrics_only_size_bytes"]:
+        return {"action": "metrics_only", "reasons": [f"size {size} bytes > {rules['metrics_only_size_bytes']}"]}
+    return {"action": "analyze", "reasons": []}
+
+
+def classify_file(path: str, content, rules: dict = None) -> dict:
+    """
+    Classify a file from its path and content (bytes or str) using cheap signals:
+    path patterns, size, binary sniffing, generated-file headers, average line length,
+    character entropy and the share of numeric tokens. rules are overrides for DEFAULT_PREFILTER_RULES.
+    Returns a dict with action ("analyze", "metrics_only" or "skip") and reasons.
+    """
+    rules = with_overrides(DEFAULT_PREFILTER_RULES, rules, extend_lists=True)
+    raw = content.encode("utf-8", errors="replace") if isinstance(content, str) else content
+    decision = _classify_path(path, len(raw), rules)
+    if decision["action"] == "skip" or decision["reasons"] == ["forced by force_analyze_paths"]:
+        return decision
+
+    if is_binary(raw[:rules["binary_sample_bytes"]]):
+        return {"action": "skip", "reasons": ["binary content"]}
+
+    text = content if isinstance(content, str) else raw.decode("utf-8", errors="replace")
+    header = text[:rules["header_bytes"]]
+    for marker in rules["generated_markers"]:
+        if marker.lower() in header.lower():
+            return {"action": "skip", "reasons": [f"generated-file marker '{marker}' in header"]}
+
+    reasons = list(decision["reasons"])
+    lines = [line for line in text.split('\n') if line.strip()]
+    if lines:
+        avg_line_length = sum(len(line) for line in lines) / len(lines)
+        if avg_line_length > rules["max_avg_line_length"]:
+            return {"action": "skip", "reasons": [f"average line length {avg_line_length:.0f} > {rules['max_avg_line_length']} (minified or data)"]}
+
+    sample = text[:rules["binary_sample_bytes"]]
+    entropy = char_entropy(sample)
+    if entropy > rules["max_char_entropy"]:
+        reasons.append(f"character entropy {entropy:.2f} bits > {rules['max_char_entropy']} (encoded data)")
+    tokens = TOKEN_PATTERN.findall(sample)
+    if len(tokens) >= 50:
+        numeric_ratio = sum(1 for token in tokens if token.isdigit()) / len(tokens)
+        if numeric_ratio > rules["max_numeric_token_ratio"]:
+            reasons.append(f"{numeric_ratio:.0%} numeric tokens (data table)")
+
+    if reasons:
+        return {"action": "metrics_only", "reasons": reasons}
+    return {"action": "analyze", "reasons": []}
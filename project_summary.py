@@ -0,0 +1,234 @@
+import hashlib
+import json
+import posixpath
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from retrieval import estimate_tokens
+from telemetry import invoke_chain, record_cache
+
+# Process-wide cache of summary calls, keyed by a hash of the model, temperature, prompt kind
+# and inputs, holding the SUMMARY_CACHE_SIZE most recently used summaries.
+# File summaries are keyed by the file's content hash (its blob SHA) and metrics instead of
+# its analysis, which differs on every run above temperature 0. Every directory's inputs are
+# its children's summaries, so adding or changing one file only misses the cache on that
+# file and on the directories on its path to the root.
+SUMMARY_CACHE_SIZE = 5000
+_summary_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+WORST_FILES_LIMIT = 5
+
+
+class SummaryStopped(Exception):
+    """
+    Raised before an LLM call once the run's deadline has stopped it.
+    """
+
+
+def _cache_key(model: str, temperature: float, kind: str, inputs: dict) -> str:
+    return hashlib.sha256(json.dumps([model, temperature, kind, inputs], sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def badness_score(metrics: dict, smells: list) -> float:
+    """
+    Rank files by how much attention they need, from the utils.py metrics.
+    Higher is worse: complexity, low maintainability, deep nesting and smells all add to the score.
+    """
+    return (
+        metrics.get("cc", 0) / 10
+        + max(0.0, 50 - metrics.get("mi", 100)) / 10
+        + metrics.get("nesting_depth", 0) / 3
+        + len(smells)
+    )
+
+
+def rank_worst_files(files: list, limit: int = WORST_FILES_LIMIT) -> list:
+    """
+    Return the limit worst files as dicts with path, score, metrics and smells.
+    """
+    ranked = sorted(files, key=lambda f: badness_score(f["metrics"], f["smells"]), reverse=True)
+    return [
+        {"path": f["path"], "score": round(badness_score(f["metrics"], f["smells"]), 2), "metrics": f["metrics"], "smells": f["smells"]}
+        for f in ranked[:limit]
+    ]
+
+
+def _format_worst_files(worst: list) -> str:
+    rows = ["| File | Score | LOC | CC | MI | Nesting | Smells |", "|---|---|---|---|---|---|---|"]
+    for f in worst:
+        m = f["metrics"]
+        rows.append(
+            f"| {f['path']} | {f['score']} | {m.get('loc', '')} | {m.get('cc', '')} | {m.get('mi', 0):.1f} "
+            f"| {m.get('nesting_depth', '')} | {'; '.join(f['smells']) or '-'} |"
+        )
+    return "\n".join(rows)
+
+
+class ProjectSummarizer:
+    """
+    Hierarchical map-reduce summarizer: file analyses are condensed (map), grouped by directory
+    within a token budget and merged level by level (reduce) up to one project report.
+    Directories on the same level are reduced in parallel. With a deadline (a
+    deadlines.Deadline), every LLM call is preceded by a stop check, so a cancelled or timed
+    out run spends nothing more on its summary and gets a partial one (see summarize).
+    """
+
+    def __init__(self, temperature: float = 0.1, token_budget: int = 3000, max_workers: int = 4, deadline=None):
+        from main import (
+            DEFAULT_MODEL, create_summary_chain, create_file_summary_prompt_template,
+            create_group_summary_prompt_template, create_project_report_prompt_template
+        )
+        self.model = DEFAULT_MODEL
+        self.temperature = temperature
+        self.chains = {
+            "file": create_summary_chain(create_file_summary_prompt_template(), temperature, self.model),
+            "group": create_summary_chain(create_group_summary_prompt_template(), temperature, self.model),
+            "report": create_summary_chain(create_project_report_prompt_template(), temperature, self.model),
+        }
+        self.token_budget = token_budget
+        self.max_workers = max_workers
+        self.deadline = deadline
+        self.stats = {"llm_calls": 0, "cache_hits": 0}
+        self._stats_lock = threading.Lock()
+        self._file_summaries = {}  # path -> summary of every file condensed so far
+
+    def _invoke(self, kind: str, inputs: dict, key_inputs: dict = None) -> str:
+        """
+        Run one summary call through the cache; key_inputs, when given, stand in for inputs in the cache key.
+        """
+        key = _cache_key(self.model, self.temperature, kind, inputs if key_inputs is None else key_inputs)
+        with _cache_lock:
+            cached = _summary_cache.get(key)
+            if cached is not None:
+                _summary_cache.move_to_end(key)
+        record_cache("project_summary", cached is not None)
+        if cached is not None:
+            with self._stats_lock:
+                self.stats["cache_hits"] += 1
+            return cached
+        if self.deadline and self.deadline.stop_reason():
+            raise SummaryStopped()
+        text = invoke_chain(self.chains[kind], inputs, flow=f"summary_{kind}").content
+        with _cache_lock:
+            _summary_cache[key] = text
+            while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+                _summary_cache.popitem(last=False)
+        with self._stats_lock:
+            self.stats["llm_calls"] += 1
+        return text
+
+    def summarize_file(self, f: dict) -> str:
+        if not f["analysis"]:
+            # Files routed to metrics only have no LLM analysis to condense
+            return f"{f['path']}: trivial file, static metrics only."
+        metrics = ", ".join(f"{name}={value:.1f}" if isinstance(value, float) else f"{name}={value}" for name, value in f["metrics"].items())
+        inputs = {"path": f["path"], "metrics": metrics, "analysis": f["analysis"]}
+        key_inputs = {"path": f["path"], "metrics": metrics, "blob": f["blob"]} if f.get("blob") else None
+        summary = self._invoke("file", inputs, key_inputs)
+        self._file_summaries[f["path"]] = summary
+        return summary
+
+    def reduce_group(self, scope: str, children: list) -> str:
+        """
+        Merge (name, summary) pairs for one directory, splitting into budget-sized batches
+        and reducing the batch summaries again when they do not fit in one prompt.
+        """
+        if len(children) == 1:
+            return children[0][1]
+        # Batches always take at least two summaries so every round shrinks the list
+        batches, current, used = [], [], 0
+        for name, summary in children:
+            cost = estimate_tokens(summary)
+            if len(current) >= 2 and used + cost > self.token_budget:
+                batches.append(current)
+                current, used = [], 0
+            current.append((name, summary))
+            used += cost
+        batches.append(current)
+
+        def render(batch):
+            return "\n\n".join(f"#### {name}\n{summary}" for name, summary in batch)
+
+        if len(batches) == 1:
+            return self._invoke("group", {"scope": scope or "/", "summaries": render(batches[0])})
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            parts = list(pool.map(
+                lambda item: self._invoke("group", {"scope": f"{scope or '/'} (part {item[0] + 1})", "summaries": render(item[1])}),
+                enumerate(batches),
+            ))
+        return self.reduce_group(scope, [(f"{scope or '/'} part {i + 1}", part) for i, part in enumerate(parts)])
+
+    def summarize(self, project: str, files: list, progress=None) -> dict:
+        """
+        Build the project report.
+        files is a list of dicts with path, analysis, metrics (loc, cc, mi, nesting_depth), smells
+        and blob, the content hash that keys the file's summary (without it, the analysis does).
+        Returns a dict with report, worst_files, levels and the llm_calls/cache_hits stats.
+        When the deadline stops the run, the dict also has stopped (the reason) and the report
+        lists the file summaries finished so far; worst_files needs no LLM call and is complete.
+        """
+        try:
+            return self._summarize(project, files, progress)
+        except SummaryStopped:
+            finished = "\n\n".join(f"#### {path}\n{summary}" for path, summary in sorted(self._file_summaries.items()))
+            return {
+                "report": finished, "worst_files": rank_worst_files(files), "levels": 0,
+                "stopped": self.deadline.message(), **self.stats,
+            }
+
+    def _summarize(self, project: str, files: list, progress=None) -> dict:
+        if progress:
+            progress(0, len(files), "Summarizing files")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            file_summaries = list(pool.map(self.summarize_file, files))
+
+        # Directory tree: every directory maps to its direct children (files and sub-directories)
+        summaries = {f["path"]: summary for f, summary in zip(files, file_summaries)}
+        children = {"": set()}
+        for f in files:
+            path = f["path"]
+            parent = posixpath.dirname(path)
+            children.setdefault(parent, set()).add(path)
+            while parent:
+                grandparent = posixpath.dirname(parent)
+                children.setdefault(grandparent, set()).add(parent)
+                parent = grandparent
+
+        def depth(directory):
+            return directory.count("/") + 1 if directory else 0
+
+        levels = sorted({depth(d) for d in children}, reverse=True)
+        for level, level_depth in enumerate(levels):
+            if progress:
+                progress(level, len(levels), f"Merging summaries (level {level + 1} of {len(levels)})")
+            directories = [d for d in children if depth(d) == level_depth]
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                merged = list(pool.map(
+                    lambda d: self.reduce_group(d, [(posixpath.basename(c) or c, summaries[c]) for c in sorted(children[d])]),
+                    directories,
+                ))
+            summaries.update(zip(directories, merged))
+
+        worst = rank_worst_files(files)
+        report = self._invoke("report", {
+            "project": project,
+            "summary": summaries[""],
+            "worst_files": _format_worst_files(worst),
+        })
+        return {"report": report, "worst_files": worst, "levels": len(levels), **self.stats}
+
+
+def build_project_summary(project: str, files: list, temperature: float = 0.1, progress=None, deadline=None) -> dict:
+    """
+    Convenience wrapper used by the batch jobs; returns None when there is nothing to summarize.
+    A failure here must not discard the per-file results, so errors are returned as {"error": ...}.
+    The deadline of the job is checked before every summary call (see ProjectSummarizer).
+    """
+    if not files:
+        return None
+    try:
+        return ProjectSummarizer(temperature=temperature, deadline=deadline).summarize(project, files, progress)
+    except Exception as e:
+        return {"error": f"Project summary failed: {str(e)}"}
@@ -0,0 +1,114 @@
+import hashlib
+import re
+import time
+import uuid
+
+from utils import (
+    flesch_kincaid_grade_level, cyclomatic_complexity, calculate_maintainability_index,
+    lines_of_code, comment_lines, halstead_metrics,
+    nesting_depth, function_count, variable_count, code_duplication_percentage,
+    code_characters, code_comment_density, code_avg_function_length
+)
+from smell_rules import find_smells
+from telemetry import STATIC_METRICS_SECONDS
+
+
+def hash_code(code: str) -> str:
+    """
+    Content hash used to key analyses of identical code.
+    """
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class AnalysisReport:
+    """
+    One finished analysis: the code, its hash, the LLM result and lazily computed static metrics.
+    Reports are kept in session state by id so tabs, exports, history and comparison all
+    read the same object instead of recomputing metrics or calling the LLM again.
+    """
+
+    __slots__ = ("id", "code", "code_hash", "result", "source", "created", "_metrics", "_smells", "_halstead")
+
+    def __init__(self, code: str, result: str, source: str = "", metrics: dict = None, halstead: dict = None):
+        """
+        metrics and halstead may be passed in when already computed for exactly this code
+        (e.g. by incremental_metrics.IncrementalMetrics); otherwise they are computed on first use.
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.code = code
+        self.code_hash = hash_code(code)
+        self.result = result
+        self.source = source
+        self.created = time.time()
+        self._metrics = metrics
+        self._smells = None
+        self._halstead = halstead
+
+    @property
+    def metrics(self) -> dict:
+        """
+        The metric dict used by the dashboard, exports and history, computed on first access.
+        """
+        if self._metrics is None:
+            code = self.code
+            with STATIC_METRICS_SECONDS.time(scope="report"):
+                loc_dict = lines_of_code(code)
+                self._metrics = {
+                    "loc": loc_dict,
+                    "cc": cyclomatic_complexity(code),
+                    "mi": calculate_maintainability_index(code, loc_dict['value'], comment_lines(code)),
+                    "fkgl": flesch_kincaid_grade_level(code),
+                    "nd": nesting_depth(code),
+                    "fc": function_count(code),
+                    "vc": variable_count(code),
+                    "dup": code_duplication_percentage(code),
+                    "chars": code_characters(code),
+                    "cd": code_comment_density(code),
+                    "afl": code_avg_function_length(code),
+                }
+        return self._metrics
+
+    @property
+    def smell_hits(self) -> list:
+        """
+        Code smells with their line locations (see smell_rules.find_smells), scoped by the
+        source file name when there is one and reusing complexity already computed for metrics.
+        """
+        if self._smells is None:
+            known = {"cc": self._metrics["cc"]["value"]} if self._metrics is not None else None
+            self._smells = find_smells(self.code, self.source, known)
+        return self._smells
+
+    @property
+    def smells(self) -> list:
+        return [hit["message"] for hit in self.smell_hits]
+
+    @property
+    def halstead(self) -> dict:
+        if self._halstead is None:
+            self._halstead = halstead_metrics(self.code)
+        return self._halstead
+
+    def section(self, header: str) -> str:
+        """
+        Return one '### ' section of the LLM result, or an empty string if it is missing.
+        """
+        start = self.result.find(header)
+        if start == -1:
+            return ""
+        next_header = self.result.find("###", start + 1)
+        if next_header == -1:
+            next_header = len(self.result)
+        return self.result[start:next_header].strip()
+
+    def confidences(self) -> dict:
+        """
+        Confidence scores reported by the LLM, e.g. {"Syntax Analysis Confidence": 95}.
+        """
+        return {category: int(score) for category, score in re.findall(r'(\w+ \w+ Confidence): (\d+)%', self.result)}
+
+    def title(self) -> str:
+        loc = self.metrics['loc']['value']
+        cc = self.metrics['cc']['value']
+        name = self.source or "snippet"
+        return f"{name} - LOC: {loc}, CC: {cc}"
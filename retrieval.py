@@ -0,0 +1,197 @@
+import math
+import re
+import threading
+from collections import Counter
+
+# Lines that start a new function-level chunk (same heuristics as utils.function_count, plus classes)
+CHUNK_BOUNDARY = re.compile(
+    r'^\s*(?:async\s+def|def|class|function|func|fn|public|private|protected|static)\b'
+)
+TOKEN_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+SECTION_PATTERN = re.compile(r'^###\s+', re.MULTILINE)
+ESTIMATE_PATTERN = re.compile(r'[A-Za-z]+|\d+|[ \t]+|[^\sA-Za-z\d]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Pre-flight token estimate used for prompt budgeting, without loading a tokenizer.
+    Words cost about one token per 5 letters, numbers one per 3 digits, every symbol and
+    line break one, and indentation one per 4 columns. Errs on the high side for code,
+    where plain len(text) / 4 undercounts punctuation-heavy lines.
+    """
+    tokens = 0
+    for piece in ESTIMATE_PATTERN.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            tokens += (len(piece) + 4) // 5
+        elif first.isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif first in ' \t':
+            tokens += len(piece.expandtabs(4)) // 4
+        else:
+            tokens += 1
+    return max(1, tokens + text.count('\n'))
+
+
+def tokenize(text: str) -> list:
+    """
+    Split text into lowercase search terms.
+    Identifiers are kept whole and also split on underscores and camelCase so that
+    'parse_config' and 'parseConfig' both match a query for 'config'.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text):
+        lowered = token.lower()
+        terms.append(lowered)
+        parts = [p for p in re.split(r'_|(?<=[a-z0-9])(?=[A-Z])', token) if p]
+        if len(parts) > 1:
+            terms.extend(p.lower() for p in parts)
+    return terms
+
+
+def chunk_code(code: str, max_lines: int = 80) -> list:
+    """
+    Split source code into function-level chunks.
+    A new chunk starts at every def/class/function-like line; chunks longer than
+    max_lines are split further so no single chunk dominates the prompt budget.
+    Returns a list of dicts with text, start_line and end_line (1-based).
+    """
+    lines = code.split('\n')
+    starts = [0] + [i for i, line in enumerate(lines) if i > 0 and CHUNK_BOUNDARY.match(line)]
+    chunks = []
+    for n, start in enumerate(starts):
+        end = starts[n + 1] if n + 1 < len(starts) else len(lines)
+        for sub_start in range(start, end, max_lines):
+            sub_end = min(end, sub_start + max_lines)
+            text = '\n'.join(lines[sub_start:sub_end]).strip('\n')
+            if text.strip():
+                chunks.append({"text": text, "start_line": sub_start + 1, "end_line": sub_end})
+    return chunks
+
+
+def chunk_analysis(analysis: str) -> list:
+    """
+    Split an LLM analysis into its '### Section' blocks.
+    Returns a list of dicts with text and section (the heading).
+    """
+    chunks = []
+    for block in SECTION_PATTERN.split(analysis):
+        block = block.strip()
+        if not block:
+            continue
+        heading = block.split('\n', 1)[0].strip()
+        chunks.append({"text": f"### {block}", "section": heading})
+    return chunks
+
+
+class CodeIndex:
+    """
+    In-process BM25 index over code chunks and analysis sections.
+    Documents are added incrementally; re-adding a source replaces its previous chunks.
+    Queries only touch the postings of the query terms, so they stay fast for
+    thousands of chunks. Background jobs add their results from worker threads, so every
+    method holds the index lock.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}        # chunk_id -> chunk dict
+        self.postings = {}      # term -> {chunk_id: term frequency}
+        self.lengths = {}       # chunk_id -> number of terms
+        self.sources = {}       # source -> [chunk_id, ...]
+        self.total_length = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _add_chunk(self, source: str, kind: str, chunk: dict):
+        terms = tokenize(chunk["text"])
+        if not terms:
+            return
+        chunk_id = self._next_id
+        self._next_id += 1
+        self.chunks[chunk_id] = {**chunk, "source": source, "kind": kind, "tokens": estimate_tokens(chunk["text"])}
+        self.lengths[chunk_id] = len(terms)
+        self.total_length += len(terms)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+        self.sources.setdefault(source, []).append(chunk_id)
+
+    def remove_source(self, source: str):
+        """
+        Remove every chunk previously indexed under source.
+        """
+        with self._lock:
+            self._remove_source(source)
+
+    def _remove_source(self, source: str):
+        for chunk_id in self.sources.pop(source, []):
+            chunk = self.chunks.pop(chunk_id)
+            self.total_length -= self.lengths.pop(chunk_id)
+            for term in set(tokenize(chunk["text"])):
+                bucket = self.postings.get(term)
+                if bucket is not None:
+                    bucket.pop(chunk_id, None)
+                    if not bucket:
+                        del self.postings[term]
+
+    def add_analysis(self, source: str, code: str, analysis: str = ""):
+        """
+        Index a piece of analyzed code and its analysis under a source name (e.g. a file name).
+        Replaces anything indexed earlier for the same source.
+        """
+        with self._lock:
+            self._remove_source(source)
+            for chunk in chunk_code(code):
+                self._add_chunk(source, "code", chunk)
+            for chunk in chunk_analysis(analysis or ""):
+                self._add_chunk(source, "analysis", chunk)
+
+    def search(self, query: str, k: int = 5, token_budget: int = 1500) -> list:
+        """
+        Return up to k chunks ranked by BM25 score whose combined token estimate fits token_budget.
+        Each result is the chunk dict with an added 'score'.
+        """
+        with self._lock:
+            if not self.chunks:
+                return []
+            n_docs = len(self.chunks)
+            avg_len = self.total_length / n_docs
+            scores = {}
+            for term in set(tokenize(query)):
+                bucket = self.postings.get(term)
+                if not bucket:
+                    continue
+                idf = math.log(1 + (n_docs - len(bucket) + 0.5) / (len(bucket) + 0.5))
+                for chunk_id, tf in bucket.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / avg_len)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            results = []
+            used = 0
+            for chunk_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                chunk = self.chunks[chunk_id]
+                if used + chunk["tokens"] > token_budget:
+                    continue
+                results.append({**chunk, "score": score})
+                used += chunk["tokens"]
+                if len(results) >= k:
+                    break
+            return results
+
+
+def format_context(chunks: list) -> str:
+    """
+    Render retrieved chunks as a compact, source-labelled block for the chat prompt.
+    """
+    parts = []
+    for chunk in chunks:
+        if chunk["kind"] == "code":
+            label = f"{chunk['source']} (lines {chunk['start_line']}-{chunk['end_line']})"
+        else:
+            label = f"{chunk['source']} analysis: {chunk['section']}"
+        parts.append(f"[{label}]\n{chunk['text']}")
+    return "\n\n".join(parts)
@@ -0,0 +1,277 @@
+"""
+Reuse of earlier analyses: MinHash signatures of normalized token shingles find an owner's
+earlier submission of nearly the same code, so it can be answered with the stored analysis
+or a review of the diff instead of a full analysis.
+"""
+import difflib
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import Counter
+
+from policies import with_overrides
+from report import hash_code
+from storage import data_path, shared
+
+# When a submission may reuse the analysis of a similar earlier one; find_reusable takes overrides of these keys
+DEFAULT_REUSE_POLICY = {
+    "enabled": True,
+    "threshold": 0.85,        # estimated Jaccard similarity of normalized token shingles
+    "min_shared_names": 0.5,  # Jaccard similarity of the identifier sets; guards against look-alike code
+    "max_diff_lines": 200,    # larger diffs get a full analysis instead of a delta review
+}
+
+SHINGLE_TOKENS = 5
+SIGNATURE_SIZE = 128
+BANDS, ROWS = 32, 4
+DENSIFY_OFFSET = 0x9E3779B1
+BUCKET_PROBE_LIMIT = 200  # newest snippets read per bucket, so crowded buckets (boilerplate) stay cheap
+TOKEN_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|[A-Za-z_]\w*|\d[\w.]*|\S')
+# Kept as-is when normalizing; every other identifier becomes the same placeholder
+KEYWORDS = {
+    'if', 'else', 'elif', 'for', 'while', 'do', 'switch', 'case', 'default', 'break', 'continue', 'return',
+    'try', 'except', 'catch', 'finally', 'throw', 'raise', 'def', 'function', 'func', 'fn', 'class', 'struct',
+    'interface', 'import', 'from', 'package', 'public', 'private', 'protected', 'static', 'const', 'let', 'var',
+    'new', 'this', 'self', 'true', 'false', 'null', 'None', 'True', 'False', 'and', 'or', 'not', 'in', 'is',
+    'with', 'as', 'async', 'await', 'yield', 'lambda', 'void', 'int', 'str', 'float', 'bool', 'print',
+}
+
+
+def normalized_tokens(code: str) -> list:
+    """
+    Tokens with identifiers, strings and numbers replaced by placeholders, so renaming a
+    variable or changing a literal leaves the shingles unchanged.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(code):
+        first = token[0]
+        if first in '"\'':
+            tokens.append('"S"')
+        elif first.isdigit():
+            tokens.append('0')
+        elif first.isalpha() or first == '_':
+            tokens.append(token if token in KEYWORDS else 'I')
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def identifier_names(code: str) -> set:
+    """
+    The identifiers in code other than KEYWORDS, as written.
+    """
+    return {token for token in TOKEN_PATTERN.findall(code) if (token[0].isalpha() or token[0] == '_') and token not in KEYWORDS}
+
+
+def signature(code: str):
+    """
+    MinHash signature of the code's shingles (SHINGLE_TOKENS normalized tokens each), or None
+    for code without tokens. One-permutation hashing: every shingle is hashed once into one
+    of SIGNATURE_SIZE bins keeping the minimum, and empty bins borrow from the next filled
+    one, so the cost is linear in the code size rather than in size x signature length.
+    """
+    tokens = normalized_tokens(code)
+    if not tokens:
+        return None
+    bins = [None] * SIGNATURE_SIZE
+    for start in range(max(1, len(tokens) - SHINGLE_TOKENS + 1)):
+        shingle = " ".join(tokens[start:start + SHINGLE_TOKENS]).encode("utf-8")
+        value = int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), "little")
+        slot, rest = value % SIGNATURE_SIZE, (value // SIGNATURE_SIZE) & 0xFFFFFFFF
+        if bins[slot] is None or rest < bins[slot]:
+            bins[slot] = rest
+    filled = list(bins)
+    for slot in range(SIGNATURE_SIZE):
+        distance = 1
+        while bins[slot] is None:
+            borrowed = filled[(slot + distance) % SIGNATURE_SIZE]
+            if borrowed is not None:
+                bins[slot] = (borrowed + distance * DENSIFY_OFFSET) & 0xFFFFFFFF
+            distance += 1
+    return bins
+
+
+def similarity(first: list, second: list) -> float:
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_SIZE
+
+
+def band_keys(sig: list) -> list:
+    """
+    One LSH bucket key per band of ROWS signature values; similar code shares at least one
+    bucket with high probability (about 0.9999 at similarity 0.7, 0.87 at 0.5).
+    """
+    keys = []
+    for band in range(BANDS):
+        values = array("I", sig[band * ROWS:(band + 1) * ROWS]).tobytes()
+        digest = hashlib.blake2b(bytes([band]) + values, digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little") >> 1)  # fits SQLite's signed 64-bit integers
+    return keys
+
+
+def code_diff(old: str, new: str) -> dict:
+    """
+    Unified diff from old to new, with the number of changed lines and the Jaccard similarity
+    of the two versions' identifier names.
+    """
+    diff = list(difflib.unified_diff(old.splitlines(), new.splitlines(), "reviewed", "submitted", lineterm=""))
+    old_names, new_names = identifier_names(old), identifier_names(new)
+    return {
+        "diff": "\n".join(diff),
+        "changed_lines": sum(1 for line in diff[2:] if line[:1] in "+-"),
+        "shared_names": len(old_names & new_names) / max(1, len(old_names | new_names)),
+    }
+
+
+class SimilarityIndex:
+    """
+    Persistent MinHash/LSH index of analyzed code and its analysis, scoped per owner (an id
+    of the submitting session): a lookup only ever sees the owner's own snippets, so no
+    session is shown another one's code, file names or analyses.
+
+    Each snippet is stored with its signature and one row per LSH band in a bucket table
+    clustered by owner and bucket, so a lookup is BANDS range reads of at most
+    BUCKET_PROBE_LIMIT rows plus a comparison against the few snippets that share the most
+    buckets, independent of how many snippets are stored. In a crowded bucket only the
+    newest snippets are seen.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or data_path("similarity.db")
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(snippets)")}
+            if columns and "owner" not in columns:
+                # Snippets indexed before owners were recorded cannot be attributed to anyone
+                conn.executescript("DROP TABLE snippets; DROP TABLE IF EXISTS buckets;")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS snippets (
+                    id INTEGER PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    code_hash TEXT NOT NULL,
+                    source TEXT,
+                    code TEXT NOT NULL,
+                    analysis TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    created REAL NOT NULL,
+                    UNIQUE (owner, code_hash)
+                );
+                CREATE TABLE IF NOT EXISTS buckets (
+                    owner TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    snippet_id INTEGER NOT NULL,
+                    PRIMARY KEY (owner, bucket, snippet_id)
+                ) WITHOUT ROWID;
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, owner: str, code: str, analysis: str, source: str = ""):
+        """
+        Index a fully analyzed snippet of owner; identical code replaces its earlier analysis.
+        """
+        sig = signature(code)
+        if sig is None:
+            return
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT id FROM snippets WHERE owner = ? AND code_hash = ?", (owner, hash_code(code))).fetchone()
+            if row:
+                conn.execute("UPDATE snippets SET analysis = ?, source = ?, created = ? WHERE id = ?", (analysis, source, time.time(), row[0]))
+                return
+            snippet_id = conn.execute(
+                "INSERT INTO snippets (owner, code_hash, source, code, analysis, signature, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (owner, hash_code(code), source, code, analysis, array("I", sig).tobytes(), time.time()),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO buckets (owner, bucket, snippet_id) VALUES (?, ?, ?)", [(owner, key, snippet_id) for key in band_keys(sig)]
+            )
+
+    def lookup(self, owner: str, code: str, threshold: float = 0.0, candidates: int = 20):
+        """
+        The most similar snippet of owner with similarity >= threshold, as a dict with source,
+        code, analysis, created and similarity, or None.
+        """
+        sig = signature(code)
+        if sig is None:
+            return None
+        shared = Counter()
+        with self._connect() as conn:
+            for key in band_keys(sig):
+                shared.update(row[0] for row in conn.execute(
+                    "SELECT snippet_id FROM buckets WHERE owner = ? AND bucket = ? ORDER BY snippet_id DESC LIMIT ?",
+                    (owner, key, BUCKET_PROBE_LIMIT),
+                ))
+            ids = [snippet_id for snippet_id, _ in shared.most_common(candidates)]
+            rows = conn.execute(
+                f"SELECT source, code, analysis, created, signature FROM snippets WHERE id IN ({', '.join('?' for _ in ids)})", ids
+            ).fetchall() if ids else []
+        best = None
+        for source, stored_code, analysis, created, blob in rows:
+            score = similarity(sig, array("I", blob).tolist())
+            if score >= threshold and (best is None or score > best["similarity"]):
+                best = {"source": source, "code": stored_code, "analysis": analysis, "created": created, "similarity": score}
+        return best
+
+    def count(self, owner: str) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM snippets WHERE owner = ?", (owner,)).fetchone()[0]
+
+
+def find_reusable(owner: str, code: str, policy: dict = None):
+    """
+    A previous analysis of owner's that code can reuse with a delta review, or None.
+    Returns the lookup dict (see SimilarityIndex.lookup) plus diff, changed_lines and
+    shared_names; with no changed lines the analysis can be reused as is.
+    Renamed identifiers and changed literals look identical to the signature, so the diff
+    guards of the policy are what keep unrelated code of the same shape from matching.
+    """
+    policy = with_overrides(DEFAULT_REUSE_POLICY, policy)
+    if not policy["enabled"]:
+        return None
+    match = get_similarity_index().lookup(owner, code, policy["threshold"])
+    if match is None:
+        return None
+    delta = code_diff(match["code"], code)
+    if delta["changed_lines"] > policy["max_diff_lines"] or delta["shared_names"] < policy["min_shared_names"]:
+        return None
+    return {**match, **delta}
+
+
+def analyze_with_reuse(owner: str, code: str, temperature: float, policy: dict = None, source: str = "",
+                       flow: str = "analyze") -> tuple:
+    """
+    The Analyze page analysis of code, reusing owner's analysis of similar code: unchanged
+    code gets it as is, close matches (see find_reusable) get a review of the diff appended
+    to it, and anything else a full analysis, which is indexed for later submissions. Only
+    full analyses are indexed, so reused ones never drift from a real review.
+    Returns (analysis, match), match being the find_reusable dict or None.
+    """
+    from main import DEFAULT_MODEL, create_analysis_chain, create_delta_analysis_chain
+    from telemetry import invoke_chain, record_cache
+
+    match = find_reusable(owner, code, policy)
+    record_cache("similarity", match is not None)
+    if match is not None and match["changed_lines"] == 0:
+        return match["analysis"], match
+    if match is not None:
+        chain = create_delta_analysis_chain(temperature=temperature)
+        delta = invoke_chain(chain, {"previous_analysis": match["analysis"], "diff": match["diff"]}, flow="delta", model=DEFAULT_MODEL).content
+        return f"{match['analysis']}\n\n### 🔁 Changes Since Similar Analysis\n{delta}", match
+    chain = create_analysis_chain(temperature=temperature)
+    analysis = invoke_chain(chain, {"code": code}, flow=flow, model=DEFAULT_MODEL).content
+    get_similarity_index().add(owner, code, analysis, source)
+    return analysis, None
+
+
+@shared
+def get_similarity_index() -> SimilarityIndex:
+    """
+    Process-wide SimilarityIndex used by the Streamlit sessions, each under its own owner id.
+    """
+    return SimilarityIndex()
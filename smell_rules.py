@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import re
+from bisect import bisect_right
+
+from utils import cyclomatic_complexity, lines_of_code, nesting_depth
+
+# Declarative code smell rules, evaluated by SmellMatcher. A rule has an id, a message and
+# either text patterns or a metric threshold:
+#   literals    substrings to look for
+#   keywords    whole words to look for
+#   regex       regular expressions (no capturing-group names of their own)
+#   ignore_case match the patterns above case-insensitively
+#   unless      substrings (case-insensitive) that suppress the rule anywhere in the file
+#   min_count   matches needed before the rule fires (default 1)
+#   metric, above   fire when the named metric (see METRIC_FUNCTIONS) exceeds the threshold
+#   languages   only check files of these languages (see LANGUAGE_BY_EXTENSION); all when absent
+# Teams add in-house rules in a JSON list at CODE_JUDGE_SMELL_RULES, or pass extra rules to find_smells.
+DEFAULT_SMELL_RULES = [
+    {
+        "id": "long-code", "metric": "chars", "above": 1000,
+        "message": "Long method/function - consider breaking into smaller functions",
+    },
+    {
+        "id": "high-complexity", "metric": "cc", "above": 10,
+        "message": "High cyclomatic complexity - consider simplifying logic",
+    },
+    {
+        "id": "debug-output",
+        "literals": ['print(', 'console.log', 'System.out', 'printf', 'puts', 'log('],
+        "unless": ['debug'],
+        "message": "Potential debug/logging statements left in code (e.g., print, console.log)",
+    },
+    {
+        "id": "todo", "literals": ['TODO', 'FIXME'], "ignore_case": True,
+        "message": "TODO/FIXME comments present - unfinished work",
+    },
+]
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "python", ".js": "javascript", ".jsx": "javascript", ".ts": "typescript", ".tsx": "typescript",
+    ".java": "java", ".kt": "kotlin", ".c": "c", ".h": "c", ".cpp": "cpp", ".cc": "cpp", ".hpp": "cpp",
+    ".cs": "csharp", ".go": "go", ".rs": "rust", ".rb": "ruby", ".php": "php", ".swift": "swift",
+    ".sql": "sql", ".sh": "shell", ".html": "html", ".css": "css",
+}
+
+# Metrics a rule can threshold on; callers that already computed them pass the values in
+METRIC_FUNCTIONS = {
+    "chars": len,
+    "loc": lambda code: lines_of_code(code)["value"],
+    "cc": lambda code: cyclomatic_complexity(code)["value"],
+    "nesting": lambda code: nesting_depth(code)["value"],
+}
+
+
+def language_of(path: str):
+    """
+    Language of a file from its extension, or None when unknown (e.g. pasted code).
+    """
+    name = path.rsplit('/', 1)[-1].lower()
+    dot = name.rfind('.')
+    return LANGUAGE_BY_EXTENSION.get(name[dot:]) if dot > 0 else None
+
+
+def load_custom_rules(path: str = None) -> list:
+    """
+    In-house rules from the JSON list at path (default: env CODE_JUDGE_SMELL_RULES), or [].
+    """
+    path = path or os.getenv("CODE_JUDGE_SMELL_RULES")
+    if not path:
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def rules_version() -> str:
+    """
+    Short fingerprint of the default and custom rules, for caches of smell results that must
+    not outlive a rule change.
+    """
+    rules = json.dumps(DEFAULT_SMELL_RULES + load_custom_rules(), sort_keys=True)
+    return hashlib.sha256(rules.encode("utf-8")).hexdigest()[:12]
+
+
+def _trie_pattern(texts) -> str:
+    """
+    Regex matching any of texts, built as a prefix trie so shared prefixes are tried once
+    and the longest text wins at each position.
+    """
+    trie = {}
+    for text in texts:
+        node = trie
+        for char in text:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class SmellMatcher:
+    """
+    A rule set compiled for one language into a few regexes, so a file is scanned a fixed
+    number of times however many literal and keyword rules there are. Literals and keywords
+    of all rules (and their "unless" texts) go into up to four prefix tries (by word
+    boundaries and case sensitivity), each scanned in one pass; a match is mapped back to its
+    rules through a dict, including rules whose literal is a prefix of the longer literal
+    matched. Tries are matched inside a lookahead, so a text is found at every position it
+    starts, even inside another rule's match. Each regex rule is one more pass of its own,
+    so no rule can hide another's matches. Metric rules only read precomputed or lazily
+    computed metric values.
+    """
+
+    def __init__(self, rules: list, language: str = None):
+        self.rules = [rule for rule in rules if not rule.get("languages") or language in rule["languages"]]
+        # (word boundaries, ignore case) -> {normalized text: [("r" | "u", rule index)]}
+        self.tables = {(False, False): {}, (False, True): {}, (True, False): {}, (True, True): {}}
+        regexes = []
+        for n, rule in enumerate(self.rules):
+            ignore_case = bool(rule.get("ignore_case"))
+            for words, texts in ((False, rule.get("literals", [])), (True, rule.get("keywords", []))):
+                for text in texts:
+                    self.tables[words, ignore_case].setdefault(text.lower() if ignore_case else text, []).append(("r", n))
+            for text in rule.get("unless", []):
+                self.tables[False, True].setdefault(text.lower(), []).append(("u", n))
+            if rule.get("regex"):
+                body = '|'.join(f"(?:{pattern})" for pattern in rule["regex"])
+                regexes.append((re.compile(f"{'(?i:' if ignore_case else '(?:'}{body})", re.MULTILINE), n))
+
+        # (compiled pattern, (ignore case, table) of a trie or the index of a regex rule)
+        self.passes = []
+        for (words, ignore_case), table in self.tables.items():
+            if not table:
+                continue
+            if not words:
+                # A longer literal also counts for every shorter literal it starts with
+                own = {text: list(targets) for text, targets in table.items()}
+                for text in table:
+                    prefixed = [target for end in range(1, len(text)) for target in own.get(text[:end], [])]
+                    table[text] = list(dict.fromkeys(own[text] + prefixed))
+            body = _trie_pattern(table)
+            if words:
+                body = rf"\b{body}\b"
+            pattern = re.compile(f"(?=(?P<t>{'(?i:' if ignore_case else '(?:'}{body})))", re.MULTILINE)
+            self.passes.append((pattern, (ignore_case, table)))
+        self.passes.extend((pattern, n) for pattern, n in regexes)
+
+    def scan(self, code: str, metrics: dict = None) -> list:
+        """
+        Return the rules that fire on code, in rule order, as dicts with id, message,
+        count (pattern matches; 0 for metric rules) and lines (1-based lines of the matches).
+        """
+        lines, suppressed = {}, set()
+        newlines = [match.start() for match in re.finditer('\n', code)] if self.passes else []
+        for pattern, source in self.passes:
+            for match in pattern.finditer(code):
+                if isinstance(source, tuple):
+                    ignore_case, table = source
+                    text = match.group("t")
+                    targets = table.get(text.lower() if ignore_case else text, [])
+                else:
+                    targets = [("r", source)]
+                line = None
+                for kind, n in targets:
+                    if kind == "u":
+                        suppressed.add(n)
+                    else:
+                        line = line or bisect_right(newlines, match.start()) + 1
+                        lines.setdefault(n, []).append(line)
+
+        metrics = dict(metrics or {})
+        hits = []
+        for n, rule in enumerate(self.rules):
+            if "metric" in rule:
+                if rule["metric"] not in metrics:
+                    metrics[rule["metric"]] = METRIC_FUNCTIONS[rule["metric"]](code)
+                if metrics[rule["metric"]] > rule["above"]:
+                    hits.append({"id": rule["id"], "message": rule["message"], "count": 0, "lines": []})
+            elif n not in suppressed and len(lines.get(n, [])) >= rule.get("min_count", 1):
+                hits.append({"id": rule["id"], "message": rule["message"], "count": len(lines[n]), "lines": sorted(set(lines[n]))})
+        return hits
+
+
+_matchers = {}  # language -> SmellMatcher for the custom rules file as of _matchers_stamp
+_matchers_stamp = None
+
+
+def _custom_rules_stamp():
+    """
+    Path and modification time of the custom rules file, or None without one.
+    """
+    path = os.getenv("CODE_JUDGE_SMELL_RULES")
+    if not path:
+        return None
+    try:
+        return path, os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None
+
+
+def find_smells(code: str, path: str = "", metrics: dict = None, extra_rules: list = None) -> list:
+    """
+    Code smells in code as dicts with id, message, count and lines (see SmellMatcher.scan).
+    path selects the language-scoped rules; metrics may carry already computed values for
+    chars, loc, cc or nesting. The default and custom rules are compiled once per language,
+    and again whenever the custom rules file (or CODE_JUDGE_SMELL_RULES) changes.
+    """
+    global _matchers, _matchers_stamp
+    language = language_of(path) if path else None
+    if extra_rules:
+        return SmellMatcher(DEFAULT_SMELL_RULES + load_custom_rules() + extra_rules, language).scan(code, metrics)
+    stamp = _custom_rules_stamp()
+    if stamp != _matchers_stamp:
+        _matchers, _matchers_stamp = {}, stamp
+    matchers = _matchers
+    if language not in matchers:
+        matchers[language] = SmellMatcher(DEFAULT_SMELL_RULES + load_custom_rules(), language)
+    return matchers[language].scan(code, metrics)
@@ -0,0 +1,157 @@
+import contextvars
+import datetime
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from report import AnalysisReport, hash_code
+from storage import data_path
+from telemetry import REGISTRY
+
+SPECULATIVE_RUNS = REGISTRY.counter(
+    "code_judge_speculative_runs_total",
+    "Speculative pre-analyses by outcome (started, claimed, cancelled, over_budget).", ("outcome",),
+)
+
+
+def speculation_key(code: str, temperature: float, source: str = "") -> str:
+    # The source name picks the language rules for smells, so it is part of the key
+    return f"{hash_code(code)}:{temperature}:{source}"
+
+
+class SpeculativeAnalyzer:
+    """
+    Starts the Analyze page analysis before the button is clicked.
+
+    Each session (owner) has at most one speculative run, keyed by the code's content hash,
+    the temperature and the source file name. The static metrics are computed at once and the LLM call follows on
+    a background thread; the button then claims the in-flight or finished run instead of
+    starting a new one. A new key for the same owner cancels the previous run (a call already
+    sent to the API finishes, but its result is dropped). A run is kept while its session is
+    alive (see speculate), so runs of closed sessions are dropped at the next speculate call.
+    The analysis goes through similarity.analyze_with_reuse like a clicked one, so a run can
+    reuse an earlier analysis and its full analyses are indexed for later reuse.
+    LLM calls are capped per UTC day by daily_budget (env CODE_JUDGE_SPECULATIVE_BUDGET; it
+    is shared by every session, so it is not adjustable from the app), counted in a small
+    JSON file in the data directory so the cap holds across restarts.
+    """
+
+    def __init__(self, daily_budget: int = None, max_workers: int = 2, budget_path: str = None):
+        self.daily_budget = int(os.getenv("CODE_JUDGE_SPECULATIVE_BUDGET", "50")) if daily_budget is None else daily_budget
+        self.budget_path = budget_path or data_path("speculative_budget.json")
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="code-judge-speculative")
+        self._lock = threading.Lock()
+        self._budget_lock = threading.Lock()
+        self._runs = {}
+
+    def _load_budget(self) -> dict:
+        today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        try:
+            with open(self.budget_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if state.get("day") != today:
+            state = {"day": today, "used": 0}
+        return state
+
+    def used_today(self) -> int:
+        with self._budget_lock:
+            return self._load_budget()["used"]
+
+    def _try_spend(self) -> bool:
+        with self._budget_lock:
+            state = self._load_budget()
+            if state["used"] >= self.daily_budget:
+                return False
+            state["used"] += 1
+            with open(self.budget_path, "w") as f:
+                json.dump(state, f)
+            return True
+
+    def _cancel(self, run: dict):
+        run["cancelled"].set()
+        run["future"].cancel()
+        if run["status"] in ("queued", "metrics", "analyzing"):
+            SPECULATIVE_RUNS.inc(outcome="cancelled")
+
+    def _drop_ended_sessions(self):
+        for owner, run in list(self._runs.items()):
+            if run["is_alive"] is not None and not run["is_alive"]():
+                self._cancel(run)
+                del self._runs[owner]
+
+    def speculate(self, owner: str, code: str, temperature: float, is_alive=None, index_owner: str = None,
+                  reuse_policy: dict = None, source: str = "") -> dict:
+        """
+        Make sure owner's speculative run matches code, cancelling a run for older code.
+        is_alive, a callable returning False once owner's session has ended, lets the run
+        be dropped after that. source is the report's source file name; index_owner
+        (default: owner) and reuse_policy are passed to similarity.analyze_with_reuse.
+        Returns the run (a dict with key, status and future), or None for empty code.
+        """
+        key = speculation_key(code, temperature, source)
+        with self._lock:
+            self._drop_ended_sessions()
+            run = self._runs.get(owner)
+            if run and run["key"] == key:
+                return run
+            if run:
+                self._cancel(run)
+                del self._runs[owner]
+            if not code.strip():
+                return None
+            run = {"key": key, "status": "queued", "claimed": False, "cancelled": threading.Event(), "is_alive": is_alive}
+            # Run with the session's deadlines (see deadlines.use_deadlines)
+            reuse = {"owner": index_owner or owner, "policy": reuse_policy}
+            run["future"] = self.executor.submit(contextvars.copy_context().run, self._run, run, code, temperature, source, reuse)
+            self._runs[owner] = run
+            SPECULATIVE_RUNS.inc(outcome="started")
+            return run
+
+    def cancel(self, owner: str):
+        with self._lock:
+            run = self._runs.pop(owner, None)
+            if run:
+                self._cancel(run)
+
+    def claim(self, owner: str, code: str, temperature: float, source: str = ""):
+        """
+        Hand owner's run for exactly this code, temperature and source over to the caller, once.
+        Returns its future, whose result is (AnalysisReport, match) as from
+        similarity.analyze_with_reuse (the report has an empty result if the LLM call was
+        skipped for the budget), or None when there is no unclaimed matching run.
+        The claimed run stays registered so later reruns with the same code do not start another.
+        """
+        with self._lock:
+            run = self._runs.get(owner)
+            if not run or run["key"] != speculation_key(code, temperature, source) or run["cancelled"].is_set() or run["claimed"]:
+                return None
+            run["claimed"] = True
+        SPECULATIVE_RUNS.inc(outcome="claimed")
+        return run["future"]
+
+    def _run(self, run: dict, code: str, temperature: float, source: str, reuse: dict) -> tuple:
+        run["status"] = "metrics"
+        # The source has to be set first: smells are computed once, with the rules of its language
+        report = AnalysisReport(code, "", source=source)
+        # Static metrics are cheap and always wanted; compute them before the LLM call
+        report.metrics, report.smells, report.halstead
+        if run["cancelled"].is_set():
+            return report, None
+        if not self._try_spend():
+            run["status"] = "over_budget"
+            SPECULATIVE_RUNS.inc(outcome="over_budget")
+            return report, None
+        run["status"] = "analyzing"
+        try:
+            from similarity import analyze_with_reuse
+            report.result, match = analyze_with_reuse(
+                reuse["owner"], code, temperature, reuse["policy"], source, flow="speculative",
+            )
+        except Exception:
+            run["status"] = "failed"
+            raise
+        run["status"] = "ready"
+        return report, match
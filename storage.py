@@ -0,0 +1,41 @@
+import functools
+import os
+import threading
+
+# Directory for everything the app persists between runs (job results, caches, trend data)
+DATA_DIR = os.getenv("CODE_JUDGE_DATA_DIR", ".code_judge")
+
+
+def data_path(filename: str) -> str:
+    """
+    Return the path of filename inside the app data directory, creating the directory if needed.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
+
+
+_shared = {}  # factory -> its process-wide instance
+_shared_lock = threading.RLock()
+
+
+def shared(factory):
+    """
+    Decorator turning a no-argument factory into the getter of one process-wide instance,
+    built on first use. The check and the build happen under one lock, so concurrent first
+    calls from sessions and job workers still build a single instance.
+    """
+    @functools.wraps(factory)
+    def get():
+        with _shared_lock:
+            if factory not in _shared:
+                _shared[factory] = factory()
+            return _shared[factory]
+    return get
+
+
+def reset_shared():
+    """
+    Forget every shared instance (e.g. after DATA_DIR changes); the next calls build new ones.
+    """
+    with _shared_lock:
+        _shared.clear()
@@ -0,0 +1,310 @@
+import codecs
+import hashlib
+import heapq
+import os
+import re
+
+from archive_ingest import PREFIX_BYTES, READ_CHUNK_BYTES, detect_encoding
+from utils import (
+    COMMENT_PREFIXES, COMPLEXITY_KEYWORDS, FUNCTION_PATTERNS, OPERATOR_PATTERN, SYLLABLE_PATTERN,
+    VARIABLE_KEYWORDS, WORD_PATTERN,
+    avg_function_length_from_counts, code_characters_from_counts, comment_density_from_counts,
+    cyclomatic_complexity_from_counts, duplication_from_counts, flesch_kincaid_from_counts,
+    function_count_from_counts, halstead_from_counts, lines_of_code_from_counts,
+    maintainability_from_counts, nesting_depth_from_counts, variable_count_from_counts
+)
+
+MAX_LINE_CHARS = 1 << 20         # longer lines are measured in pieces
+MAX_PENDING_CHARS = 4 << 20      # text carried over for function definitions that may continue
+EXACT_DISTINCT_LIMIT = 100_000   # distinct lines/words kept exactly before switching to a sketch
+SKETCH_SIZE = 4096               # k of the k-minimum-values sketch (about 1.6% error)
+FUNCTION_REGEXES = [re.compile(pattern, re.IGNORECASE) for pattern in FUNCTION_PATTERNS]
+BRACKET_PATTERN = re.compile(r'[{}\[\]()]')
+HASH_RANGE = float(1 << 64)
+
+
+class DistinctCounter:
+    """
+    Number of distinct hashable items: exact up to limit items, then estimated with a
+    k-minimum-values sketch so memory stays bounded however many distinct items arrive.
+    """
+
+    def __init__(self, limit: int = EXACT_DISTINCT_LIMIT, k: int = SKETCH_SIZE):
+        self.limit = limit
+        self.k = k
+        self.items = set()
+        self.heap = None  # negated smallest hash values, as a max-heap
+        self.kept = set()
+
+    @property
+    def approximate(self) -> bool:
+        return self.heap is not None
+
+    def add(self, item):
+        if self.heap is None:
+            self.items.add(item)
+            if len(self.items) > self.limit:
+                self.heap = []
+                for kept in self.items:
+                    self._offer(kept)
+                self.items = None
+        else:
+            self._offer(item)
+
+    def _offer(self, item):
+        value = (hash(item) & 0xFFFFFFFFFFFFFFFF) + 1
+        if value in self.kept:
+            return
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, -value)
+            self.kept.add(value)
+        elif value < -self.heap[0]:
+            self.kept.discard(-heapq.heapreplace(self.heap, -value))
+            self.kept.add(value)
+
+    def count(self) -> int:
+        if self.heap is None:
+            return len(self.items)
+        if len(self.heap) < self.k:
+            return len(self.heap)
+        return round((self.k - 1) * HASH_RANGE / -self.heap[0])
+
+
+def _is_word_or_space(char: str) -> bool:
+    # Same classes as \w and \s in re
+    return char.isalnum() or char == '_' or char.isspace()
+
+
+class StreamingMetrics:
+    """
+    The static metrics of AnalysisReport.metrics (plus Halstead) for text fed in pieces of
+    any size, with memory bounded regardless of the total length.
+
+    Text is measured in blocks cut at line ends, or at whitespace inside very long lines, so
+    counts of words, keywords and tokens never straddle a cut; lines longer than
+    MAX_LINE_CHARS keep only their comment prefix and a running hash. Function definitions
+    are counted up to the last character no definition can span. Distinct lines, words and
+    tokens are counted exactly up to EXACT_DISTINCT_LIMIT each and estimated by a sketch after
+    that; those metrics, and any affected by a forced cut inside a whitespace-free run, are
+    reported as approximate. Everything else equals the utils.py functions on the whole text.
+    """
+
+    def __init__(self):
+        self.rest = ""
+        self.counts = dict.fromkeys(
+            ("chars", "words", "punctuation", "syllables", "keywords", "tokens", "operators", "loc", "comments", "functions"), 0
+        )
+        self.operators = set()
+        self.tokens = DistinctCounter()
+        self.variables = DistinctCounter()
+        self.lines = DistinctCounter()
+        self.depth = self.deepest = 0
+        self.pending = ""
+        self.long_line = None  # state of a line longer than MAX_LINE_CHARS being measured in pieces
+        self.approximate = set()
+
+    def feed(self, text: str):
+        text = self.rest + text
+        end = text.rfind('\n')
+        if end >= 0:
+            self._measure(text[:end + 1], line_continues=False)
+            text = text[end + 1:]
+        if len(text) > MAX_LINE_CHARS:
+            cut = next((i for i in range(len(text) - 1, -1, -1) if text[i].isspace()), -1)
+            if cut < 0:
+                cut = len(text) - 1
+                self.approximate.update(("fkgl", "cc", "mi", "vc", "halstead"))
+            self._measure(text[:cut + 1], line_continues=True)
+            text = text[cut + 1:]
+        self.rest = text
+
+    def _measure(self, block: str, line_continues: bool):
+        counts = self.counts
+        counts["chars"] += len(block)
+        words = block.split()
+        counts["words"] += len(words)
+        counts["syllables"] += sum(len(SYLLABLE_PATTERN.findall(word.lower())) for word in words)
+        counts["punctuation"] += block.count('.') + block.count('!') + block.count('?')
+        lowered = block.lower()
+        counts["keywords"] += sum(lowered.count(keyword) for keyword in COMPLEXITY_KEYWORDS)
+        tokens = WORD_PATTERN.findall(lowered)
+        counts["tokens"] += len(tokens)
+        for token in tokens:
+            self.tokens.add(token)
+        for word in WORD_PATTERN.findall(block):
+            if word not in VARIABLE_KEYWORDS and not word.isdigit():
+                self.variables.add(word)
+        operators = OPERATOR_PATTERN.findall(block)
+        counts["operators"] += len(operators)
+        self.operators.update(operators)
+        for match in BRACKET_PATTERN.finditer(block):
+            if match.group() in '{[(':
+                self.depth += 1
+                self.deepest = max(self.deepest, self.depth)
+            else:
+                self.depth = max(0, self.depth - 1)
+        self._count_functions(block)
+        self._measure_lines(block, line_continues)
+
+    def _count_functions(self, block: str):
+        # Definitions consist of word characters, whitespace and a final "(", so none spans
+        # a position right after any other character
+        end = len(block) - 1
+        while end >= 0 and _is_word_or_space(block[end]):
+            end -= 1
+        if end < 0:
+            self.pending += block
+            if len(self.pending) > MAX_PENDING_CHARS:
+                self.approximate.update(("fc", "afl"))
+                self._flush_functions(self.pending)
+                self.pending = ""
+            return
+        self._flush_functions(self.pending + block[:end + 1])
+        self.pending = block[end + 1:]
+
+    def _flush_functions(self, text: str):
+        self.counts["functions"] += sum(len(regex.findall(text)) for regex in FUNCTION_REGEXES)
+
+    def _measure_lines(self, block: str, line_continues: bool):
+        lines = block.split('\n')
+        # After the last newline: nothing, the start of a line too long to hold that continues
+        # in the next block, or (at the end of the input) the last line
+        partial = lines.pop()
+        for line in lines:
+            self._end_line(line)
+        if line_continues:
+            self._measure_long_line_piece(partial)
+        elif partial or self.long_line is not None:
+            self._end_line(partial)
+
+    def _end_line(self, line: str):
+        if self.long_line is None and len(line) <= MAX_LINE_CHARS:
+            self._count_line(line.strip())
+        elif self.long_line is None:
+            # A long line that happened to arrive whole is keyed like one measured in pieces
+            stripped = line.strip()
+            self._count_line(stripped, key=hashlib.blake2b(stripped.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        else:
+            self._measure_long_line_piece(line)
+            self._finish_long_line()
+
+    def _count_line(self, stripped: str, key=None):
+        if stripped:
+            self.counts["loc"] += 1
+            if stripped.startswith(COMMENT_PREFIXES):
+                self.counts["comments"] += 1
+            self.lines.add(hash(stripped) if key is None else key)
+
+    def _measure_long_line_piece(self, piece: str):
+        state = self.long_line
+        if state is None:
+            state = self.long_line = {"head": "", "trailing": "", "digest": hashlib.blake2b(digest_size=16)}
+        if not state["head"]:
+            piece = piece.lstrip()
+        content = piece.rstrip()
+        if content:
+            if len(state["head"]) < 2:
+                state["head"] += content[:2 - len(state["head"])]
+            state["digest"].update((state["trailing"] + content).encode("utf-8", "surrogatepass"))
+            state["trailing"] = piece[len(content):]
+        else:
+            state["trailing"] += piece
+
+    def _finish_long_line(self):
+        # Lines over MAX_LINE_CHARS are keyed by a digest of their stripped text, never by the text
+        state, self.long_line = self.long_line, None
+        self._count_line(state["head"], key=state["digest"].digest())
+
+    def finish(self) -> dict:
+        """
+        Measure what is left and return metrics (the same keys as AnalysisReport.metrics),
+        halstead and approximate (the keys of estimated values, also marked inside each dict).
+        """
+        if self.rest or self.long_line is not None:
+            self._measure(self.rest, line_continues=False)
+            self.rest = ""
+        if self.long_line is not None:
+            self._finish_long_line()
+        self._flush_functions(self.pending)
+        self.pending = ""
+
+        counts = self.counts
+        loc = counts["loc"]
+        cc = cyclomatic_complexity_from_counts(counts["keywords"])
+        if self.lines.approximate:
+            self.approximate.add("dup")
+        if self.variables.approximate:
+            self.approximate.add("vc")
+        if self.tokens.approximate:
+            self.approximate.add("halstead")
+        if "cc" in self.approximate:
+            self.approximate.add("mi")
+        metrics = {
+            "loc": lines_of_code_from_counts(loc),
+            "cc": cc,
+            "mi": maintainability_from_counts(counts["chars"], loc, counts["comments"], cc["value"]),
+            "fkgl": flesch_kincaid_from_counts(counts["words"], counts["punctuation"] + 1, counts["syllables"]),
+            "nd": nesting_depth_from_counts(self.deepest),
+            "fc": function_count_from_counts(counts["functions"]),
+            "vc": variable_count_from_counts(self.variables.count()),
+            "dup": duplication_from_counts(loc, min(loc, self.lines.count())),
+            "chars": code_characters_from_counts(counts["chars"]),
+            "cd": comment_density_from_counts(loc, counts["comments"]),
+            "afl": avg_function_length_from_counts(loc, counts["functions"]),
+        }
+        halstead = halstead_from_counts(len(self.operators), self.tokens.count(), counts["operators"], counts["tokens"])
+        for key in self.approximate:
+            if key in metrics:
+                metrics[key]["approximate"] = True
+        if "halstead" in self.approximate:
+            halstead["approximate"] = True
+        return {"metrics": metrics, "halstead": halstead, "approximate": sorted(self.approximate)}
+
+
+def _text_chunks(source, max_bytes: int = None):
+    """
+    Yield the text of a path or a text/binary file object in pieces. Binary input is decoded
+    like archive_ingest.decode_bytes (encoding detected on the first PREFIX_BYTES).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield from _text_chunks(f, max_bytes)
+        return
+    first = source.read(PREFIX_BYTES)
+    if isinstance(first, str):
+        while first:
+            yield first
+            first = source.read(READ_CHUNK_BYTES)
+        return
+    decoder = codecs.getincrementaldecoder(detect_encoding(first))(errors="replace")
+    read, chunk = 0, first
+    while chunk:
+        if max_bytes is not None and read + len(chunk) > max_bytes:
+            yield decoder.decode(chunk[:max_bytes - read], final=True)
+            raise _Truncated()
+        read += len(chunk)
+        yield decoder.decode(chunk)
+        chunk = source.read(READ_CHUNK_BYTES)
+    yield decoder.decode(b"", final=True)
+
+
+class _Truncated(Exception):
+    pass
+
+
+def stream_metrics(source, max_bytes: int = None) -> dict:
+    """
+    Static metrics of a file too large to hold in memory, read from a path or a text or
+    binary file object in chunks (see StreamingMetrics.finish for the result).
+    With max_bytes, binary input is only read that far and the result has truncated=True.
+    """
+    metrics = StreamingMetrics()
+    truncated = False
+    try:
+        for text in _text_chunks(source, max_bytes):
+            metrics.feed(text)
+    except _Truncated:
+        truncated = True
+    result = metrics.finish()
+    result["truncated"] = truncated
+    return result
@@ -0,0 +1,331 @@
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from deadlines import is_timeout
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+FAST_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)
+NETWORK_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{_format_labels(key)} {_format_value(value)}" for name, key, value in self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, e.g. requests or errors.
+    """
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down, e.g. queue depth. A gauge can also be computed at
+    scrape time from a function registered with set_function.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        super().__init__(name, help_text, labelnames)
+        self._functions = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels) -> float:
+        key = self._key(labels)
+        with self._lock:
+            fn = self._functions.get(key)
+            if fn is None:
+                return self._values.get(key, 0)
+        return fn()
+
+    def _samples(self) -> list:
+        samples = super()._samples()
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                samples.append((self.name, key, fn()))
+            except Exception:
+                logger.exception("Gauge %s callback failed", self.name)
+        return samples
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observations (latencies, sizes) in cumulative buckets, with sum and count.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the with-block in seconds, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> list:
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                for bound, count in zip(self.buckets, state["counts"]):
+                    samples.append((f"{self.name}_bucket", key + (("le", _format_value(float(bound))),), count))
+                samples.append((f"{self.name}_sum", key, state["sum"]))
+                samples.append((f"{self.name}_count", key, state["count"]))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics, rendered in the Prometheus text exposition format.
+    Registering a name twice returns the existing metric, so modules can declare their
+    metrics at import time without coordinating.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, help_text: str, labelnames: tuple, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+PAGE_VIEWS = REGISTRY.counter("code_judge_page_views_total", "Streamlit script runs by page.", ("page",))
+LLM_REQUESTS = REGISTRY.counter("code_judge_llm_requests_total", "LLM calls by flow, model and outcome.", ("flow", "model", "outcome"))
+LLM_ERRORS = REGISTRY.counter("code_judge_llm_errors_total", "Failed LLM calls by flow and exception type (timeouts excluded).", ("flow", "error"))
+LLM_TIMEOUTS = REGISTRY.counter("code_judge_llm_timeouts_total", "LLM calls that hit the per-call timeout, by flow.", ("flow",))
+LLM_LATENCY = REGISTRY.histogram("code_judge_llm_latency_seconds", "LLM call latency by flow and model.", ("flow", "model"))
+LLM_TOKENS = REGISTRY.counter("code_judge_llm_tokens_total", "Tokens reported by the LLM API by flow, model and kind (prompt/completion).", ("flow", "model", "kind"))
+STATIC_METRICS_SECONDS = REGISTRY.histogram(
+    "code_judge_static_metrics_seconds", "Duration of one utils.py static metric pass over a file.", ("scope",), buckets=FAST_BUCKETS,
+)
+GITHUB_FETCH_SECONDS = REGISTRY.histogram(
+    "code_judge_github_fetch_seconds", "GitHub API fetch latency by operation.", ("operation",), buckets=NETWORK_BUCKETS,
+)
+GITHUB_FETCH_ERRORS = REGISTRY.counter("code_judge_github_fetch_errors_total", "Failed GitHub API fetches by operation and exception type.", ("operation", "error"))
+EXPORTS = REGISTRY.counter("code_judge_exports_total", "Report exports by format and outcome.", ("format", "outcome"))
+EXPORT_SECONDS = REGISTRY.histogram("code_judge_export_seconds", "Report export duration by format.", ("format",), buckets=FAST_BUCKETS)
+CACHE_REQUESTS = REGISTRY.counter("code_judge_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+JOBS_IN_QUEUE = REGISTRY.gauge("code_judge_jobs", "Background jobs of this process by status (queued/running).", ("status",))
+JOBS_FINISHED = REGISTRY.counter("code_judge_jobs_finished_total", "Finished background jobs by kind and status.", ("kind", "status"))
+JOB_SECONDS = REGISTRY.histogram("code_judge_job_seconds", "Background job run time by kind.", ("kind",))
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+@contextmanager
+def llm_call(flow: str, model: str = ""):
+    """
+    Count and time one LLM call. The block may store the API response in call["response"];
+    its response_metadata supplies the model name and token usage when present.
+    Exceptions are recorded, timeouts separately from API errors, and re-raised.
+    """
+    call = {"response": None}
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        if is_timeout(e):
+            LLM_REQUESTS.inc(flow=flow, model=model or "unknown", outcome="timeout")
+            LLM_TIMEOUTS.inc(flow=flow)
+        else:
+            LLM_REQUESTS.inc(flow=flow, model=model or "unknown", outcome="error")
+            LLM_ERRORS.inc(flow=flow, error=type(e).__name__)
+        LLM_LATENCY.observe(time.perf_counter() - start, flow=flow, model=model or "unknown")
+        raise
+    metadata = getattr(call["response"], "response_metadata", None) or {}
+    model = metadata.get("model_name") or model or "unknown"
+    LLM_REQUESTS.inc(flow=flow, model=model, outcome="ok")
+    LLM_LATENCY.observe(time.perf_counter() - start, flow=flow, model=model)
+    usage = metadata.get("token_usage") or {}
+    for kind in ("prompt", "completion"):
+        if usage.get(f"{kind}_tokens"):
+            LLM_TOKENS.inc(usage[f"{kind}_tokens"], flow=flow, model=model, kind=kind)
+
+
+def tracked_export(fmt: str):
+    """
+    Decorator counting and timing an export function by format and outcome.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                with EXPORT_SECONDS.time(format=fmt):
+                    result = fn(*args, **kwargs)
+            except Exception:
+                EXPORTS.inc(format=fmt, outcome="error")
+                raise
+            EXPORTS.inc(format=fmt, outcome="ok")
+            return result
+        return wrapper
+    return decorator
+
+
+def invoke_chain(chain, inputs: dict, flow: str, model: str = ""):
+    """
+    chain.invoke(inputs) recorded under flow (see llm_call); returns the response.
+    """
+    with llm_call(flow, model) as call:
+        call["response"] = chain.invoke(inputs)
+    return call["response"]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None, host: str = None):
+    """
+    Serve REGISTRY at http://host:port/metrics from a daemon thread, once per process.
+    Defaults come from CODE_JUDGE_METRICS_HOST (127.0.0.1) and CODE_JUDGE_METRICS_PORT (9464);
+    a port of 0 disables the endpoint. Returns the bound (host, port), or None when disabled
+    or the port is taken (e.g. by another app process).
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server.server_address[:2]
+        port = int(os.getenv("CODE_JUDGE_METRICS_PORT", "9464")) if port is None else port
+        host = host or os.getenv("CODE_JUDGE_METRICS_HOST", "127.0.0.1")
+        if not port:
+            return None
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="code-judge-metrics", daemon=True).start()
+        logger.info("Serving Prometheus metrics on http://%s:%s/metrics", host, port)
+        return _server.server_address[:2]
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """
+    Keep every store a test opens (jobs, caches, trends) in its own temporary directory.
+    """
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path / "data"))
+    storage.reset_shared()
+    yield tmp_path / "data"
+    storage.reset_shared()
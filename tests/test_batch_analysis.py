@@ -0,0 +1,89 @@
+import pytest
+
+# batch_analysis builds its chains from main, which needs the LLM client libraries
+pytest.importorskip("langchain_groq")
+import batch_analysis  # noqa: E402
+from deadlines import Deadline  # noqa: E402
+
+
+class Answer:
+    def __init__(self, content):
+        self.content = content
+
+
+class Calls(list):
+    deadline = None
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    Answers every request without a network call and records its flow. A file containing
+    "broken" raises a KeyError, as a malformed response would; "cancel_here" cancels the
+    deadline passed to the test, if any, while it is being analyzed.
+    """
+    calls = Calls()
+
+    def invoke(chain, inputs, flow="", model=None):
+        calls.append(flow)
+        code = inputs.get("code") or inputs.get("files", "")
+        if "broken" in code:
+            raise KeyError("choices")
+        if "cancel_here" in code and calls.deadline:
+            calls.deadline.cancel()
+        return Answer(f"### Overview\nanalysis {len(calls)}")
+
+    monkeypatch.setattr(batch_analysis, "invoke_chain", invoke)
+    for name in ("create_multi_file_analysis_chain", "create_routed_chain", "create_packed_analysis_chain",
+                 "create_chunk_analysis_chain", "create_analysis_chain"):
+        monkeypatch.setattr(batch_analysis, name, lambda *args, **kwargs: None)
+    monkeypatch.setattr(batch_analysis, "build_project_summary", lambda *args, **kwargs: None)
+    monkeypatch.setattr(batch_analysis, "record_rows", lambda *args, **kwargs: None)
+    return calls
+
+
+NO_PACKING = {"enabled": False}
+FILES = [("a.py", "def a():\n    return 1\n"), ("broken.py", "broken = True\n"), ("c.py", "def c():\n    return 3\n")]
+
+
+def test_one_failing_file_keeps_the_others(fake_llm):
+    job = batch_analysis.run_multi_file_job(list(FILES), project="demo", packing_policy=NO_PACKING)
+    by_file = {entry["file"]: entry for entry in job["results"]}
+    assert by_file["a.py"]["result"] and by_file["c.py"]["result"]
+    assert by_file["broken.py"]["error"].startswith("Analysis failed for broken.py")
+    assert not by_file["broken.py"]["result"]
+
+
+def test_cancel_marks_the_rest_not_analyzed(fake_llm):
+    deadline = Deadline()
+    fake_llm.deadline = deadline
+    files = [("a.py", "x = 1  # cancel_here\n"), ("b.py", "y = 2\n"), ("c.py", "z = 3\n")]
+    job = batch_analysis.run_multi_file_job(files, project="demo", packing_policy=NO_PACKING, deadline=deadline)
+    assert len(fake_llm) == 1
+    assert job["results"][0]["result"]
+    assert [entry.get("not_analyzed") for entry in job["results"][1:]] == [True, True]
+    assert job["packing"]["not_analyzed"] == 2
+    assert job["stopped"] == "Stopped early: cancelled by the user."
+
+
+def test_expired_deadline_skips_every_request(fake_llm):
+    deadline = Deadline(seconds=1e-9)
+    job = batch_analysis.run_multi_file_job(list(FILES), project="demo", packing_policy=NO_PACKING, deadline=deadline)
+    assert fake_llm == []
+    assert job["stopped"] == "Stopped early: batch deadline reached."
+
+
+def test_results_carry_no_code(fake_llm):
+    job = batch_analysis.run_multi_file_job(list(FILES), project="demo")
+    assert all("code" not in entry and "code_ref" not in entry for entry in job["results"])
+
+
+def test_trends_are_recorded_under_the_project_and_owner(fake_llm, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(batch_analysis, "record_rows", lambda *args, **kwargs: recorded.append(args))
+    batch_analysis.run_multi_file_job(list(FILES), project="shop", packing_policy=NO_PACKING, trend_owner="alice")
+    (owner, repo, rows), = recorded
+    assert (owner, repo) == ("alice", "shop")
+    assert sorted(row["path"] for row in rows) == ["a.py", "c.py"]
+    with pytest.raises(ValueError):
+        batch_analysis.run_multi_file_job(list(FILES), packing_policy=NO_PACKING)
@@ -0,0 +1,79 @@
+import pytest
+
+# code_comparison builds its chains from main, which needs the LLM client libraries
+pytest.importorskip("langchain_groq")
+from groq import APIStatusError  # noqa: E402
+
+import code_comparison  # noqa: E402
+from code_comparison import changed_lines, compare_codes, compare_many  # noqa: E402
+
+BASE = "\n".join(f"line_{i} = {i}" for i in range(20)) + "\n"
+
+
+class RateLimited(APIStatusError):
+    def __init__(self):
+        Exception.__init__(self, "429 rate limited")
+
+
+class Answer:
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    Answers every analysis without a network call; snippets containing "rate_limited" fail with a 429.
+    """
+    def invoke(chain, inputs, flow=""):
+        if "rate_limited" in inputs["code"]:
+            raise RateLimited()
+        return Answer(f"analysis of {len(inputs['code'])} chars")
+
+    monkeypatch.setattr(code_comparison, "invoke_chain", invoke)
+    monkeypatch.setattr(code_comparison, "create_analysis_chain", lambda: None)
+
+
+def test_one_changed_line():
+    assert changed_lines(BASE, BASE.replace("line_3 = 3", "line_3 = 30")) == 1
+
+
+def test_changes_in_several_hunks():
+    edited = BASE.replace("line_1 = 1", "line_1 = 10").replace("line_18 = 18\n", "")
+    edited = edited.replace("line_10 = 10\n", "line_10 = 10\nextra = 1\nmore = 2\n")
+    assert changed_lines(BASE, edited) == 4
+    assert changed_lines(BASE, BASE) == 0
+    assert changed_lines("", BASE) == 20
+
+
+def test_diff_has_one_line_per_header(fake_llm):
+    result = compare_many([BASE, BASE.replace("line_3 = 3", "line_3 = 30")])
+    diff = result["diffs"][1].splitlines()
+    assert diff[:2] == ["--- Code 1", "+++ Code 2"]
+    assert diff[2].startswith("@@")
+    assert sum(1 for line in diff[3:] if line[:1] in "+-") == 2
+    assert result["changed_lines"] == [0, 1]
+    assert result["diffs"][0] == ""
+
+
+def test_ranking_puts_simpler_code_first(fake_llm):
+    nested = "def f(x):\n" + "".join("    " * (depth + 1) + f"if x > {depth}:\n" for depth in range(6)) + "    " * 7 + "return x\n"
+    result = compare_many([nested, "def f(x):\n    return x\n"], labels=["nested", "flat"])
+    assert result["ranking"] == [1, 0]
+    assert result["scores"][1] < result["scores"][0]
+    assert result["deltas"]["score"][0][1] == pytest.approx(result["scores"][1] - result["scores"][0])
+
+
+def test_api_error_fails_only_its_snippet(fake_llm):
+    result = compare_many(["a = 1\n", "rate_limited = 2\n", "b = 3\n"])
+    assert result["analyses"][0] and result["analyses"][2]
+    assert result["analyses"][1] is None
+    assert result["errors"] == {"Code 2": "429 rate limited"}
+    assert result["timed_out"] == []
+    assert len(result["metrics"]) == 3
+
+
+def test_known_analyses_are_not_requested_again(fake_llm):
+    result = compare_codes("a = 1\n", "rate_limited = 2\n", analysis2="stored analysis")
+    assert result["analysis2"] == "stored analysis"
+    assert result["errors"] == {}
@@ -0,0 +1,107 @@
+import contextvars
+import time
+
+import deadlines
+from deadlines import Deadline, OwnerPresence, current_deadlines, is_timeout, use_deadlines
+
+
+def test_cancel_keeps_the_first_reason():
+    deadline = Deadline()
+    assert deadline.stop_reason() == "" and deadline.message() == ""
+    deadline.cancel()
+    deadline.cancel("deadline")
+    assert deadline.stop_reason() == "cancelled"
+    assert deadline.message() == "Stopped early: cancelled by the user."
+
+
+def test_wall_clock_budget():
+    deadline = Deadline(seconds=0.01)
+    assert deadline.stop_reason() == ""
+    time.sleep(0.02)
+    assert deadline.stop_reason() == "deadline"
+    assert deadline.remaining() == 0.0
+
+
+def test_is_alive_check():
+    alive = [True]
+    deadline = Deadline(is_alive=lambda: alive[0])
+    assert deadline.stop_reason() == ""
+    alive[0] = False
+    assert deadline.stop_reason() == "session_ended"
+
+
+def test_failing_is_alive_check_keeps_running():
+    def broken():
+        raise RuntimeError("runtime gone")
+    assert Deadline(is_alive=broken).stop_reason() == ""
+
+
+def test_is_timeout_by_class_name():
+    class APITimeoutError(Exception):
+        pass
+    assert is_timeout(APITimeoutError()) and is_timeout(TimeoutError())
+    assert not is_timeout(ValueError())
+
+
+def test_use_deadlines_applies_overrides():
+    def limits(overrides):
+        use_deadlines(overrides)
+        return current_deadlines()
+
+    # Each in a copied context, as the app's jobs run, so nothing leaks into other tests
+    assert contextvars.copy_context().run(limits, {"call_timeout": 5}) == {**deadlines.DEFAULT_DEADLINES, "call_timeout": 5}
+    assert contextvars.copy_context().run(limits, None) == deadlines.DEFAULT_DEADLINES
+
+
+def test_owner_survives_a_refresh_within_the_grace_period():
+    presence = OwnerPresence(grace=60)
+    presence.touch("owner", "tab-1", lambda: False)  # the refreshed tab's old session is gone
+    assert presence.is_alive("owner")
+    assert not presence.is_alive("someone-else")
+
+
+def test_owner_is_present_while_a_session_is_connected():
+    presence = OwnerPresence(grace=0)
+    connected = {"tab-1": True, "tab-2": False}
+    presence.touch("owner", "tab-1", lambda: connected["tab-1"])
+    presence.touch("owner", "tab-2", lambda: connected["tab-2"])
+    assert presence.is_alive("owner")
+    connected["tab-1"] = False
+    assert not presence.is_alive("owner")
+    assert Deadline(is_alive=presence.check("owner")).stop_reason() == "session_ended"
+
+
+def wait_for(manager, job_id, owner):
+    for _ in range(500):
+        job = manager.get(job_id, owner)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_job_outlives_a_refresh_but_not_its_owner():
+    from jobs import JobManager
+
+    manager = JobManager(max_workers=1)
+    manager.presence.grace = 0.5
+    # The submitting tab is refreshed right away: its session is gone, the owner is not
+    manager.presence.touch("owner", "old-tab", lambda: False)
+
+    def job(progress, deadline, steps):
+        done = 0
+        for _ in range(steps):
+            if deadline.stop_reason():
+                break
+            time.sleep(0.01)
+            done += 1
+        return {"done": done}
+
+    finished = wait_for(manager, manager.submit("test", "short job", job, owner="owner", steps=2), "owner")
+    assert finished["status"] == "done" and finished["result"] == {"done": 2}
+
+    # Nobody comes back: once the grace period runs out, the job stops with what it finished
+    abandoned = wait_for(manager, manager.submit("test", "long job", job, owner="owner", steps=500), "owner")
+    assert abandoned["status"] == "cancelled"
+    assert abandoned["error"] == "Stopped early: the browser session ended."
+    assert 0 < abandoned["result"]["done"] < 500
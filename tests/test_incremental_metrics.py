@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from incremental_metrics import IncrementalMetrics
+from report import AnalysisReport
+
+SAMPLE = '''import os
+
+# Load settings
+def load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        data = {}
+        for line in f:
+            key, _, value = line.partition("=")
+            data[key.strip()] = value.strip()
+        return data
+
+
+class Store:
+    """Keeps values."""
+
+    def __init__(self, values=None):
+        self.values = values or {}
+
+    def get(self, key, default=None):
+        try:
+            return self.values[key]
+        except KeyError:
+            return default
+'''
+
+EDIT_LINES = [
+    "",
+    "# TODO: handle errors",
+    "    while retries > 0 and not done:",
+    "        retries -= 1",
+    "function render(items) {",
+    "    for (let i = 0; i < items.length; i++) { total += items[i]; }",
+    "}",
+    "def helper(a, b):",
+    "    return a * b + (a - b) / 2",
+    "    print(load('settings.ini'))",
+    "int main(void) { return 0; }",
+    "        elif key in self.values:",
+]
+
+
+def random_edit(rng: random.Random, lines: list) -> list:
+    lines = list(lines)
+    action = rng.choice(["insert", "delete", "replace", "duplicate"])
+    position = rng.randint(0, len(lines))
+    if action == "insert" or not lines:
+        lines[position:position] = rng.sample(EDIT_LINES, rng.randint(1, 3))
+    elif action == "delete":
+        del lines[min(position, len(lines) - 1):position + rng.randint(1, 3)]
+    elif action == "replace":
+        lines[min(position, len(lines) - 1)] = rng.choice(EDIT_LINES)
+    else:
+        start = min(position, len(lines) - 1)
+        lines[start:start] = lines[start:start + rng.randint(1, 4)]
+    return lines
+
+
+def assert_matches_report(tracker: IncrementalMetrics, code: str):
+    report = AnalysisReport(code, "")
+    assert tracker.metrics() == report.metrics
+    assert tracker.halstead() == report.halstead
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_edits_match_full_measurement(seed):
+    rng = random.Random(seed)
+    lines = SAMPLE.split("\n")
+    tracker = IncrementalMetrics(SAMPLE)
+    assert_matches_report(tracker, SAMPLE)
+    for _ in range(40):
+        lines = random_edit(rng, lines)
+        code = "\n".join(lines)
+        tracker.update(code)
+        assert_matches_report(tracker, code)
+
+
+def test_function_definition_split_across_lines():
+    tracker = IncrementalMetrics("def compute(\n    a, b):\n    return a\n")
+    for code in ["def compute\n(a, b):\n    return a\n", "def compute(a, b):\n    return a\n", "compute = 1\n"]:
+        tracker.update(code)
+        assert_matches_report(tracker, code)
+
+
+@pytest.mark.parametrize("code", ["", "\n", "x = 1", "   \n\t\n", "# only a comment\n"])
+def test_degenerate_inputs(code):
+    tracker = IncrementalMetrics()
+    tracker.update(SAMPLE)
+    tracker.update(code)
+    assert_matches_report(tracker, code)
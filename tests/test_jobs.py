@@ -0,0 +1,90 @@
+import sqlite3
+import threading
+
+from jobs import JobManager, JobStore
+from test_deadlines import wait_for
+
+
+def test_finished_jobs_survive_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    job_id = store.create("multi_file", "Upload", "alice")
+    store.update(job_id, status="done", done=3, total=3, result={"results": [{"file": "a.py"}]})
+    job = JobStore(path).get(job_id, "alice")
+    assert (job["status"], job["done"], job["total"]) == ("done", 3, 3)
+    assert job["result"] == {"results": [{"file": "a.py"}]}
+
+
+def test_jobs_are_only_visible_to_their_owner(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    first = store.create("github", "Repo a", "alice")
+    second = store.create("github", "Repo b", "alice")
+    other = store.create("github", "Repo c", "bob")
+    assert [job["id"] for job in store.list("alice")] == [second, first]
+    assert "result" not in store.list("alice")[0]
+    assert store.get(other, "alice") is None
+    assert store.get(other, "bob")["title"] == "Repo c"
+    assert store.list("carol") == []
+
+
+def test_a_restart_fails_unfinished_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    running = store.create("github", "Repo", "alice")
+    store.update(running, status="running")
+    finished = store.create("github", "Repo", "alice")
+    store.update(finished, status="done", result={})
+    JobManager(JobStore(path), max_workers=1)
+    assert store.get(running, "alice")["status"] == "failed"
+    assert store.get(running, "alice")["error"] == "Interrupted by app restart"
+    assert store.get(finished, "alice")["status"] == "done"
+
+
+def test_jobs_stored_before_owners_are_not_listed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("""
+            CREATE TABLE jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, title TEXT NOT NULL, status TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0, total INTEGER NOT NULL DEFAULT 0, message TEXT NOT NULL DEFAULT '',
+                error TEXT, result TEXT, created REAL NOT NULL, updated REAL NOT NULL
+            )
+        """)
+        conn.execute("INSERT INTO jobs (id, kind, title, status, created, updated) VALUES ('old', 'github', 'Repo', 'done', 1, 1)")
+    store = JobStore(path)
+    assert store.list("alice") == []
+    assert store.get("old", "alice") is None
+    assert store.get(store.create("github", "Repo", "alice"), "alice")["owner"] == "alice"
+
+
+def test_only_the_owner_can_cancel(tmp_path):
+    manager = JobManager(JobStore(str(tmp_path / "jobs.db")), max_workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def job(progress, deadline):
+        started.set()
+        release.wait(5)
+        return {"stopped": deadline.stop_reason()}
+
+    job_id = manager.submit("multi_file", "Upload", job, "alice")
+    started.wait(5)
+    assert not manager.cancel(job_id, "bob")
+    assert manager.cancel(job_id, "alice")
+    release.set()
+    job = wait_for(manager, job_id, "alice")
+    assert job["status"] == "cancelled"
+    assert job["result"] == {"stopped": "cancelled"}
+    # Finished jobs are no longer active, so there is nothing left to cancel
+    assert not manager.cancel(job_id, "alice")
+
+
+def test_progress_and_failures_are_stored(tmp_path):
+    manager = JobManager(JobStore(str(tmp_path / "jobs.db")), max_workers=1)
+
+    def job(progress, deadline, files):
+        progress(1, len(files), "Measuring a.py")
+        raise RuntimeError("disk full")
+
+    job_id = manager.submit("multi_file", "Upload", job, "alice", files=["a.py", "b.py"])
+    job = wait_for(manager, job_id, "alice")
+    assert (job["status"], job["error"], job["done"], job["total"], job["message"]) == ("failed", "disk full", 1, 2, "Measuring a.py")
@@ -0,0 +1,89 @@
+import os
+import subprocess
+
+import pytest
+
+from local_repo import GitObjectReader, check_repo_path, list_tree, repo_name, resolve_commit
+
+
+def git(repo, *args):
+    return subprocess.run(
+        ["git", "-C", str(repo), "-c", "user.name=t", "-c", "user.email=t@example.com", *args],
+        check=True, capture_output=True,
+    ).stdout.decode().strip()
+
+
+@pytest.fixture
+def roots(tmp_path, monkeypatch):
+    allowed = tmp_path / "allowed"
+    allowed.mkdir()
+    monkeypatch.setenv("CODE_JUDGE_LOCAL_REPO_ROOTS", str(allowed))
+    return allowed
+
+
+@pytest.fixture
+def repo(roots):
+    repo = roots / "project"
+    repo.mkdir()
+    git(repo, "init", "-q")
+    (repo / "app.py").write_text("print('v1')\n")
+    (repo / "lib").mkdir()
+    (repo / "lib" / "util.py").write_text("x = 1\n")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "first")
+    (repo / "app.py").write_text("print('v2')\n")
+    git(repo, "commit", "-q", "-am", "second")
+    return repo
+
+
+def test_paths_outside_the_roots_are_rejected(tmp_path, roots):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    git(outside, "init", "-q")
+    with pytest.raises(ValueError, match="outside the allowed directories"):
+        check_repo_path(str(outside))
+    with pytest.raises(ValueError, match="outside the allowed directories"):
+        resolve_commit(str(outside))
+    # Neither .. nor a symlink inside a root leads out of it
+    with pytest.raises(ValueError):
+        check_repo_path(str(roots / ".." / "outside"))
+    os.symlink(outside, roots / "link")
+    with pytest.raises(ValueError):
+        check_repo_path(str(roots / "link"))
+    # A sibling that only shares the root's name as a prefix is outside too
+    (tmp_path / "allowed-not").mkdir()
+    with pytest.raises(ValueError):
+        check_repo_path(str(tmp_path / "allowed-not"))
+
+
+def test_without_roots_nothing_is_allowed(repo, monkeypatch):
+    monkeypatch.delenv("CODE_JUDGE_LOCAL_REPO_ROOTS")
+    with pytest.raises(ValueError, match="disabled"):
+        resolve_commit(str(repo))
+
+
+def test_paths_inside_a_root_resolve(repo, roots):
+    assert check_repo_path(str(roots / "." / "project")) == os.path.realpath(repo)
+    assert resolve_commit(str(repo)) == git(repo, "rev-parse", "HEAD")
+    assert resolve_commit(str(repo), "HEAD~1") == git(repo, "rev-parse", "HEAD~1")
+    with pytest.raises(ValueError, match="Invalid ref"):
+        resolve_commit(str(repo), "--output=/tmp/x")
+    with pytest.raises(ValueError):
+        resolve_commit(str(repo), "no-such-branch")
+
+
+def test_list_tree_and_read_blobs(repo):
+    first = resolve_commit(str(repo), "HEAD~1")
+    files = {f["path"]: f for f in list_tree(str(repo), first)}
+    assert sorted(files) == ["app.py", "lib/util.py"]
+    assert files["app.py"]["size"] == len("print('v1')\n")
+    with GitObjectReader(str(repo)) as reader:
+        assert reader.read(files["app.py"]["blob"]) == b"print('v1')\n"
+        assert reader.read(files["lib/util.py"]["blob"]) == b"x = 1\n"
+        with pytest.raises(KeyError):
+            reader.read("0" * 40)
+
+
+def test_repo_name_drops_the_bare_suffix():
+    assert repo_name("/srv/mirrors/project.git") == "project"
+    assert repo_name("/srv/clones/project/") == "project"
@@ -0,0 +1,94 @@
+from packing import DEFAULT_PACKING_POLICY, merge_part_results, plan_requests, render_pack, split_for_analysis, split_packed_response
+from policies import with_overrides
+from retrieval import estimate_tokens
+
+
+def item(key: str, tokens: int, model: str = "fast", packable: bool = True) -> dict:
+    return {"key": key, "tokens": tokens, "model": model, "packable": packable}
+
+
+def by_key(plan: dict) -> dict:
+    return {key: request for request in plan["requests"] for key in request["keys"]}
+
+
+def test_small_files_share_requests_per_model():
+    plan = plan_requests([item("a", 100), item("b", 200), item("c", 150, model="large"), item("d", 120, model="large")],
+                         prompt_overhead=50)
+    requests = by_key(plan)
+    assert requests["a"] is requests["b"] and requests["a"]["mode"] == "packed"
+    assert requests["c"] is requests["d"] and requests["c"]["model"] == "large"
+    assert requests["a"]["tokens"] == 300 + 2 * 20
+    assert plan["stats"] == {"files": 4, "requests": 2, "packed_files": 4, "chunked_files": 0, "tokens_saved": 100}
+
+
+def test_budget_and_file_count_limits_open_new_packs():
+    policy = {"pack_token_budget": 500, "max_files_per_pack": 2}
+    plan = plan_requests([item(str(i), 200) for i in range(5)], policy)
+    assert all(request["tokens"] <= 500 and len(request["keys"]) <= 2 for request in plan["requests"])
+    assert plan["stats"]["requests"] == 3
+    # A pack left with a single file is a plain single request
+    assert sorted(request["mode"] for request in plan["requests"]) == ["packed", "packed", "single"]
+
+
+def test_large_and_unpackable_files_get_their_own_requests():
+    plan = plan_requests([item("big", 3000), item("mid", 1000), item("flagged", 100, packable=False), item("a", 100)])
+    modes = {key: request["mode"] for key, request in by_key(plan).items()}
+    assert modes == {"big": "chunked", "mid": "single", "flagged": "single", "a": "single"}
+    assert plan["stats"]["chunked_files"] == 1
+    disabled = plan_requests([item("big", 3000), item("a", 100), item("b", 100)], {"enabled": False})
+    assert {request["mode"] for request in disabled["requests"]} == {"single"}
+
+
+def test_packed_answers_are_split_back_per_file():
+    paths = ["src/app.py", "src/util.py", "lib/util.py", "README.md"]
+    packed = render_pack([(path, "x = 1") for path in paths])
+    assert packed.count("===== FILE:") == 4 and "===== END FILE: README.md =====" in packed
+    answer = (
+        "Preamble that belongs to no file\n"
+        "## FILE: src/app.py\n### Overview\napp findings\n"
+        "## **FILE: `README.md`**\nreadme findings\n"
+        "# FILE: util.py\nambiguous base name\n"
+        "## FILE: src/util.py\nutil findings\n"
+        "## FILE: src/app.py\nrepeated header is ignored\n"
+    )
+    assert split_packed_response(answer, paths) == {
+        "src/app.py": "### Overview\napp findings",
+        "README.md": "readme findings",
+        "src/util.py": "util findings",
+    }
+    # Shortened paths are matched by a unique base name
+    assert split_packed_response("## FILE: app.py\nfound", ["src/app.py"]) == {"src/app.py": "found"}
+
+
+def test_large_files_are_split_into_parts_within_budget():
+    code = "\n".join(f"def f{i}(x):\n    return x + {i}\n" for i in range(60))
+    parts = split_for_analysis(code, 200)
+    assert len(parts) > 1
+    assert all(estimate_tokens(part["text"]) <= 200 for part in parts)
+    assert parts[0]["start_line"] == 1 and parts[-1]["end_line"] == len(code.split("\n"))
+    assert all(later["start_line"] == earlier["end_line"] + 1 for earlier, later in zip(parts, parts[1:]))
+    assert "\n".join(part["text"] for part in parts) == code
+    # One oversized function is halved by lines
+    long_function = "def f(x):\n" + "".join(f"    x = x + {i}\n" for i in range(200))
+    assert len(split_for_analysis(long_function, 300)) > 1
+
+
+def test_part_results_merge_by_section():
+    merged = merge_part_results([
+        (1, 40, "intro\n### Overview\nfirst half\n### Issues\nbug in f\n"),
+        (41, 80, "### Overview\nsecond half\n### Suggestions\n\n"),
+    ])
+    assert merged == (
+        "### Overview\n**Lines 1-40:**\nfirst half\n\n**Lines 41-80:**\nsecond half\n\n"
+        "### Issues\n**Lines 1-40:**\nbug in f"
+    )
+
+
+def test_with_overrides_copies_the_defaults():
+    policy = with_overrides(DEFAULT_PACKING_POLICY, {"chunk_tokens": 10})
+    assert policy == {**DEFAULT_PACKING_POLICY, "chunk_tokens": 10}
+    assert DEFAULT_PACKING_POLICY["chunk_tokens"] != 10
+    defaults = {"paths": ["*.lock"], "limit": 3}
+    assert with_overrides(defaults, {"paths": ["*.map"]}) == {"paths": ["*.map"], "limit": 3}
+    assert with_overrides(defaults, {"paths": ["*.map"]}, extend_lists=True) == {"paths": ["*.lock", "*.map"], "limit": 3}
+    assert defaults == {"paths": ["*.lock"], "limit": 3}
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+
+import pytest
+
+# The summarizer builds its chains from main, which needs the LLM client libraries
+main = pytest.importorskip("main")
+import project_summary  # noqa: E402
+from project_summary import ProjectSummarizer  # noqa: E402
+
+
+class Answer:
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    Answers every summary call with a fresh text, as a model above temperature 0 would,
+    and records the kind of each call.
+    """
+    calls = []
+
+    def invoke(chain, inputs, flow=""):
+        calls.append(flow)
+        return Answer(f"{flow} {len(calls)}")
+
+    monkeypatch.setattr(project_summary, "invoke_chain", invoke)
+    monkeypatch.setattr(project_summary, "_summary_cache", OrderedDict())
+    monkeypatch.setattr(main, "create_summary_chain", lambda *args, **kwargs: None)
+    return calls
+
+
+def files(run: int, changed: str = None) -> list:
+    """
+    Three files whose analyses differ on every run; only the changed path has new content.
+    """
+    return [
+        {"path": path, "analysis": f"run {run} analysis of {path}", "metrics": {"loc": 10, "cc": 2},
+         "smells": [], "blob": f"{path}-v2" if path == changed else f"{path}-v1"}
+        for path in ("app/main.py", "app/util.py", "docs/conf.py")
+    ]
+
+
+def test_unchanged_files_hit_the_cache_across_runs(calls):
+    ProjectSummarizer(temperature=0.7).summarize("demo", files(1))
+    first = len(calls)
+    calls.clear()
+    result = ProjectSummarizer(temperature=0.7).summarize("demo", files(2))
+    # New analysis texts, same content: every summary up to the report is reused
+    assert calls == []
+    assert result["cache_hits"] == first
+
+
+def test_a_changed_file_misses_only_on_its_path(calls):
+    ProjectSummarizer(temperature=0.7).summarize("demo", files(1))
+    calls.clear()
+    ProjectSummarizer(temperature=0.7).summarize("demo", files(2, changed="app/util.py"))
+    assert calls.count("summary_file") == 1
+    # app/ and the root merge again; docs/ has a single file and needs no merge call
+    assert calls.count("summary_group") == 2
+
+
+def test_without_a_blob_the_analysis_keys_the_summary(calls):
+    plain = [dict(f, blob=None) for f in files(1)]
+    ProjectSummarizer().summarize("demo", plain)
+    calls.clear()
+    ProjectSummarizer().summarize("demo", [dict(f, blob=None) for f in files(2)])
+    assert calls.count("summary_file") == 3
@@ -0,0 +1,137 @@
+import re
+
+import pytest
+
+import similarity
+from similarity import SimilarityIndex, code_diff, find_reusable, signature
+
+CODE = '''def moving_average(values, window):
+    if window <= 0:
+        raise ValueError("window must be positive")
+    averages = []
+    total = 0
+    for i, value in enumerate(values):
+        total += value
+        if i >= window:
+            total -= values[i - window]
+        if i >= window - 1:
+            averages.append(total / window)
+    return averages
+'''
+
+RENAMED = CODE.replace("values", "samples").replace("total", "running").replace("averages", "result")
+
+# Same shape with every name changed: a different program as far as the names tell
+LOOKALIKE = re.sub(r"[A-Za-z_]\w*", lambda m: m.group() if m.group() in similarity.KEYWORDS else m.group() + "_x", CODE)
+
+EDITED = CODE.replace('        total += value\n', '        total += value\n        print("added", value)\n')
+
+UNRELATED = '''class Inventory:
+    def __init__(self):
+        self.items = {}
+
+    def add(self, name, count=1):
+        self.items[name] = self.items.get(name, 0) + count
+
+    def remove(self, name):
+        del self.items[name]
+'''
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = SimilarityIndex(str(tmp_path / "similarity.db"))
+    monkeypatch.setattr(similarity, "get_similarity_index", lambda: index)
+    return index
+
+
+def test_signature_is_deterministic_and_has_fixed_size():
+    assert signature(CODE) == signature(CODE)
+    assert len(signature(CODE)) == similarity.SIGNATURE_SIZE
+    assert signature("") is None
+    assert signature("   \n") is None
+
+
+def test_renaming_and_literals_do_not_change_the_signature():
+    assert similarity.similarity(signature(CODE), signature(RENAMED)) == 1.0
+    assert signature(CODE.replace("positive", "> 0").replace("0", "1")) == signature(CODE)
+
+
+def test_similarity_orders_edits_before_unrelated_code():
+    edited = similarity.similarity(signature(CODE), signature(EDITED))
+    unrelated = similarity.similarity(signature(CODE), signature(UNRELATED))
+    assert 0.6 < edited < 1.0
+    assert unrelated < 0.3
+
+
+def test_code_diff_counts_changed_lines_and_shared_names():
+    assert code_diff(CODE, CODE) == {"diff": "", "changed_lines": 0, "shared_names": 1.0}
+    assert code_diff(CODE, EDITED)["changed_lines"] == 1
+    assert code_diff(CODE, RENAMED)["shared_names"] < 0.7
+
+
+def test_lookup_finds_the_closest_snippet_of_the_owner(index):
+    index.add("alice", CODE, "analysis of code", "average.py")
+    index.add("alice", UNRELATED, "analysis of inventory", "inventory.py")
+    match = index.lookup("alice", EDITED, threshold=0.6)
+    assert match["source"] == "average.py"
+    assert match["analysis"] == "analysis of code"
+    assert match["code"] == CODE
+    assert index.lookup("alice", EDITED, threshold=1.0) is None
+
+
+def test_lookup_never_crosses_owners(index):
+    index.add("alice", CODE, "alice's analysis", "average.py")
+    assert index.lookup("bob", CODE) is None
+    assert index.count("alice") == 1
+    assert index.count("bob") == 0
+
+
+def test_adding_identical_code_replaces_its_analysis(index):
+    index.add("alice", CODE, "first", "a.py")
+    index.add("alice", CODE, "second", "b.py")
+    assert index.count("alice") == 1
+    assert index.lookup("alice", CODE)["analysis"] == "second"
+
+
+def test_find_reusable_applies_the_policy(index):
+    index.add("alice", CODE, "analysis", "average.py")
+    exact = find_reusable("alice", CODE)
+    assert exact["changed_lines"] == 0 and exact["similarity"] == 1.0
+    assert find_reusable("alice", EDITED)["changed_lines"] == 1
+    assert find_reusable("alice", RENAMED)["similarity"] == 1.0
+    # Same shape, no shared names: the shared-names guard rejects it
+    assert find_reusable("alice", LOOKALIKE) is None
+    assert find_reusable("alice", LOOKALIKE, {"min_shared_names": 0.0})["similarity"] == 1.0
+    assert find_reusable("alice", EDITED, {"max_diff_lines": 0}) is None
+    assert find_reusable("alice", CODE, {"enabled": False}) is None
+    assert find_reusable("bob", CODE) is None
+
+
+def test_analyze_with_reuse_indexes_full_analyses_and_reuses_them(index, monkeypatch):
+    main = pytest.importorskip("main")
+    import telemetry
+
+    calls = []
+
+    class Answer:
+        def __init__(self, content):
+            self.content = content
+
+    def invoke(chain, inputs, flow="", model=""):
+        calls.append(flow)
+        return Answer(f"{flow} analysis")
+
+    monkeypatch.setattr(main, "create_analysis_chain", lambda temperature: None)
+    monkeypatch.setattr(main, "create_delta_analysis_chain", lambda temperature: None)
+    monkeypatch.setattr(telemetry, "invoke_chain", invoke)
+
+    assert similarity.analyze_with_reuse("alice", CODE, 0.1, source="average.py", flow="speculative") == ("speculative analysis", None)
+    assert index.lookup("alice", CODE)["source"] == "average.py"
+    analysis, match = similarity.analyze_with_reuse("alice", CODE, 0.1)
+    assert analysis == "speculative analysis" and match["changed_lines"] == 0
+    analysis, match = similarity.analyze_with_reuse("alice", EDITED, 0.1)
+    assert analysis.startswith("speculative analysis") and analysis.endswith("delta analysis")
+    assert calls == ["speculative", "delta"]
+    # Delta reviews are not indexed
+    assert index.count("alice") == 1
@@ -0,0 +1,81 @@
+import json
+import os
+
+import smell_rules
+from smell_rules import DEFAULT_SMELL_RULES, SmellMatcher, find_smells
+
+
+def fired(rules: list, code: str, language: str = None) -> dict:
+    return {hit["id"]: hit for hit in SmellMatcher(rules, language).scan(code, {"chars": 0, "cc": 0})}
+
+
+def test_keyword_inside_an_unless_text_match():
+    # "debug" is an unless text of debug-output and used to hide the keyword at the same position
+    hits = fired(DEFAULT_SMELL_RULES + [{"id": "debugger", "keywords": ["debugger"], "message": "m"}], "debugger;\n")
+    assert hits["debugger"]["lines"] == [1]
+
+
+def test_custom_regex_overlapping_a_default_literal():
+    rules = DEFAULT_SMELL_RULES + [{"id": "secret", "regex": [r"print\(password"], "message": "m"}]
+    hits = fired(rules, "x = 1\nprint(password)\n")
+    assert hits["secret"]["lines"] == [2]
+    assert hits["debug-output"]["lines"] == [2]
+
+
+def test_custom_keyword_overlapping_an_ignore_case_literal():
+    hits = fired(DEFAULT_SMELL_RULES + [{"id": "lower-todo", "keywords": ["todo"], "message": "m"}], "# todo: later\n")
+    assert hits["lower-todo"]["count"] == 1
+    assert hits["todo"]["count"] == 1
+
+
+def test_literal_inside_a_longer_literal_of_the_same_trie():
+    hits = fired(DEFAULT_SMELL_RULES + [{"id": "log-call", "literals": [".log("], "message": "m"}], "console.log(x)\n")
+    assert "log-call" in hits and "debug-output" in hits
+
+
+def test_unless_still_suppresses():
+    assert "debug-output" not in fired(DEFAULT_SMELL_RULES, "print('debug mode')\n")
+    assert "debug-output" in fired(DEFAULT_SMELL_RULES, "print('ready')\n")
+
+
+def test_counts_lines_and_min_count():
+    rules = [{"id": "eval", "keywords": ["eval"], "min_count": 2, "message": "m"}]
+    assert fired(rules, "eval(a)\n") == {}
+    assert fired(rules, "eval(a)\nx = 1\neval(b); eval(c)\n")["eval"] == {"id": "eval", "message": "m", "count": 3, "lines": [1, 3]}
+    # Keywords need word boundaries
+    assert fired(rules, "evaluate(a)\nevaluate(b)\n") == {}
+
+
+def test_rules_are_scoped_by_language():
+    rules = [{"id": "var", "keywords": ["var"], "languages": ["javascript"], "message": "m"}]
+    assert "var" in {hit["id"] for hit in find_smells("var x = 1;\n", "app.js", extra_rules=rules)}
+    assert "var" not in {hit["id"] for hit in find_smells("var x = 1;\n", "app.py", extra_rules=rules)}
+
+
+def test_metric_rules_use_given_values():
+    hits = SmellMatcher(DEFAULT_SMELL_RULES).scan("x = 1\n", {"chars": 5000, "cc": 11})
+    assert {"long-code", "high-complexity"} <= {hit["id"] for hit in hits}
+
+
+def test_custom_rules_file_is_reloaded_when_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    path.write_text("[]")
+    monkeypatch.setenv("CODE_JUDGE_SMELL_RULES", str(path))
+    code = "result = eval(text)\n"
+    assert "eval" not in {hit["id"] for hit in find_smells(code, "a.py")}
+    path.write_text(json.dumps([{"id": "eval", "keywords": ["eval"], "message": "m"}]))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert "eval" in {hit["id"] for hit in find_smells(code, "a.py")}
+    monkeypatch.delenv("CODE_JUDGE_SMELL_RULES")
+    assert "eval" not in {hit["id"] for hit in find_smells(code, "a.py")}
+
+
+def test_rules_version_follows_the_rules_file(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    path.write_text("[]")
+    monkeypatch.setenv("CODE_JUDGE_SMELL_RULES", str(path))
+    before = smell_rules.rules_version()
+    path.write_text(json.dumps([{"id": "eval", "keywords": ["eval"], "message": "m"}]))
+    assert smell_rules.rules_version() != before
+
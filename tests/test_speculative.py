@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+# The speculative run builds its chain from main, which needs the LLM client libraries
+main = pytest.importorskip("main")
+import similarity  # noqa: E402
+import telemetry  # noqa: E402
+from report import AnalysisReport  # noqa: E402
+from speculative import SpeculativeAnalyzer  # noqa: E402
+
+CODE = "var total = 0;\nfor (var i = 0; i < 10; i++) {\n    if (i % 2) { total += i; }\n}\nconsole.log(total);\n"
+
+
+class Answer:
+    def __init__(self, content):
+        self.content = content
+
+
+@pytest.fixture
+def fake_llm(tmp_path, monkeypatch):
+    """
+    Answers every analysis without a network call and records the flows asked for.
+    A JavaScript-only smell rule makes the smells depend on the source name.
+    """
+    calls = []
+
+    def invoke(chain, inputs, flow="", model=""):
+        calls.append(flow)
+        return Answer(f"analysis of {len(inputs['code'])} chars" if "code" in inputs else "delta")
+
+    monkeypatch.setattr(main, "create_analysis_chain", lambda temperature: None)
+    monkeypatch.setattr(main, "create_delta_analysis_chain", lambda temperature: None)
+    monkeypatch.setattr(telemetry, "invoke_chain", invoke)
+    rules = tmp_path / "rules.json"
+    rules.write_text(json.dumps([{"id": "var", "keywords": ["var"], "languages": ["javascript"], "message": "m"}]))
+    monkeypatch.setenv("CODE_JUDGE_SMELL_RULES", str(rules))
+    return calls
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = SpeculativeAnalyzer(daily_budget=5, budget_path=str(tmp_path / "budget.json"))
+    yield analyzer
+    analyzer.executor.shutdown(wait=True)
+
+
+def test_claimed_run_matches_a_normal_analysis(fake_llm, analyzer):
+    analyzer.speculate("tab", CODE, 0.1, index_owner="alice", source="loop.js")
+    claimed, match = analyzer.claim("tab", CODE, 0.1, "loop.js").result()
+    assert match is None
+    normal = AnalysisReport(CODE, f"analysis of {len(CODE)} chars", source="loop.js")
+    for field in ("code", "code_hash", "result", "source", "metrics", "smell_hits", "halstead"):
+        assert getattr(claimed, field) == getattr(normal, field), field
+    assert "var" in {hit["id"] for hit in claimed.smell_hits}
+
+
+def test_claim_needs_the_same_code_temperature_and_source(fake_llm, analyzer):
+    analyzer.speculate("tab", CODE, 0.1, source="loop.js")
+    assert analyzer.claim("tab", CODE, 0.2, "loop.js") is None
+    assert analyzer.claim("tab", CODE, 0.1, "loop.py") is None
+    assert analyzer.claim("other", CODE, 0.1, "loop.js") is None
+    assert analyzer.claim("tab", CODE, 0.1, "loop.js") is not None
+    # Only once
+    assert analyzer.claim("tab", CODE, 0.1, "loop.js") is None
+
+
+def test_new_code_replaces_the_run_and_results_are_indexed(fake_llm, analyzer):
+    first = analyzer.speculate("tab", CODE, 0.1, index_owner="alice", source="loop.js")
+    first["future"].result()
+    analyzer.speculate("tab", CODE + "// more\n", 0.1, index_owner="alice", source="loop.js")
+    assert first["cancelled"].is_set()
+    assert analyzer.claim("tab", CODE, 0.1, "loop.js") is None
+    analyzer.claim("tab", CODE + "// more\n", 0.1, "loop.js").result()
+    # The first run was indexed, so the edited code only needed a review of the diff
+    assert fake_llm == ["speculative", "delta"]
+    assert similarity.get_similarity_index().count("alice") == 1
+
+
+def test_budget_caps_llm_calls(fake_llm, tmp_path):
+    analyzer = SpeculativeAnalyzer(daily_budget=1, budget_path=str(tmp_path / "budget.json"))
+    try:
+        analyzer.speculate("a", CODE, 0.1)
+        assert analyzer.claim("a", CODE, 0.1).result()[0].result
+        analyzer.speculate("b", CODE + "x = 1;\n", 0.1)
+        report, match = analyzer.claim("b", CODE + "x = 1;\n", 0.1).result()
+        assert report.result == "" and match is None
+        assert report.metrics == AnalysisReport(CODE + "x = 1;\n", "").metrics
+        assert analyzer.used_today() == 1
+    finally:
+        analyzer.executor.shutdown(wait=True)
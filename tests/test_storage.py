@@ -0,0 +1,33 @@
+import threading
+import time
+
+import storage
+from blob_cache import get_blob_cache
+from trend_store import get_trend_store
+
+
+def test_concurrent_first_calls_build_one_instance():
+    built = []
+
+    @storage.shared
+    def get_thing():
+        built.append(1)
+        time.sleep(0.05)  # a slow build widens the window for a second one
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get_thing())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(built) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_shared_stores_follow_the_data_dir(data_dir, tmp_path, monkeypatch):
+    assert get_trend_store() is get_trend_store()
+    assert get_trend_store().path.startswith(str(data_dir))
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path / "other"))
+    storage.reset_shared()
+    assert get_blob_cache().path.startswith(str(tmp_path / "other"))
@@ -0,0 +1,84 @@
+import io
+import random
+
+import pytest
+
+import streaming_metrics
+from report import AnalysisReport
+from streaming_metrics import DistinctCounter, StreamingMetrics, stream_metrics
+from test_incremental_metrics import SAMPLE
+
+# Every whitespace-free run stays under the shrunken MAX_LINE_CHARS, so no cut is forced
+# inside a token, while the long list line still goes through the long-line path
+CODE = (
+    SAMPLE * 3
+    + "x = [" + ", ".join(str(i) for i in range(200)) + "]\n"
+    + "def long_one(alpha, beta, gamma, delta, epsilon, zeta, eta, theta):\n    return 1\n"
+)
+
+
+@pytest.fixture
+def tiny_limits(monkeypatch):
+    monkeypatch.setattr(streaming_metrics, "MAX_LINE_CHARS", 32)
+    monkeypatch.setattr(streaming_metrics, "MAX_PENDING_CHARS", 64)
+
+
+def feed_in_pieces(code: str, seed: int) -> dict:
+    rng = random.Random(seed)
+    metrics = StreamingMetrics()
+    position = 0
+    while position < len(code):
+        size = rng.randint(1, 40)
+        metrics.feed(code[position:position + size])
+        position += size
+    return metrics.finish()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pieces_match_full_measurement(tiny_limits, seed):
+    result = feed_in_pieces(CODE, seed)
+    report = AnalysisReport(CODE, "")
+    assert result["approximate"] == []
+    assert result["metrics"] == report.metrics
+    assert result["halstead"] == report.halstead
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_forced_cuts_are_flagged(tiny_limits, seed):
+    code = CODE + "s = '" + "a" * 300 + "'\n" + "t = os.path.join(base_directory, name):\n"
+    result = feed_in_pieces(code, seed)
+    report = AnalysisReport(code, "")
+    for key, metric in result["metrics"].items():
+        if key not in result["approximate"]:
+            assert metric == report.metrics[key]
+            assert "approximate" not in metric
+        else:
+            assert metric["approximate"]
+
+
+def test_stream_metrics_reads_binary_files(tiny_limits):
+    result = stream_metrics(io.BytesIO(CODE.encode("utf-8")))
+    assert not result["truncated"]
+    assert result["metrics"] == AnalysisReport(CODE, "").metrics
+
+
+def test_stream_metrics_max_bytes(tiny_limits):
+    result = stream_metrics(io.BytesIO(CODE.encode("utf-8")), max_bytes=100)
+    assert result["truncated"]
+    assert result["metrics"]["chars"] == AnalysisReport(CODE[:100], "").metrics["chars"]
+
+
+def test_distinct_counter_exact_below_limit():
+    counter = DistinctCounter(limit=100, k=64)
+    for i in range(300):
+        counter.add(f"line {i % 80}")
+    assert not counter.approximate
+    assert counter.count() == 80
+
+
+def test_distinct_counter_estimates_above_limit():
+    counter = DistinctCounter(limit=100, k=256)
+    for i in range(20_000):
+        counter.add(f"line {i % 10_000}")
+    assert counter.approximate
+    assert abs(counter.count() - 10_000) < 2_000
@@ -0,0 +1,72 @@
+import sqlite3
+
+import trend_store
+from trend_store import TrendStore, metric_row
+
+DAY = 86400
+
+
+def row(path: str, loc: int, smells: int = 0) -> dict:
+    return metric_row(path, {"loc": loc, "cc": 2, "mi": 70.0, "nesting_depth": 1}, ["smell"] * smells)
+
+
+def test_trend_aggregates_per_bucket(tmp_path):
+    store = TrendStore(str(tmp_path / "trends.db"))
+    store.append("alice", "shop", [row("a.py", 10), row("b.py", 30)], ts=0.5 * DAY)
+    store.append("alice", "shop", [row("a.py", 20), row("b.py", 40)], ts=1.5 * DAY)
+    series = store.trend("alice", "shop", "loc", "avg", "day")
+    assert [(point["bucket"], point["value"], point["files"], point["runs"]) for point in series] == [(0, 20.0, 2, 1), (DAY, 30.0, 2, 1)]
+    assert [point["value"] for point in store.trend("alice", "shop", "loc", "max", "week")] == [40]
+    assert store.trend("alice", "shop", "loc", since=DAY)[0]["value"] == 30.0
+
+
+def test_latest_by_path_ranks_the_newest_values(tmp_path):
+    store = TrendStore(str(tmp_path / "trends.db"))
+    store.append("alice", "shop", [row("a.py", 10), row("b.py", 30)], commit_sha="c1", ts=1)
+    store.append("alice", "shop", [row("a.py", 50)], commit_sha="c2", ts=2)
+    latest = store.latest_by_path("alice", "shop", "loc")
+    assert [(entry["path"], entry["value"], entry["commit_sha"]) for entry in latest] == [("a.py", 50, "c2"), ("b.py", 30, "c1")]
+
+
+def test_reads_are_scoped_to_the_owner(tmp_path):
+    store = TrendStore(str(tmp_path / "trends.db"))
+    store.append("alice", "shop", [row("a.py", 10)], ts=1)
+    store.append("bob", "shop", [row("a.py", 99), row("z.py", 99)], ts=2)
+    store.append("bob", "blog", [row("post.py", 5)], ts=3)
+    assert store.repos("alice") == ["shop"]
+    assert store.repos("bob") == ["blog", "shop"]
+    assert store.repos("carol") == []
+    assert [point["value"] for point in store.trend("alice", "shop", "loc")] == [10]
+    assert [entry["path"] for entry in store.latest_by_path("alice", "shop", "loc")] == ["a.py"]
+    assert store.count("alice") == 1 and store.count("bob", "shop") == 2
+    assert store.trend("alice", "blog", "loc") == []
+
+
+def test_rows_stored_before_owners_are_not_listed(tmp_path):
+    path = str(tmp_path / "trends.db")
+    with sqlite3.connect(path) as conn:
+        conn.executescript("""
+            CREATE TABLE repos (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            CREATE TABLE paths (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+            CREATE TABLE metric_rows (
+                repo_id INTEGER NOT NULL, path_id INTEGER NOT NULL, ts REAL NOT NULL, commit_sha TEXT, blob TEXT, source TEXT,
+                loc INTEGER, cc INTEGER, mi REAL, fkgl REAL, nesting INTEGER, smells INTEGER, chars INTEGER
+            );
+            INSERT INTO repos (id, name) VALUES (1, 'uploaded project');
+            INSERT INTO paths (id, path) VALUES (1, 'a.py');
+            INSERT INTO metric_rows (repo_id, path_id, ts, loc) VALUES (1, 1, 1, 10);
+        """)
+    store = TrendStore(path)
+    assert store.repos("alice") == []
+    store.append("alice", "uploaded project", [row("a.py", 20)], ts=2)
+    assert [point["value"] for point in store.trend("alice", "uploaded project", "loc")] == [20]
+
+
+def test_record_rows_logs_failures(tmp_path, monkeypatch, caplog):
+    class Broken:
+        def append(self, *args, **kwargs):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(trend_store, "get_trend_store", lambda: Broken())
+    trend_store.record_rows("alice", "shop", [row("a.py", 1)])
+    assert "Could not record metric trends for shop" in caplog.text
@@ -0,0 +1,190 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+from storage import data_path, shared
+
+# Metric columns stored per file and run, in the order used by the table
+METRIC_COLUMNS = ["loc", "cc", "mi", "fkgl", "nesting", "smells", "chars"]
+METRIC_LABELS = {
+    "loc": "Lines of Code", "cc": "Cyclomatic Complexity", "mi": "Maintainability Index",
+    "fkgl": "Readability Grade", "nesting": "Max Nesting Depth", "smells": "Code Smells", "chars": "Code Characters",
+}
+AGGREGATES = {"avg": "AVG", "max": "MAX", "min": "MIN", "sum": "SUM"}
+BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+
+class TrendStore:
+    """
+    Append-only store of per-file metric rows keyed by owner, repo, path, commit/blob and timestamp.
+
+    Rows are kept compact in SQLite: repo and path strings are interned into lookup tables and
+    each row holds integer keys plus numeric metric columns. Trends and rankings are computed
+    with SQL aggregations over the (owner, repo, ts) index, so nothing is loaded into memory
+    wholesale. Every read is scoped to one owner (the submitter's id, as for jobs), so a
+    session only sees the series it recorded.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or data_path("trends.db")
+        self._lock = threading.Lock()
+        self._ids = {}
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS repos (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+                CREATE TABLE IF NOT EXISTS paths (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+                CREATE TABLE IF NOT EXISTS metric_rows (
+                    owner TEXT,
+                    repo_id INTEGER NOT NULL,
+                    path_id INTEGER NOT NULL,
+                    ts REAL NOT NULL,
+                    commit_sha TEXT,
+                    blob TEXT,
+                    source TEXT,
+                    loc INTEGER, cc INTEGER, mi REAL, fkgl REAL, nesting INTEGER, smells INTEGER, chars INTEGER
+                );
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(metric_rows)")}
+            if "owner" not in columns:
+                # Rows stored before owners were recorded belong to nobody and are not listed
+                conn.execute("ALTER TABLE metric_rows ADD COLUMN owner TEXT")
+            conn.executescript("""
+                CREATE INDEX IF NOT EXISTS metric_rows_owner_repo_ts ON metric_rows (owner, repo_id, ts);
+                CREATE INDEX IF NOT EXISTS metric_rows_owner_repo_path ON metric_rows (owner, repo_id, path_id, ts);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _intern(self, conn, table: str, column: str, value: str) -> int:
+        key = (table, value)
+        if key not in self._ids:
+            conn.execute(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", (value,))
+            self._ids[key] = conn.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,)).fetchone()[0]
+        return self._ids[key]
+
+    def append(self, owner: str, repo: str, rows: list, commit_sha: str = None, source: str = "", ts: float = None):
+        """
+        Append one run's metric rows for owner's repo.
+        Each row is a dict with path, optional blob and any of the METRIC_COLUMNS.
+        """
+        if not rows:
+            return
+        ts = ts or time.time()
+        with self._lock, self._connect() as conn:
+            repo_id = self._intern(conn, "repos", "name", repo)
+            conn.executemany(
+                f"INSERT INTO metric_rows (owner, repo_id, path_id, ts, commit_sha, blob, source, {', '.join(METRIC_COLUMNS)}) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, {', '.join('?' for _ in METRIC_COLUMNS)})",
+                [
+                    (owner, repo_id, self._intern(conn, "paths", "path", row["path"]), ts, commit_sha, row.get("blob"), source,
+                     *(row.get(column) for column in METRIC_COLUMNS))
+                    for row in rows
+                ],
+            )
+
+    def repos(self, owner: str) -> list:
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT name FROM repos WHERE id IN (SELECT DISTINCT repo_id FROM metric_rows WHERE owner = ?) ORDER BY name",
+                (owner,),
+            )]
+
+    def _repo_id(self, conn, repo: str):
+        row = conn.execute("SELECT id FROM repos WHERE name = ?", (repo,)).fetchone()
+        return row[0] if row else None
+
+    def trend(self, owner: str, repo: str, metric: str, aggregate: str = "avg", bucket: str = "day", since: float = None) -> list:
+        """
+        Time series of aggregate(metric) per time bucket for owner's repo.
+        Returns a list of dicts with bucket start (epoch seconds), value, files and runs.
+        """
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"Unknown metric '{metric}'")
+        width = BUCKETS[bucket]
+        with self._connect() as conn:
+            repo_id = self._repo_id(conn, repo)
+            if repo_id is None:
+                return []
+            rows = conn.execute(
+                f"SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, {AGGREGATES[aggregate]}({metric}), "
+                f"COUNT(DISTINCT path_id), COUNT(DISTINCT ts) "
+                f"FROM metric_rows WHERE owner = ? AND repo_id = ? AND ts >= ? AND {metric} IS NOT NULL "
+                f"GROUP BY bucket ORDER BY bucket",
+                (width, width, owner, repo_id, since or 0),
+            ).fetchall()
+        return [{"bucket": bucket_start, "value": value, "files": files, "runs": runs} for bucket_start, value, files, runs in rows]
+
+    def latest_by_path(self, owner: str, repo: str, metric: str, limit: int = 20) -> list:
+        """
+        The most recent value of metric for each path in owner's repo, highest first.
+        Returns a list of dicts with path, value, commit_sha and ts.
+        """
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"Unknown metric '{metric}'")
+        with self._connect() as conn:
+            repo_id = self._repo_id(conn, repo)
+            if repo_id is None:
+                return []
+            rows = conn.execute(
+                f"SELECT p.path, r.{metric}, r.commit_sha, r.ts FROM metric_rows r "
+                f"JOIN (SELECT path_id, MAX(ts) AS ts FROM metric_rows WHERE owner = ? AND repo_id = ? GROUP BY path_id) latest "
+                f"ON r.path_id = latest.path_id AND r.ts = latest.ts "
+                f"JOIN paths p ON p.id = r.path_id "
+                f"WHERE r.owner = ? AND r.repo_id = ? ORDER BY r.{metric} DESC LIMIT ?",
+                (owner, repo_id, owner, repo_id, limit),
+            ).fetchall()
+        return [{"path": path, "value": value, "commit_sha": commit_sha, "ts": ts} for path, value, commit_sha, ts in rows]
+
+    def count(self, owner: str, repo: str = None) -> int:
+        with self._connect() as conn:
+            if repo is None:
+                return conn.execute("SELECT COUNT(*) FROM metric_rows WHERE owner = ?", (owner,)).fetchone()[0]
+            repo_id = self._repo_id(conn, repo)
+            if repo_id is None:
+                return 0
+            return conn.execute("SELECT COUNT(*) FROM metric_rows WHERE owner = ? AND repo_id = ?", (owner, repo_id)).fetchone()[0]
+
+
+def metric_row(path: str, metrics: dict, smells: list, blob: str = None) -> dict:
+    """
+    Build a trend row from plain metric values (loc, cc, mi, nesting_depth, and optionally fkgl, chars).
+    """
+    return {
+        "path": path,
+        "blob": blob,
+        "loc": metrics.get("loc"),
+        "cc": metrics.get("cc"),
+        "mi": metrics.get("mi"),
+        "fkgl": metrics.get("fkgl"),
+        "nesting": metrics.get("nesting_depth"),
+        "smells": len(smells),
+        "chars": metrics.get("chars"),
+    }
+
+
+def blob_sha(data: bytes) -> str:
+    """
+    Git blob SHA-1 of data, so rows from uploads and from git checkouts of the same content share a key.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def record_rows(owner: str, repo: str, rows: list, commit_sha: str = None, source: str = ""):
+    """
+    Append owner's rows to the shared store; failures are logged rather than failing the analysis that produced them.
+    """
+    try:
+        get_trend_store().append(owner, repo, rows, commit_sha=commit_sha, source=source)
+    except Exception:
+        logging.getLogger(__name__).exception("Could not record metric trends for %s", repo)
+
+
+@shared
+def get_trend_store() -> TrendStore:
+    """
+    Process-wide TrendStore shared by the Streamlit sessions and the job workers.
+    """
+    return TrendStore()
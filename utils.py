@@ -1,13 +1,26 @@
 import re
 
+# Patterns and word lists shared by the metric functions below and by incremental_metrics,
+# which computes the same counts piecewise and finishes them with the *_from_counts functions.
+COMPLEXITY_KEYWORDS = ['if', 'for', 'while', 'elif', 'else', 'switch', 'case', 'match', 'when', 'try', 'except', 'catch', 'default', '&&', '||']
+COMMENT_PREFIXES = ('#', '//', '/*', '--', "'", ';')
+SYLLABLE_PATTERN = re.compile(r'[aeiouy]+')
+WORD_PATTERN = re.compile(r'\b\w+\b')
+OPERATOR_PATTERN = re.compile(r'[+\-*/=<>!&|%]')
+FUNCTION_PATTERNS = [r'\bdef\s+\w+', r'\bfunction\s+\w+', r'\bfunc\s+\w+', r'\bpublic\s+\w+\s*\(', r'\bprivate\s+\w+\s*\(']
+VARIABLE_KEYWORDS = {'if', 'else', 'for', 'while', 'def', 'class', 'import', 'from', 'return', 'print', 'int', 'str', 'float', 'bool', 'true', 'false', 'null', 'void', 'public', 'private', 'static', 'const', 'let', 'var', 'const', 'function', 'func'}
+
 def flesch_kincaid_grade_level(text: str) -> dict:
     """
     Calculate Flesch-Kincaid Grade Level for readability.
     Returns a dict with value, label, and status (good/poor).
     """
-    words = len(text.split())
+    words = text.split()
     sentences = text.count('.') + text.count('!') + text.count('?') + 1  # +1 to avoid division by zero
-    syllables = sum([len(re.findall(r'[aeiouy]+', word.lower())) for word in text.split()])
+    syllables = sum([len(SYLLABLE_PATTERN.findall(word.lower())) for word in words])
+    return flesch_kincaid_from_counts(len(words), sentences, syllables)
+
+def flesch_kincaid_from_counts(words: int, sentences: int, syllables: int) -> dict:
     if sentences == 0 or words == 0:
         return {"value": 0.0, "label": "Readability Grade", "status": "neutral"}
     grade = 0.39 * (words / sentences) + 11.8 * (syllables / words) - 15.59
@@ -21,8 +34,11 @@ def cyclomatic_complexity(code: str) -> dict:
     Returns a dict with value, label, and status (good/poor).
     Note: This is a heuristic estimate; actual complexity may vary by language.
     """
-    keywords = ['if', 'for', 'while', 'elif', 'else', 'switch', 'case', 'match', 'when', 'try', 'except', 'catch', 'default', '&&', '||']
-    value = sum(code.lower().count(keyword) for keyword in keywords) + 1
+    lowered = code.lower()
+    return cyclomatic_complexity_from_counts(sum(lowered.count(keyword) for keyword in COMPLEXITY_KEYWORDS))
+
+def cyclomatic_complexity_from_counts(keyword_count: int) -> dict:
+    value = keyword_count + 1
     status = "good" if value <= 10 else "poor"
     return {"value": value, "label": "Cyclomatic Complexity", "status": status}
 
@@ -31,12 +47,16 @@ def calculate_maintainability_index(code: str, code_lines: int, comment_lines: i
     Calculate a simple maintainability index.
     Returns a dict with value, label, and status (good/poor).
     """
+    complexity = cyclomatic_complexity(code)['value'] if code_lines else 0
+    return maintainability_from_counts(len(code), code_lines, comment_lines, complexity)
+
+def maintainability_from_counts(characters: int, code_lines: int, comment_lines: int, complexity: int) -> dict:
     if code_lines == 0:
         value = 100.0
     else:
         comment_density = comment_lines / code_lines
-        complexity_factor = cyclomatic_complexity(code)['value'] / 10
-        value = 100 - (len(code) / 100) + (comment_density * 50) - complexity_factor
+        complexity_factor = complexity / 10
+        value = 100 - (characters / 100) + (comment_density * 50) - complexity_factor
         value = max(0, min(100, value))
     status = "good" if value > 50 else "poor"
     return {"value": value, "label": "Maintainability Index", "status": status}
@@ -47,7 +67,9 @@ def lines_of_code(code: str) -> dict:
     Returns a dict with value, label, and status (good/poor).
     """
     lines = code.split('\n')
-    value = len([line for line in lines if line.strip()])
+    return lines_of_code_from_counts(len([line for line in lines if line.strip()]))
+
+def lines_of_code_from_counts(value: int) -> dict:
     status = "good" if value < 100 else "poor"
     return {"value": value, "label": "Lines of Code", "status": status}
 
@@ -61,40 +83,32 @@ def comment_lines(code: str) -> int:
     comment_count = 0
     for line in lines:
         stripped = line.strip()
-        if (stripped.startswith('#') or stripped.startswith('//') or stripped.startswith('/*') or
-            stripped.startswith('--') or stripped.startswith("'") or stripped.startswith(';')):
+        if stripped.startswith(COMMENT_PREFIXES):
             comment_count += 1
     return comment_count
 
-def detect_code_smells(code: str) -> list:
+def detect_code_smells(code: str, path: str = "", metrics: dict = None) -> list:
     """
     Simple detection of common code smells across languages.
+    Returns the messages of the rules in smell_rules that fire; see smell_rules.find_smells
+    for line locations, path-based language scoping and passing in precomputed metrics.
     """
-    smells = []
-    if len(code) > 1000:
-        smells.append("Long method/function - consider breaking into smaller functions")
-    if cyclomatic_complexity(code)['value'] > 10:
-        smells.append("High cyclomatic complexity - consider simplifying logic")
-    debug_patterns = ['print(', 'console.log', 'System.out', 'printf', 'puts', 'log(']
-    has_debug = any(pattern in code for pattern in debug_patterns)
-    if has_debug and 'debug' not in code.lower():
-        smells.append("Potential debug/logging statements left in code (e.g., print, console.log)")
-    if 'TODO' in code.upper() or 'FIXME' in code.upper():
-        smells.append("TODO/FIXME comments present - unfinished work")
-    return smells
+    from smell_rules import find_smells
+    return [hit["message"] for hit in find_smells(code, path, metrics)]
 
 def halstead_metrics(code: str) -> dict:
     """
     Calculate basic Halstead complexity metrics.
     """
     # Simple tokenization
-    tokens = re.findall(r'\b\w+\b', code.lower())
-    unique_operators = set(re.findall(r'[+\-*/=<>!&|%]', code))
+    tokens = WORD_PATTERN.findall(code.lower())
+    unique_operators = set(OPERATOR_PATTERN.findall(code))
     unique_operands = set(tokens) - unique_operators
-    n1 = len(unique_operators)
-    n2 = len(unique_operands)
-    N1 = sum(1 for op in unique_operators for char in code if char in op)
-    N2 = len(tokens) - N1
+    operator_count = sum(code.count(op) for op in unique_operators)
+    return halstead_from_counts(len(unique_operators), len(unique_operands), operator_count, len(tokens))
+
+def halstead_from_counts(n1: int, n2: int, N1: int, token_count: int) -> dict:
+    N2 = token_count - N1
     if n1 + n2 == 0:
         return {"vocabulary": 0, "length": 0, "volume": 0, "difficulty": 0, "effort": 0}
     vocabulary = n1 + n2
@@ -123,6 +137,9 @@ def nesting_depth(code: str) -> dict:
             max_depth = max(max_depth, current_depth)
         elif char in ')]}':
             current_depth = max(0, current_depth - 1)
+    return nesting_depth_from_counts(max_depth)
+
+def nesting_depth_from_counts(max_depth: int) -> dict:
     status = "good" if max_depth <= 3 else "poor"
     return {"value": max_depth, "label": "Max Nesting Depth", "status": status}
 
@@ -132,10 +149,12 @@ def function_count(code: str) -> dict:
     Returns a dict with value, label, and status (good/poor).
     Heuristic: Look for 'def ', 'function ', 'func ', etc.
     """
-    patterns = [r'\bdef\s+\w+', r'\bfunction\s+\w+', r'\bfunc\s+\w+', r'\bpublic\s+\w+\s*\(', r'\bprivate\s+\w+\s*\(']
     count = 0
-    for pattern in patterns:
+    for pattern in FUNCTION_PATTERNS:
         count += len(re.findall(pattern, code, re.IGNORECASE))
+    return function_count_from_counts(count)
+
+def function_count_from_counts(count: int) -> dict:
     status = "good" if count <= 10 else "poor"
     return {"value": count, "label": "Function Count", "status": status}
 
@@ -146,10 +165,11 @@ def variable_count(code: str) -> dict:
     Heuristic: Find identifiers that are not keywords or functions.
     """
     # Simple heuristic: split by non-word chars, filter likely variables
-    words = re.findall(r'\b\w+\b', code)
-    keywords = {'if', 'else', 'for', 'while', 'def', 'class', 'import', 'from', 'return', 'print', 'int', 'str', 'float', 'bool', 'true', 'false', 'null', 'void', 'public', 'private', 'static', 'const', 'let', 'var', 'const', 'function', 'func'}
-    variables = set(word for word in words if word not in keywords and not word.isdigit())
-    count = len(variables)
+    words = WORD_PATTERN.findall(code)
+    variables = set(word for word in words if word not in VARIABLE_KEYWORDS and not word.isdigit())
+    return variable_count_from_counts(len(variables))
+
+def variable_count_from_counts(count: int) -> dict:
     status = "good" if count <= 20 else "poor"
     return {"value": count, "label": "Unique Variables", "status": status}
 
@@ -160,10 +180,11 @@ def code_duplication_percentage(code: str) -> dict:
     Simple heuristic: Count repeated lines.
     """
     lines = [line.strip() for line in code.split('\n') if line.strip()]
-    total_lines = len(lines)
+    return duplication_from_counts(len(lines), len(set(lines)))
+
+def duplication_from_counts(total_lines: int, unique_lines: int) -> dict:
     if total_lines == 0:
         return {"value": 0.0, "label": "Duplication %", "status": "good"}
-    unique_lines = len(set(lines))
     duplication = ((total_lines - unique_lines) / total_lines) * 100
     status = "good" if duplication <= 10 else "poor"
     return {"value": duplication, "label": "Duplication %", "status": status}
@@ -173,7 +194,9 @@ def code_characters(code: str) -> dict:
     Count the number of characters in the code.
     Returns a dict with value, label, and status (good/poor).
     """
-    value = len(code)
+    return code_characters_from_counts(len(code))
+
+def code_characters_from_counts(value: int) -> dict:
     status = "good" if value < 10000 else "poor"
     return {"value": value, "label": "Code Characters", "status": status}
 
@@ -182,8 +205,9 @@ def code_comment_density(code: str) -> dict:
     Calculate the comment density percentage.
     Returns a dict with value, label, and status (good/poor).
     """
-    loc = lines_of_code(code)['value']
-    comments = comment_lines(code)
+    return comment_density_from_counts(lines_of_code(code)['value'], comment_lines(code))
+
+def comment_density_from_counts(loc: int, comments: int) -> dict:
     value = (comments / loc) * 100 if loc > 0 else 0
     status = "good" if value > 10 else "poor"
     return {"value": value, "label": "Comment Density %", "status": status}
@@ -193,8 +217,9 @@ def code_avg_function_length(code: str) -> dict:
     Calculate the average lines per function.
     Returns a dict with value, label, and status (good/poor).
     """
-    loc = lines_of_code(code)['value']
-    fc = function_count(code)['value']
+    return avg_function_length_from_counts(lines_of_code(code)['value'], function_count(code)['value'])
+
+def avg_function_length_from_counts(loc: int, fc: int) -> dict:
     value = loc / max(1, fc)
     status = "good" if value < 20 else "poor"
     return {"value": value, "label": "Avg Lines per Function", "status": status}